@@ -19,6 +19,7 @@ import { initBuildManifestProxy } from 'utils/buildManifestProxy';
 import {
   serverFetch,
   clientFetch,
+  addConnectTokens,
   addDecryptionKeys,
   fetchHuntInfoStaticSync,
 } from 'utils/fetch';
@@ -76,6 +77,7 @@ export default function MyApp({
     statusCode = 200,
     bare = false,
   } = pageProps;
+  addConnectTokens(puzzleData?.connectTokens);
 
   const uuid = useSessionUuid();
 
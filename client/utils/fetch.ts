@@ -24,23 +24,36 @@ interface StatusCode {
 }
 
 export type CryptKeys = Record<string, string>;
+export type ConnectTokens = Record<string, string>;
 type AddDecryptKeysProps<T extends Object> = T & {
   cryptKeys?: CryptKeys;
+  connectTokens?: ConnectTokens;
 };
 // Add global keys to be used by encrypted js sources.
 // Ignore on the server since serverside sources are not encrypted.
 // Returns the object with keys removed.
 export const addDecryptionKeys = <T>({
   cryptKeys,
+  connectTokens,
   ...rest
 }: AddDecryptKeysProps<T>) => {
   if (cryptKeys && typeof window !== 'undefined') {
     const s = self as any;
     s.cryptKeys = Object.assign(s.cryptKeys || {}, cryptKeys);
   }
+  addConnectTokens(connectTokens);
   return rest;
 };
 
+// Add global tokens authorizing websocket connections, keyed by puzzle or
+// story slug. Connecting without one still works but is slower.
+export const addConnectTokens = (connectTokens?: ConnectTokens) => {
+  if (connectTokens && typeof window !== 'undefined') {
+    const s = self as any;
+    s.connectTokens = Object.assign(s.connectTokens || {}, connectTokens);
+  }
+};
+
 // extract the /20xx/mypuzzlehunt.com etc
 // Note that this gets called by the router in utils/router and thus that
 // router should use router.basePath directly unless also needing error validation.
@@ -212,21 +225,37 @@ export const useWebSocket = (
   connect = true
 ) => {
   const didUnmount = useRef<boolean>(false); // track whether we've closed manually
+  // The server sends a randomized delay so that clients dropped at the same
+  // time (eg by a deploy) do not all reconnect at once.
+  const reconnectDelay = useRef<number>(20 * 1000); // ms
 
   const defaults = {
     retryOnError: true,
     // Only reconnect if we haven't explicitly unmounted
     shouldReconnect: (e) => !didUnmount.current,
     reconnectAttempts: Infinity,
-    reconnectInterval: 20 * 1000, // ms
+    reconnectInterval: () => reconnectDelay.current,
     onError: (e) => {
       console.log('Error connecting to websocket: ', e);
     },
   };
+  const { onMessage } = options;
 
   const websocketResponse = _useWebSocket(
     url,
-    { ...defaults, ...options },
+    {
+      ...defaults,
+      ...options,
+      onMessage: (message) => {
+        if (typeof message.data === 'string') {
+          const { key, data } = JSON.parse(message.data);
+          if (key === 'reconnect' && data?.delayMs) {
+            reconnectDelay.current = data.delayMs;
+          }
+        }
+        onMessage?.(message);
+      },
+    },
     connect
   );
 
@@ -328,6 +357,10 @@ export const useEventWebSocket = ({
     if (options.uuid) {
       params.append('uuid', options.uuid);
     }
+    const token = (self as any).connectTokens?.[storySlug ?? puzzle];
+    if (token) {
+      params.append('token', token);
+    }
     if (puzzle) {
       params.append('slug', puzzle);
     }
@@ -349,15 +382,20 @@ export const useEventWebSocket = ({
   // conditioning is slightly messy due to Blobs only working in async contexts
   if (key) {
     defaults.filter = (message) => {
-      return (
-        typeof message.data !== 'string' || JSON.parse(message.data).key === key
-      );
+      if (typeof message.data !== 'string') return true;
+      const messageKey = JSON.parse(message.data).key;
+      return messageKey === key || messageKey === 'batch';
     };
   }
   const onMessage = useMemo(() => {
     if (!onJson) return undefined;
     return (message) => {
       const processMessage = (data) => {
+        // Events coalesced by the server arrive together.
+        if (data.key === 'batch') {
+          data.data.forEach(processMessage);
+          return;
+        }
         // Set and remove decryption keys if available.
         // NB: This will only run if there's at least one hook subscriber with a
         //     matching websocket filter key.
@@ -38,6 +38,7 @@ wget --recursive ${WGET_SETTINGS} \
   https://localhost:8084/20xx/mypuzzlehunt.com/events \
   https://localhost:8084/20xx/mypuzzlehunt.com/story \
   https://localhost:8084/20xx/mypuzzlehunt.com/api/server.zip \
+  https://localhost:8084/20xx/mypuzzlehunt.com/api/site-packages.zip \
   https://localhost:8084/20xx/spoilr/progress/solves/ \
   || { >&2 echo "ERROR: wget could not download all pages" && false; }
 # Fetch solutions and stats api calls for any puzzles that are only client-side rendered (not server-side rendered)
@@ -152,6 +153,7 @@ ln -sT ../media exported_static_site/20xx/registration.mypuzzlehunt.com/media #
 # Copy Django responses
 mkdir -p exported_static_site/20xx/mypuzzlehunt.com/api # FIXME: replace 20xx and domain
 cp site_dump/20xx/mypuzzlehunt.com/api/server.zip exported_static_site/20xx/mypuzzlehunt.com/api/server.zip # FIXME: replace 20xx and domain
+cp site_dump/20xx/mypuzzlehunt.com/api/site-packages.zip exported_static_site/20xx/mypuzzlehunt.com/api/site-packages.zip # FIXME: replace 20xx and domain
 mkdir -p exported_static_site/20xx/spoilr/progress/solves # FIXME: replace 20xx
 cp site_dump/20xx/spoilr/progress/solves/index.html exported_static_site/20xx/spoilr/progress/solves/index.html # FIXME: replace 20xx
 
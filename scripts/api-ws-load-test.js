@@ -92,9 +92,22 @@ const buildWebsocketUrl = (site, options = {}) => {
   if (options.session_id) {
     params.push(`session_id=${options.session_id.toString()}`);
   }
+  if (options.token) {
+    params.push(`token=${encodeURIComponent(options.token)}`);
+  }
   return `${base}${wsPath}?${params.join("&")}`;
 };
 
+// Fetches puzzle data like the client does on page load, and returns the
+// websocket connect token for the puzzle, if any.
+const fetchPuzzleProps = (slug) => {
+  const res = http.get(`${BASE_API_URL}/puzzle/${slug}`, { headers: HEADERS });
+  check(res, {
+    "puzzle data succeeds": (r) => r.status === 200,
+  });
+  return res.status === 200 ? (res.json().connectTokens || {})[slug] : null;
+};
+
 const login = (ind) => {
   const username = USERNAMES[ind];
   const password = PASSWORDS[ind];
@@ -130,7 +143,7 @@ const login = (ind) => {
 // intensive puzzles of the site.
 const collage = () => {
   // Do the client fetch for puzzle data.
-  fetchPuzzleProps("collage");
+  const token = fetchPuzzleProps("collage");
   // Tried using the experimental websocket code in k6 and it just, didn't work as expected?
   // So we do everything inside the blocking ws.connect() call.
   const collageApiUrl = `${BASE_API_URL}/puzzle/collage/guess`;
@@ -160,7 +173,7 @@ const collage = () => {
   };
   // We start the websocket first, then make guesses while it's open.
   // This way different workers see each other's guesses.
-  const collageWsUrl = buildWebsocketUrl("museum", { slug: "collage" });
+  const collageWsUrl = buildWebsocketUrl("museum", { slug: "collage", token });
   const res = ws.connect(collageWsUrl, params, (socket) => {
     // The HTTP and websocket APIs are both blocking, only one can run at a time.
     // https://community.k6.io/t/batch-execute-websocket-connect-request-and-http-request/3723
@@ -179,6 +192,36 @@ const collage = () => {
   });
 };
 
+// Simulates a reconnect storm, eg after a deploy: every virtual user drops
+// its websocket at the same time and reconnects after the delay the server
+// suggested. Set useToken to compare connects with and without connect tokens.
+const reconnectStorm = (useToken = true) => {
+  const slug = "collage";
+  const token = fetchPuzzleProps(slug);
+  const url = buildWebsocketUrl("museum", {
+    slug,
+    token: useToken ? token : null,
+  });
+  const params = { headers: HEADERS, tags: { key: "reconnect-storm" } };
+  let delayMs = 0;
+  for (let i = 0; i < 3; i++) {
+    sleep(delayMs / 1000);
+    const res = ws.connect(url, params, (socket) => {
+      socket.on("message", (message) => {
+        const { key, data } = JSON.parse(message);
+        if (key === "reconnect") {
+          delayMs = data.delayMs;
+        }
+      });
+      // Drop every connection on the same second boundary.
+      socket.setTimeout(() => socket.close(), 1000 - (Date.now() % 1000));
+    });
+    check(res, {
+      "websocket connect succeeds": (r) => r && r.status === 101,
+    });
+  }
+};
+
 // A list of URLs that may request a large number of assets for #reasons
 // We assume the team has access to all such URLs
 const urls = [
@@ -212,7 +255,7 @@ export default () => {
   const weights = [10, 0, 0, 0, 0, 0];
   const tot = weights.reduce((partialSum, a) => partialSum + a, 0);
   let val = randomIntBetween(0, tot - 1);
-  const funcs = [collage, loadPage];
+  const funcs = [collage, loadPage, reconnectStorm];
   for (let i = 0; i < weights.length; i++) {
     if (val <= weights[i]) {
       funcs[i]();
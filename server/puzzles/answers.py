@@ -0,0 +1,79 @@
+"""
+Responses shown next to past guesses, compiled once per process.
+
+Rendering a puzzle's guess history used to normalize every pseudoanswer of the
+puzzle for every guess. Instead, the normalized pseudoanswers of all puzzles
+are compiled alongside the spoilr answer index and rebuilt only when its
+version changes, so looking up the response for a guess takes no queries.
+"""
+import dataclasses
+import threading
+import typing
+
+from spoilr.core.api.answer import get_answer_index
+
+from puzzles.models import Puzzle
+
+# Mapping from puzzle slug to a function taking a normalized guess and
+# returning a message to show for it, or None. These override pseudoanswers.
+PARTIAL_ANSWER_MATCHERS: typing.Dict[
+    str, typing.Callable[[str], typing.Optional[str]]
+] = {}
+
+
+@dataclasses.dataclass
+class GuessResponses:
+    # Normalized pseudoanswer -> response.
+    messages: typing.Dict[str, str]
+    partial_matcher: typing.Optional[typing.Callable[[str], typing.Optional[str]]]
+
+    def lookup(self, answer):
+        """Returns the message for a normalized guess, or None if it has none."""
+        if self.partial_matcher is not None:
+            message = self.partial_matcher(answer)
+            if message is not None:
+                return message
+        return self.messages.get(answer)
+
+
+NO_GUESS_RESPONSES = GuessResponses(messages={}, partial_matcher=None)
+
+# (answer index version, {puzzle id: GuessResponses})
+_guess_responses = (None, {})
+_guess_responses_lock = threading.Lock()
+
+
+def _build_guess_responses(answer_index):
+    guess_responses = {}
+    for puzzle in Puzzle.objects.select_related("round"):
+        pseudos = answer_index.pseudos.get(puzzle.id, {})
+        partial_matcher = PARTIAL_ANSWER_MATCHERS.get(puzzle.slug)
+        if not pseudos and partial_matcher is None:
+            continue
+        messages = {}
+        for response in pseudos.values():
+            # The first pseudoanswer wins if several normalize the same way.
+            messages.setdefault(
+                puzzle.normalize_answer(response.answer.raw), response.message
+            )
+        guess_responses[puzzle.id] = GuessResponses(
+            messages=messages, partial_matcher=partial_matcher
+        )
+    return guess_responses
+
+
+def get_guess_responses(puzzle_id):
+    """Returns the GuessResponses for a puzzle."""
+    global _guess_responses
+
+    answer_index = get_answer_index()
+    version, guess_responses = _guess_responses
+    if version != answer_index.version:
+        with _guess_responses_lock:
+            if _guess_responses[0] != answer_index.version:
+                _guess_responses = (
+                    answer_index.version,
+                    _build_guess_responses(answer_index),
+                )
+            _, guess_responses = _guess_responses
+    return guess_responses.get(puzzle_id, NO_GUESS_RESPONSES)
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class PuzzlesConfig(AppConfig):
+    name = "puzzles"
+
+    def ready(self):
+        # Register hunt callbacks and signal receivers.
+        from . import connect_auth, gate
+        from .models import story_cache
@@ -61,3 +61,15 @@ else:
         from spoilr.core.views.hunt_views import do_tick
 
         do_tick()
+
+    @celery_app.task(name="spoilr-archive-system-log")
+    def archive_system_log():
+        from spoilr.core.api.system_log import archive_old_system_log
+
+        archive_old_system_log()
+
+    @celery_app.task(name="spoilr-event")
+    def run_event_subscriber(subscriber_name, event_type, kwargs, wildcard=False):
+        from spoilr.core.api.events import run_async_subscriber
+
+        run_async_subscriber(subscriber_name, event_type, kwargs, wildcard=wildcard)
@@ -0,0 +1,254 @@
+"""
+Authorization for websocket connections to puzzles and story cards.
+
+Every websocket connect used to evaluate unlocks in the database, so a
+reconnect storm after a deploy turned into thousands of simultaneous queries.
+A connect is now allowed by the first of:
+
+- A signed connect token, issued alongside the puzzle or story data by the HTTP
+  API. Tokens are bound to the team and slug and expire after a few minutes.
+  Checking one needs no IO.
+- The team's unlocked bitmap in Redis, one per kind (puzzle or story), with a
+  bit set at the id of every unlocked object. Bit 0 marks a bitmap as complete.
+  Bitmaps are built from the first database check and kept up to date by
+  release events and access changes.
+- The database check in puzzles.utils.is_unlocked.
+
+Denials are never answered from the bitmap, since the slug may be about to
+unlock.
+
+Clients are also sent a reconnect delay when they connect, drawn at random so
+that clients dropped together do not all come back at the same moment.
+"""
+import random
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from spoilr.core.api.events import HuntEvent, register
+
+from puzzles.models import Puzzle, PuzzleAccess, Team
+from puzzles.models.story import StoryCard, StoryCardAccess
+
+PUZZLE = "puzzle"
+STORY = "story"
+
+CONNECT_TOKEN_MAX_AGE_S = 10 * 60
+# Long enough to cover a hunt, the bitmap is rebuilt on the next miss if evicted.
+UNLOCKED_BITMAP_TIMEOUT_S = 7 * 24 * 60 * 60
+UNLOCKED_BITMAP_KEY_FORMAT = "ws-unlocked:{}:{}"
+COMPLETE_BIT = 0
+REBUILD_LOCK_KEY_FORMAT = "ws-unlocked:{}:rebuild"
+REBUILD_LOCK_TIMEOUT_S = 5
+# Unknown slugs reload the slug index at most this often.
+SLUG_INDEX_RELOAD_INTERVAL_S = 30
+# Range of the reconnect delay sent to clients.
+RECONNECT_DELAY_MS = (1000, 30000)
+
+# Sets bits only if the bitmap exists, so that a partial bitmap is never
+# mistaken for a complete one.
+_SET_BITS_IF_EXISTS_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    for _, offset in ipairs(ARGV) do
+        redis.call("SETBIT", KEYS[1], offset, 1)
+    end
+end
+"""
+
+_signer = signing.TimestampSigner(salt="puzzles.connect_auth")
+
+
+def _redis():
+    # Import here to avoid circular import
+    from puzzles.utils import get_redis_handle
+
+    return get_redis_handle()
+
+
+def _async_redis():
+    # Import here to avoid circular import
+    from puzzles.utils import get_async_redis_handle
+
+    return get_async_redis_handle()
+
+
+def is_connect_auth_enabled():
+    # The static site has no websocket server, or Redis.
+    return not settings.IS_PYODIDE
+
+
+def get_connect_token(team_id, kind, slug):
+    return _signer.sign_object([team_id, kind, slug], compress=False)
+
+
+def get_connect_tokens(team, *, puzzle_slugs=(), story_slugs=()):
+    """Returns a mapping from slug to connect token, for the client."""
+    if not is_connect_auth_enabled() or team is None:
+        return {}
+    tokens = {slug: get_connect_token(team.id, PUZZLE, slug) for slug in puzzle_slugs}
+    for slug in story_slugs:
+        tokens[slug] = get_connect_token(team.id, STORY, slug)
+    return tokens
+
+
+def is_valid_connect_token(token, team_id, kind, slug):
+    if not token:
+        return False
+    try:
+        value = _signer.unsign_object(token, max_age=CONNECT_TOKEN_MAX_AGE_S)
+    except signing.BadSignature:
+        return False
+    return value == [team_id, kind, slug]
+
+
+class SlugIndex:
+    """Maps slugs of puzzles and story cards to their ids, the bitmap offsets."""
+
+    def __init__(self):
+        self.ids = {PUZZLE: {}, STORY: {}}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def get(self, kind, slug):
+        return self.ids[kind].get(slug)
+
+    def should_reload(self):
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > SLUG_INDEX_RELOAD_INTERVAL_S
+        )
+
+    def reload(self):
+        with self.lock:
+            if not self.should_reload():
+                return
+            self.ids = {
+                PUZZLE: dict(Puzzle.objects.values_list("slug", "id")),
+                STORY: dict(StoryCard.objects.values_list("slug", "id")),
+            }
+            self.loaded_at = time.monotonic()
+
+
+_slug_index = SlugIndex()
+
+
+def _build_unlocked_bitmaps(team_id):
+    """Writes both of the team's bitmaps from the database."""
+    team = Team.objects.filter(id=team_id).first()
+    if team is None or team.is_internal or team.is_public:
+        # These teams can see everything, including puzzles added later.
+        return
+    offsets = {
+        PUZZLE: PuzzleAccess.objects.filter(team_id=team_id).values_list(
+            "puzzle_id", flat=True
+        ),
+        STORY: StoryCardAccess.objects.filter(team_id=team_id).values_list(
+            "story_card_id", flat=True
+        ),
+    }
+    pipeline = _redis().pipeline()
+    for kind, kind_offsets in offsets.items():
+        key = UNLOCKED_BITMAP_KEY_FORMAT.format(team_id, kind)
+        pipeline.delete(key)
+        for offset in (COMPLETE_BIT, *kind_offsets):
+            pipeline.setbit(key, offset, 1)
+        pipeline.expire(key, UNLOCKED_BITMAP_TIMEOUT_S)
+    pipeline.execute()
+
+
+def _is_unlocked_in_database(user, kind, slug, rebuild_bitmaps):
+    # Import here to avoid circular import
+    from puzzles.utils import is_unlocked
+
+    if kind == STORY:
+        unlocked = is_unlocked(user=user, story_slug=slug)
+    else:
+        unlocked = is_unlocked(user=user, puzzle_slug=slug)
+    # Only one of the connects that find the bitmaps missing rebuilds them.
+    if rebuild_bitmaps and _redis().set(
+        REBUILD_LOCK_KEY_FORMAT.format(user.team_id),
+        1,
+        nx=True,
+        ex=REBUILD_LOCK_TIMEOUT_S,
+    ):
+        _build_unlocked_bitmaps(user.team_id)
+    if _slug_index.get(kind, slug) is None and _slug_index.should_reload():
+        _slug_index.reload()
+    return unlocked
+
+
+async def is_connect_allowed(user, kind, slug, token=None):
+    """Whether the user may open a websocket for the puzzle or story card."""
+    team_id = getattr(user, "team_id", None)
+    if team_id is None:
+        return False
+    if is_valid_connect_token(token, team_id, kind, slug):
+        return True
+    if _slug_index.loaded_at is None:
+        await sync_to_async(_slug_index.reload)()
+    offset = _slug_index.get(kind, slug)
+    key = UNLOCKED_BITMAP_KEY_FORMAT.format(team_id, kind)
+    pipeline = _async_redis().pipeline(transaction=False)
+    pipeline.getbit(key, COMPLETE_BIT)
+    if offset is not None:
+        pipeline.getbit(key, offset)
+    is_complete, *is_set = await pipeline.execute()
+    if is_set and is_set[0]:
+        return True
+    return await sync_to_async(_is_unlocked_in_database)(
+        user, kind, slug, rebuild_bitmaps=not is_complete
+    )
+
+
+def get_reconnect_hint():
+    return {"delayMs": random.randint(*RECONNECT_DELAY_MS)}
+
+
+def set_unlocked_bits(team_id, kind, offsets):
+    if offsets:
+        _redis().eval(
+            _SET_BITS_IF_EXISTS_SCRIPT,
+            1,
+            UNLOCKED_BITMAP_KEY_FORMAT.format(team_id, kind),
+            *offsets,
+        )
+
+
+def reset_unlocked_bitmaps(team_id):
+    """Forces the next connect for this team to check the database."""
+    _redis().delete(
+        *(UNLOCKED_BITMAP_KEY_FORMAT.format(team_id, kind) for kind in (PUZZLE, STORY))
+    )
+
+
+def _on_puzzle_released(team, puzzle, **kwargs):
+    if is_connect_auth_enabled() and team is not None:
+        team_id = team.id
+        puzzle_id = puzzle.id
+        transaction.on_commit(lambda: set_unlocked_bits(team_id, PUZZLE, [puzzle_id]))
+
+
+register(HuntEvent.PUZZLE_RELEASED, _on_puzzle_released)
+register(HuntEvent.METAPUZZLE_RELEASED, _on_puzzle_released)
+
+
+@receiver(post_save, sender=StoryCardAccess)
+def set_story_card_bit(sender, instance, created, **kwargs):
+    if is_connect_auth_enabled() and created:
+        team_id = instance.team_id
+        story_card_id = instance.story_card_id
+        transaction.on_commit(
+            lambda: set_unlocked_bits(team_id, STORY, [story_card_id])
+        )
+
+
+@receiver(post_delete, sender=StoryCardAccess)
+def reset_bitmaps_on_story_card_access_delete(sender, instance, **kwargs):
+    if is_connect_auth_enabled():
+        team_id = instance.team_id
+        transaction.on_commit(lambda: reset_unlocked_bitmaps(team_id))
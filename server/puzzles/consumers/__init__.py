@@ -175,6 +175,13 @@ class ClientConsumer(AsyncJsonWebsocketConsumer):
             if value is not None:
                 yield value
 
+    async def is_unlocked(self, token=None):
+        from puzzles.connect_auth import PUZZLE, STORY, is_connect_allowed
+
+        # NB: .startswith is stricter but would need special posthunt handling
+        kind = STORY if "/ws/story" in self.scope["path"] else PUZZLE
+        return await is_connect_allowed(self.user, kind, self.puzzle_slug, token)
+
     async def connect(self):
         if settings.IS_POSTHUNT:
             self.user = await sync_to_async(get_posthunt_user)()
@@ -194,21 +201,7 @@ class ClientConsumer(AsyncJsonWebsocketConsumer):
         )
         if self.puzzle_slug is not None and not IS_PYODIDE:
             # Check that the puzzle or story is unlocked
-            from puzzles.utils import is_unlocked
-
-            async_is_unlocked = sync_to_async(is_unlocked)
-
-            # NB: .startswith is stricter but would need special posthunt handling
-            if "/ws/story" in self.scope["path"]:
-                unlocked = await async_is_unlocked(
-                    user=self.user, story_slug=self.puzzle_slug
-                )
-            else:
-                unlocked = await async_is_unlocked(
-                    user=self.user, puzzle_slug=self.puzzle_slug
-                )
-
-            if not unlocked:
+            if not await self.is_unlocked(token=self.decode_qs(qs, b"token")):
                 return await self.close()
 
         self.session_id = self.decode_qs(qs, b"session_id", as_int=True)
@@ -226,6 +219,10 @@ class ClientConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_add(group, self.channel_name)
 
         await self.accept()
+        if not IS_PYODIDE:
+            from puzzles.connect_auth import get_reconnect_hint
+
+            await self.send_json({"key": "reconnect", "data": get_reconnect_hint()})
 
         # Call handler connect
         handler = self.get_handler(self.puzzle_slug)
@@ -241,7 +238,10 @@ class ClientConsumer(AsyncJsonWebsocketConsumer):
         await self.send_json(e["event"])
 
     async def call_handler(self, handler_fn, compress_gzip=False, **kwargs):
-        result = await sync_to_async(handler_fn)(**kwargs)
+        if asyncio.iscoroutinefunction(handler_fn):
+            result = await handler_fn(**kwargs)
+        else:
+            result = await sync_to_async(handler_fn)(**kwargs)
         if IS_PYODIDE:
             sync_indexeddb()
         if result is not None:
@@ -311,6 +311,16 @@ class ClientConsumer(AsyncJsonWebsocketConsumer):
         }
         run_async_to_sync(channel_layer.group_send, group, channels_data)
 
+    @staticmethod
+    def broadcast_event(group, key, data, *, priority=False, reducer=None):
+        """
+        Like send_event, but coalesced with other events sent to the group
+        within a short window. See puzzles.consumers.broadcast.
+        """
+        from puzzles.consumers.broadcast import broadcast_event
+
+        broadcast_event(group, key, data, priority=priority, reducer=reducer)
+
     @staticmethod
     async def async_send_event(group, key, data):
         channels_data = {
@@ -5,7 +5,14 @@ from spoilr.core.models import User
 
 
 class BasePuzzleHandler(ABC):
-    """Abstract class for handling websocket data."""
+    """
+    Abstract class for handling websocket data.
+
+    Callbacks may be defined with `async def` to run directly on the event loop,
+    in which case they must not block: use the async ORM methods or
+    puzzles.utils.get_async_redis_handle. Plain callbacks are run in a thread
+    with sync_to_async, which serializes them with all other sync code.
+    """
 
     @staticmethod
     @abstractmethod
@@ -14,11 +21,11 @@ class BasePuzzleHandler(ABC):
         pass
 
     @staticmethod
-    def connect(user: User, uuid: str, slug: str = None):
+    async def connect(user: User, uuid: str, slug: str = None):
         """Callback when a user connects."""
         pass
 
     @staticmethod
-    def disconnect(user: User, uuid: str, slug: str = None):
+    async def disconnect(user: User, uuid: str, slug: str = None):
         """Callback when a user disconnects."""
         pass
@@ -0,0 +1,145 @@
+"""
+Coalesces websocket events sent to the same group.
+
+ClientConsumer.send_event does a group_send for every event, and a burst of
+events (eg a guess unlocking several puzzles) becomes a burst of messages
+through the channel layer, whose Redis pub/sub queues are small. Events given
+to broadcast_event are instead collected per group for a short window and sent
+as one message per group:
+
+- Events with a reducer registered for their key are merged into the pending
+  event with the same key, if any, with reducer(pending_data, data).
+- Otherwise events are kept in the order they were broadcast.
+- A group with a single pending event gets it as usual. A group with several
+  gets one message with the key BATCH_KEY whose data is the list of events,
+  which the client unpacks.
+
+Priority events (eg solves) are sent immediately, along with anything pending
+for their group so that the order is preserved.
+
+Events are held in memory by the process that broadcast them, and sent by a
+timer thread when the window closes.
+"""
+import asyncio
+import atexit
+import os
+import threading
+import typing
+
+from django.conf import settings
+
+from puzzles.consumers import channel_layer, run_async_to_sync
+
+BATCH_KEY = "batch"
+
+Reducer = typing.Callable[[typing.Any, typing.Any], typing.Any]
+
+# Mapping from event key to the reducer merging events with that key.
+EVENT_REDUCERS: typing.Dict[str, Reducer] = {}
+
+
+def register_reducer(key, reducer: Reducer):
+    EVENT_REDUCERS[key] = reducer
+
+
+def keep_latest(prev_data, data):
+    """Reducer for events carrying a full snapshot of some state."""
+    return data
+
+
+def _get_channels_data(events):
+    if len(events) == 1:
+        key, data = events[0]
+        event = {"key": key, "data": data}
+    else:
+        event = {
+            "key": BATCH_KEY,
+            "data": [{"key": key, "data": data} for key, data in events],
+        }
+    return {"type": "handle.event", "event": event}
+
+
+async def _group_send_all(messages):
+    await asyncio.gather(
+        *(channel_layer.group_send(group, data) for group, data in messages)
+    )
+
+
+class CoalescingBroadcaster:
+    def __init__(self, window_s):
+        self.window_s = window_s
+        self.pid = os.getpid()
+        # Mapping from group to a list of [key, data] in broadcast order.
+        self.pending: typing.Dict[str, typing.List[list]] = {}
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, group, key, data, *, priority=False, reducer=None):
+        if reducer is None:
+            reducer = EVENT_REDUCERS.get(key)
+        with self.lock:
+            events = self.pending.setdefault(group, [])
+            pending_event = None
+            if reducer is not None:
+                pending_event = next(
+                    (event for event in events if event[0] == key), None
+                )
+            if pending_event is not None:
+                pending_event[1] = reducer(pending_event[1], data)
+            else:
+                events.append([key, data])
+            if priority:
+                del self.pending[group]
+            else:
+                if self.timer is None:
+                    self.timer = threading.Timer(self.window_s, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+        self._send({group: events})
+
+    def flush(self):
+        """Sends everything pending now."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if pending:
+            self._send(pending)
+
+    def _send(self, pending):
+        run_async_to_sync(
+            _group_send_all,
+            [(group, _get_channels_data(events)) for group, events in pending.items()],
+        )
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+
+    # Forked processes (eg Celery workers) do not inherit the timer thread.
+    if _broadcaster is None or _broadcaster.pid != os.getpid():
+        with _broadcaster_lock:
+            if _broadcaster is None or _broadcaster.pid != os.getpid():
+                _broadcaster = CoalescingBroadcaster(
+                    settings.WEBSOCKET_BROADCAST_WINDOW_S
+                )
+                atexit.register(_broadcaster.flush)
+    return _broadcaster
+
+
+def broadcast_event(group, key, data, *, priority=False, reducer=None):
+    """
+    Like ClientConsumer.send_event, but coalesced with other events sent to the
+    group within WEBSOCKET_BROADCAST_WINDOW_S. Set priority to send right away.
+    reducer overrides the reducer registered for the key.
+    """
+    if settings.IS_PYODIDE or not settings.WEBSOCKET_BROADCAST_WINDOW_S:
+        # No threads when running in pyodide.
+        priority = True
+    get_broadcaster().add(group, key, data, priority=priority, reducer=reducer)
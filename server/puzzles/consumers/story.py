@@ -5,6 +5,7 @@ from datetime import datetime, timedelta, timezone
 from typing import List
 
 from puzzles.consumers import ClientConsumer
+from puzzles.consumers.broadcast import keep_latest
 from puzzles.models import Team
 from puzzles.models.interactive_cache import SessionCacheManager
 from puzzles.models.story import StateEnum, StoryCard, StoryState
@@ -40,7 +41,8 @@ def get_countdown(node):
 
 def send_message(user, slug, data=None):
     group = ClientConsumer.get_puzzle_group(user=user, id=user.team_id, slug=slug)
-    ClientConsumer.send_event(group, slug, data)
+    # Each message is the full session, so only the latest one matters.
+    ClientConsumer.broadcast_event(group, slug, data, reducer=keep_latest)
 
 
 def add_uuid(l: List[str], uuid: str) -> List[str]:
@@ -75,6 +77,7 @@ def select_winner(slug, session, team, tree):
     # Compute the transition with max number of votes
     current_votes = -1
     next_state = None
+    next_node = None
     selected_text = None
     for i, option in enumerate(session["state"]["dialogue"]["transitions"]):
         state = option["state"]
@@ -82,6 +85,8 @@ def select_winner(slug, session, team, tree):
         num_votes = len(votes[i]) if votes else 0
         if num_votes > current_votes:
             next_state = state
+            # Sessions started before node links were compiled don't have it.
+            next_node = option.get("node")
             current_votes = num_votes
             selected_text = option.get("text")
 
@@ -94,7 +99,9 @@ def select_winner(slug, session, team, tree):
         session["finish_time"] = datetime.now(tz=timezone.utc)
         complete_session(slug, session, team)
     else:
-        session["state"]["dialogue"] = get_next_state(slug, tree, team, next_state)
+        session["state"]["dialogue"] = get_next_state(
+            slug, tree, team, next_state, node=next_node
+        )
         init_timer(session)
 
 
@@ -3,10 +3,10 @@ import datetime
 import email
 import email.message
 import email.policy
+import functools
 import itertools
 import logging
 import math
-import smtplib
 import time
 import traceback
 from collections import namedtuple
@@ -29,16 +29,13 @@ from spoilr.registration.models import TeamRegistrationInfo
 
 from puzzles.celery import celery_app
 from puzzles.models import Team
+from puzzles.smtp_pool import ParallelSender, get_smtp_pool
 from puzzles.utils import redis_lock
 
 task_logger = get_task_logger(__name__)  # for Celery tasks
 django_logger = logging.getLogger("django")  # for single process tasks
 
 
-# port 465 starts in SSL mode, port 587 needs to upgrade the connection
-SMTP = smtplib.SMTP if settings.EMAIL_PORT == 587 else smtplib.SMTP_SSL
-
-
 class ImapClient:
     class ConnectionError(RuntimeError):
         pass
@@ -434,18 +431,10 @@ def task_send_email(
                 f"Sending email with Subject: {email_message.get('Subject', '')!r} Message-Id: {email_message.get('Message-ID')} to {recipients}."
             )
             if active_connection is not None:
-                connection = active_connection
-                cm = contextlib.nullcontext()
+                cm = contextlib.nullcontext(active_connection)
             else:
-                connection = SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT)
-                cm = connection
-            with cm:
-                if connection is not active_connection:
-                    if settings.EMAIL_PORT == 587:
-                        connection.starttls()
-                    connection.login(
-                        settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD
-                    )
+                cm = get_smtp_pool().connection()
+            with cm as connection:
                 connection.sendmail(
                     sendfrom_address,
                     recipients,
@@ -482,10 +471,7 @@ def task_resend_emails(
         for pk in pks:
             task_send_email.delay(pk, blocking_timeout=blocking_timeout)
     elif pks:
-        with SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT) as connection:
-            if settings.EMAIL_PORT == 587:
-                connection.starttls()
-            connection.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
+        with get_smtp_pool().connection() as connection:
             for pk in pks:
                 try:
                     task_send_email(
@@ -566,21 +552,14 @@ def task_send_email_template(
         if not batches:
             return
 
-        SMTP = smtplib.SMTP if settings.EMAIL_PORT == 587 else smtplib.SMTP_SSL
-        with SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT) as connection:
-            if settings.EMAIL_PORT == 587:
-                connection.starttls()
-            connection.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
-
+        # The batch delay is now the spacing between sends across all connections,
+        # so emails go out at the same rate without waiting on each other.
+        rate = 1000 / template_obj.batch_delay_ms if template_obj.batch_delay_ms else 0
+        with ParallelSender(task_send_email, rate=rate) as sender:
             if template_obj.status == EmailTemplate.SCHEDULED:
                 template_obj.status = EmailTemplate.SENDING
 
-            is_first = True
             for batch in batches:
-                if not is_first:
-                    time.sleep(template_obj.batch_delay_ms / 1000)
-                is_first = False
-
                 email_obj = email_obj_for_batch(template_obj, batch)
                 if batch.user is not None:
                     template_obj.last_user_pk = max(
@@ -594,6 +573,8 @@ def task_send_email_template(
                     template_obj.last_address_index = max(
                         template_obj.last_address_index, batch.address_index
                     )
+                # Checkpoint progress in the same transaction that creates the
+                # email, so a retry never skips or duplicates a batch.
                 with transaction.atomic():
                     template_obj.save(
                         update_fields=(
@@ -606,10 +587,7 @@ def task_send_email_template(
                     if email_obj.all_recipients:
                         email_obj.save()
                         transaction.on_commit(
-                            lambda: task_send_email(
-                                email_obj.pk,
-                                active_connection=connection,
-                            )
+                            functools.partial(sender.submit, email_obj.pk)
                         )
         template_obj.status = EmailTemplate.SENT
         template_obj.save(update_fields=("status",))
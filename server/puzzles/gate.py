@@ -0,0 +1,205 @@
+"""
+Fast path for the access checks Caddy makes before serving puzzle files.
+
+Every file under a puzzle (images, scripts, fonts) is checked separately by
+check_access_allowed, which builds a full Context and evaluates unlocks. To
+keep a puzzle page with dozens of assets cheap:
+
+- Each team's unlocked puzzle slugs are kept in a Redis set, filled in from
+  the first full unlock evaluation and extended as puzzles are released. A
+  slug in the set is allowed without evaluating unlocks. A slug missing from
+  an existing set is checked against the database, without rebuilding the set.
+- Allow decisions are remembered per (session, path prefix) for a few seconds,
+  where the prefix covers everything check_access_allowed looks at.
+  A remembered decision is answered by middleware right after the session is
+  loaded, before the user is fetched, so it does not touch the database.
+
+Denials are never remembered, since a denied slug may be about to unlock.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.core import signing
+from django.db import transaction
+from django.http import HttpResponse
+from spoilr.core.api.events import HuntEvent, register
+from spoilr.core.api.team import IMPERSONATE_SESSION_KEY
+from tph.utils import get_site
+
+GATE_DECISION_TIMEOUT_S = 30
+# Long enough to cover a hunt, the set is rebuilt on the next miss if evicted.
+UNLOCKED_SLUGS_TIMEOUT_S = 7 * 24 * 60 * 60
+UNLOCKED_SLUGS_KEY_FORMAT = "gate:unlocked:{}"
+DECISION_KEY_FORMAT = "gate:decision:{}"
+CHECK_PATH_PREFIX = "/check/"
+# Top level paths whose access depends only on the puzzle slug that follows,
+# and for puzzles the subpart after it.
+GATED_PATHS = ("puzzles", "hints")
+# Session entries that change who the request is acting as.
+IDENTITY_SESSION_KEYS = (
+    SESSION_KEY,
+    HASH_SESSION_KEY,
+    "_impersonate",
+    IMPERSONATE_SESSION_KEY,
+)
+
+# Redis runs Lua 5.1, where unpack is a global, while the Lua 5.4 used by
+# fakeredis only has table.unpack.
+_LUA_UNPACK = "local unpack = table.unpack or unpack\n"
+# Adds slugs to a team's set only if the set exists, so that a partial set is
+# never mistaken for a complete one.
+_ADD_IF_EXISTS_SCRIPT = (
+    _LUA_UNPACK
+    + """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    redis.call("SADD", KEYS[1], unpack(ARGV))
+end
+"""
+)
+# Creates the team's set only if it does not exist, so that a set built from a
+# stale unlock evaluation never replaces one that releases have extended.
+_CREATE_IF_MISSING_SCRIPT = (
+    _LUA_UNPACK
+    + """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    redis.call("SADD", KEYS[1], unpack(ARGV, 2))
+    redis.call("EXPIRE", KEYS[1], ARGV[1])
+end
+"""
+)
+
+_signer = signing.Signer(salt="puzzles.gate")
+
+
+def _redis():
+    # Import here to avoid circular import
+    from puzzles.utils import get_redis_handle
+
+    return get_redis_handle()
+
+
+def is_gate_enabled():
+    # The static site has no Caddy in front of it, or Redis.
+    return not settings.IS_PYODIDE
+
+
+def get_gate_prefix(original_path):
+    """
+    Returns the path prefix that decides access to the path, if any. Paths
+    under a puzzle also depend on the subpart after the slug, which
+    check_access_allowed checks with Context.is_minipuzzle_unlocked.
+    """
+    parts = original_path.split("/")
+    if len(parts) < 2 or parts[0] not in GATED_PATHS or not parts[1]:
+        return None
+    if parts[0] == "puzzles" and len(parts) >= 3 and parts[2]:
+        return f"/{parts[0]}/{parts[1]}/{parts[2]}"
+    return f"/{parts[0]}/{parts[1]}"
+
+
+def accel_redirect_response(uri):
+    """Returns a response telling Caddy to serve the uri."""
+    response = HttpResponse(status=200)
+    response["X-Accel-Redirect"] = uri
+    return response
+
+
+def _get_decision_key(request, prefix):
+    session_key = request.session.session_key
+    if not session_key:
+        return None
+    identity = tuple(request.session.get(key) for key in IDENTITY_SESSION_KEYS)
+    digest = hashlib.sha256(
+        repr((session_key, identity, get_site(request), prefix)).encode()
+    ).hexdigest()
+    return DECISION_KEY_FORMAT.format(digest)
+
+
+def has_allow_decision(request, prefix):
+    """Whether access to the prefix was allowed for this session recently."""
+    key = _get_decision_key(request, prefix)
+    if key is None:
+        return False
+    value = _redis().get(key)
+    if value is None:
+        return False
+    try:
+        return _signer.unsign(value.decode()) == key
+    except signing.BadSignature:
+        return False
+
+
+def remember_allow_decision(request, prefix):
+    key = _get_decision_key(request, prefix)
+    if key is not None:
+        _redis().set(key, _signer.sign(key), ex=GATE_DECISION_TIMEOUT_S)
+
+
+def get_slug_unlocked_state(team_id, slug):
+    """
+    Returns (whether the slug is in the team's unlocked set, whether the set
+    exists), with a single round trip.
+    """
+    key = UNLOCKED_SLUGS_KEY_FORMAT.format(team_id)
+    pipeline = _redis().pipeline(transaction=False)
+    pipeline.sismember(key, slug)
+    pipeline.exists(key)
+    is_member, exists = pipeline.execute()
+    return bool(is_member), bool(exists)
+
+
+def init_unlocked_slugs(team_id, slugs):
+    """Fills in the team's unlocked set with the slugs of all its puzzles."""
+    if slugs:
+        _redis().eval(
+            _CREATE_IF_MISSING_SCRIPT,
+            1,
+            UNLOCKED_SLUGS_KEY_FORMAT.format(team_id),
+            UNLOCKED_SLUGS_TIMEOUT_S,
+            *slugs,
+        )
+
+
+def add_unlocked_slugs(team_id, slugs):
+    if slugs:
+        _redis().eval(
+            _ADD_IF_EXISTS_SCRIPT, 1, UNLOCKED_SLUGS_KEY_FORMAT.format(team_id), *slugs
+        )
+
+
+def reset_unlocked_slugs(team_id):
+    """Forces the next check for this team to evaluate unlocks."""
+    _redis().delete(UNLOCKED_SLUGS_KEY_FORMAT.format(team_id))
+
+
+def access_gate_middleware(get_response):
+    """Answers checks that were recently allowed before anything else runs."""
+
+    def middleware(request):
+        if (
+            is_gate_enabled()
+            and request.method == "GET"
+            and request.path_info.startswith(CHECK_PATH_PREFIX)
+        ):
+            original_path = request.path_info[len(CHECK_PATH_PREFIX) :]
+            prefix = get_gate_prefix(original_path)
+            if prefix is not None and has_allow_decision(request, prefix):
+                query_string = request.META.get("QUERY_STRING", "")
+                return accel_redirect_response(
+                    "/" + original_path + ("?" + query_string if query_string else "")
+                )
+        return get_response(request)
+
+    return middleware
+
+
+def _on_puzzle_released(team, puzzle, **kwargs):
+    if is_gate_enabled() and team is not None:
+        team_id = team.id
+        slug = puzzle.slug
+        transaction.on_commit(lambda: add_unlocked_slugs(team_id, [slug]))
+
+
+register(HuntEvent.PUZZLE_RELEASED, _on_puzzle_released)
+register(HuntEvent.METAPUZZLE_RELEASED, _on_puzzle_released)
@@ -0,0 +1,95 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from spoilr.core.models import Puzzle, PuzzleSubmission, Round, Team
+from spoilr.hq.util.export import keyset_iterator, stream_csv
+
+BENCHMARK_SLUG = "benchmark-csv-export"
+INSERT_BATCH_SIZE = 10000
+# Allowed growth in peak memory between the first tenth of the export and the end.
+MAX_PEAK_GROWTH_BYTES = 2 * 1024 * 1024
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams a CSV of synthetic guesses and checks that memory stays flat. "
+        "The guesses are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._benchmark(options["rows"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _benchmark(self, num_rows):
+        team = Team.objects.create(username=BENCHMARK_SLUG, name=BENCHMARK_SLUG)
+        bench_round = Round.objects.create(
+            slug=BENCHMARK_SLUG, name=BENCHMARK_SLUG, order=-1_000_000
+        )
+        puzzle = Puzzle.objects.create(
+            external_id=-1_000_000,
+            round=bench_round,
+            slug=BENCHMARK_SLUG,
+            name=BENCHMARK_SLUG,
+            answer="ANSWER",
+            order=0,
+        )
+        for start in range(0, num_rows, INSERT_BATCH_SIZE):
+            PuzzleSubmission.objects.bulk_create(
+                PuzzleSubmission(
+                    team=team,
+                    puzzle=puzzle,
+                    raw_answer=f"guess {i}",
+                    answer=f"GUESS{i}",
+                    correct=i % 100 == 0,
+                )
+                for i in range(start, min(start + INSERT_BATCH_SIZE, num_rows))
+            )
+
+        rows = keyset_iterator(
+            PuzzleSubmission.objects.filter(team=team),
+            "timestamp",
+            "team__name",
+            "puzzle__name",
+            "answer",
+            "correct",
+            ordering=("timestamp", "pk"),
+        )
+        early_peak = None
+
+        def count_rows():
+            nonlocal early_peak
+            for i, row in enumerate(rows):
+                if i == num_rows // 10:
+                    early_peak = tracemalloc.get_traced_memory()[1]
+                yield row
+
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        num_bytes = 0
+        try:
+            for chunk in stream_csv(count_rows()):
+                num_bytes += len(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        elapsed = time.perf_counter() - start_time
+
+        self.stdout.write(
+            f"Exported {num_rows} rows ({num_bytes / 1e6:.1f} MB) in {elapsed:.1f}s, "
+            f"peak memory {early_peak / 1e6:.2f} MB early, {peak / 1e6:.2f} MB at end"
+        )
+        if peak - early_peak > MAX_PEAK_GROWTH_BYTES:
+            raise CommandError("Memory grew with the number of rows exported")
@@ -0,0 +1,452 @@
+import datetime
+import statistics
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from spoilr.core.models import (
+    HuntSetting,
+    RoundAccess,
+    TeamType,
+    User,
+    UserTeamRole,
+)
+from spoilr.contact.models import ContactRequest
+from spoilr.email.models import Email
+from spoilr.hints.models import Hint
+from spoilr.hq.models import Handler, Task
+from spoilr.utils import json
+
+from puzzles.consumers import ClientConsumer
+from puzzles.models import Puzzle, PuzzleAccess, PuzzleSubmission, Round, Team
+
+BENCHMARK_SLUG = "benchmark"
+TIMEOUT_S = 60
+# Size of the MIME source of each seeded email, as if it had an attachment.
+EMAIL_RAW_SIZE = 10000
+
+# Pages that should make the same number of queries however many rows they
+# show, checked like assertNumQueries before the benchmarks run.
+CONSTANT_QUERY_PAGES = {
+    "spoilr.hints:dashboard": (
+        "?open=0&limit=10",
+        "?open=0&limit=200",
+        "?open=1&limit=10",
+        "?open=1&limit=200",
+    ),
+    "spoilr.contact:dashboard": ("?open=0&limit=10", "?open=0&limit=200"),
+    "spoilr.email:archive": ("?hidden=0&limit=10", "?hidden=0&limit=200"),
+}
+
+HQ_DASHBOARDS = (
+    "spoilr.hq:dashboard",
+    "spoilr.hints:dashboard",
+    "spoilr.email:dashboard",
+    "spoilr.email:archive",
+    "spoilr.interaction:dashboard",
+    "spoilr.contact:dashboard",
+    "spoilr.progress:teams",
+    "spoilr.progress:puzzles",
+)
+
+
+def summarize(timings, num_queries, statuses):
+    """Summarizes the seconds taken by each call, like pytest-benchmark."""
+    mean = statistics.mean(timings)
+    return {
+        "rounds": len(timings),
+        "min": min(timings),
+        "max": max(timings),
+        "mean": mean,
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0,
+        "median": statistics.median(timings),
+        "p95": sorted(timings)[int(len(timings) * 0.95)],
+        "ops": 1 / mean if mean else None,
+        "queries": num_queries / len(timings),
+        "statuses": statuses,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the hot paths of the hunt site against a test database "
+        "seeded with teams, puzzles, guesses and hints, and prints the timings "
+        "as JSON. Run with DJANGO_SETTINGS_MODULE=tph.settings.benchmark to "
+        "stand in fakeredis and an in-memory channel layer for the docker "
+        "services. Pass --compare with an earlier output to check for "
+        "regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teams", type=int, default=50)
+        parser.add_argument("--puzzles", type=int, default=40)
+        parser.add_argument("--submissions", type=int, default=2000)
+        parser.add_argument("--hints", type=int, default=200)
+        parser.add_argument("--emails", type=int, default=5000)
+        parser.add_argument("--rounds", type=int, default=50, help="Per benchmark")
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--benchmark",
+            action="append",
+            dest="benchmarks",
+            help="Only run these benchmarks",
+        )
+        parser.add_argument("--output", help="File to write the results to")
+        parser.add_argument("--compare", help="Results to compare the medians to")
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            default=1.25,
+            help="Fail if a median grows by more than this factor",
+        )
+
+    def handle(self, *args, **options):
+        if settings.IS_PYODIDE:
+            raise CommandError("The static site has no hot paths")
+        if not settings.FAKE_REDIS:
+            raise CommandError("Run with DJANGO_SETTINGS_MODULE=tph.settings.benchmark")
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seed = self._seed(options)
+            query_counts = self._check_query_counts()
+            benchmarks = self._get_benchmarks(seed)
+            names = options["benchmarks"] or list(benchmarks)
+            unknown = set(names) - set(benchmarks)
+            if unknown:
+                raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+            results = {
+                "config": {
+                    "database": connection.vendor,
+                    **{
+                        key: options[key]
+                        for key in (
+                            "teams",
+                            "puzzles",
+                            "submissions",
+                            "hints",
+                            "emails",
+                        )
+                    },
+                },
+                "benchmarks": {
+                    name: self._run(benchmarks[name], options) for name in names
+                },
+                "query_counts": query_counts,
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+        if options["compare"]:
+            self._compare(results, options["compare"], options["max_regression"])
+
+    def _seed(self, options):
+        now = timezone.now()
+        for name, value in (
+            ("spoilr.hunt.launch_time", now - datetime.timedelta(days=1)),
+            ("spoilr.hunt.end_time", now + datetime.timedelta(days=1)),
+        ):
+            HuntSetting.objects.update_or_create(
+                name=name, defaults={"date_value": value}
+            )
+        # The hunt settings are cached.
+        for alias in caches:
+            caches[alias].clear()
+
+        num_puzzles = options["puzzles"]
+        rounds = [
+            Round.objects.create(
+                slug=f"{BENCHMARK_SLUG}-round-{i}",
+                name=f"{BENCHMARK_SLUG} round {i}",
+                order=i,
+            )
+            for i in range(max(num_puzzles // 10, 1))
+        ]
+        puzzles = [
+            Puzzle.objects.create(
+                external_id=i,
+                round=rounds[i % len(rounds)],
+                slug=f"{BENCHMARK_SLUG}-puzzle-{i}",
+                name=f"{BENCHMARK_SLUG} puzzle {i}",
+                answer=f"ANSWER {i}",
+                order=i,
+                deep=0,
+            )
+            for i in range(num_puzzles)
+        ]
+
+        teams = []
+        for i in range(options["teams"]):
+            team = Team.objects.create(
+                username=f"{BENCHMARK_SLUG}-{i}", name=f"{BENCHMARK_SLUG} {i}"
+            )
+            User.objects.create_user(
+                username=team.username,
+                password=BENCHMARK_SLUG,
+                team=team.spoilr_team,
+                team_role=UserTeamRole.SHARED_ACCOUNT,
+            )
+            teams.append(team)
+        RoundAccess.objects.bulk_create(
+            RoundAccess(team_id=team.id, round_id=round.id)
+            for team in teams
+            for round in rounds
+        )
+        # Every third puzzle is solved.
+        PuzzleAccess.objects.bulk_create(
+            PuzzleAccess(
+                team_id=team.id,
+                puzzle_id=puzzle.id,
+                solved=(i + j) % 3 == 0,
+                solved_time=now if (i + j) % 3 == 0 else None,
+            )
+            for i, team in enumerate(teams)
+            for j, puzzle in enumerate(puzzles)
+        )
+        for i, team in enumerate(teams):
+            for j, puzzle in enumerate(puzzles):
+                if (i + j) % 3 == 0:
+                    PuzzleSubmission.objects.create(
+                        team=team.spoilr_team,
+                        puzzle=puzzle.spoilr_puzzle,
+                        raw_answer=puzzle.answer,
+                        answer=puzzle.normalized_answer,
+                        correct=True,
+                        used_free_answer=False,
+                    )
+        for i in range(options["submissions"]):
+            PuzzleSubmission.objects.create(
+                team=teams[i % len(teams)].spoilr_team,
+                puzzle=puzzles[i // len(teams) % len(puzzles)].spoilr_puzzle,
+                raw_answer=f"wrong {i}",
+                answer=f"WRONG{i}",
+                correct=False,
+                used_free_answer=False,
+            )
+        for i in range(options["hints"]):
+            hint = Hint.objects.create(
+                team=teams[i % len(teams)].spoilr_team,
+                puzzle=puzzles[i % len(puzzles)].spoilr_puzzle,
+                text_content=f"Hint request {i}",
+            )
+            # Every fourth thread has a response and a follow-up request.
+            if i % 4 == 0:
+                hint.response = Hint.objects.create(
+                    team=hint.team,
+                    puzzle=hint.puzzle,
+                    root_ancestor_request=hint,
+                    is_request=False,
+                    text_content=f"Hint response {i}",
+                    status=Hint.ANSWERED,
+                )
+                hint.status = Hint.ANSWERED
+                hint.save()
+                Hint.objects.create(
+                    team=hint.team,
+                    puzzle=hint.puzzle,
+                    root_ancestor_request=hint,
+                    text_content=f"Hint follow-up {i}",
+                )
+
+        admin_team = Team.objects.create(
+            username=f"{BENCHMARK_SLUG}-admin",
+            name=f"{BENCHMARK_SLUG} admin",
+            type=TeamType.INTERNAL,
+        )
+        # Half of the contact requests are claimed.
+        handler = Handler.objects.create(name=BENCHMARK_SLUG, discord=BENCHMARK_SLUG)
+        for i in range(options["hints"] // 4):
+            contact_request = ContactRequest.objects.create(
+                team=teams[i % len(teams)].spoilr_team,
+                email=f"{BENCHMARK_SLUG}-{i}@example.com",
+                comment=f"Contact request {i}",
+            )
+            contact_request.tasks.add(
+                Task(handler=handler, claim_time=now) if i % 2 else Task(),
+                bulk=False,
+            )
+        # Half of the emails are sent by a handler, and every tenth received
+        # email is still in the queue.
+        raw_content = b"X" * EMAIL_RAW_SIZE
+        emails = Email.objects.bulk_create(
+            Email(
+                team=teams[i % len(teams)].spoilr_team,
+                subject=f"Email {i}",
+                text_content=f"Email body {i}",
+                html_content=f"<p>Email body {i}</p>",
+                raw_content=raw_content,
+                from_address=f"{BENCHMARK_SLUG}-{i}@example.com",
+                is_from_us=bool(i % 2),
+                created_via_webapp=bool(i % 2),
+                status=Email.SENT if i % 2 else Email.RECEIVED_NO_REPLY,
+                sent_datetime=now,
+                author=handler if i % 2 else None,
+            )
+            for i in range(options["emails"])
+        )
+        Task.objects.bulk_create(Task(content_object=email) for email in emails[::20])
+
+        User.objects.create_superuser(
+            username=admin_team.username,
+            password=BENCHMARK_SLUG,
+            team=admin_team.spoilr_team,
+            team_role=UserTeamRole.SHARED_ACCOUNT,
+        )
+        return teams, puzzles
+
+    def _check_query_counts(self):
+        """Returns the query counts of each CONSTANT_QUERY_PAGES url."""
+        client = Client()
+        client.force_login(User.objects.get(username=f"{BENCHMARK_SLUG}-admin"))
+        query_counts = {}
+        for url_name, queries in CONSTANT_QUERY_PAGES.items():
+            url = reverse(url_name)
+            # The first request also loads the session and caches.
+            client.get(url + queries[0])
+            counts = {}
+            for query in queries:
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url + query)
+                if response.status_code != 200:
+                    raise CommandError(f"{url}{query}: {response.status_code}")
+                counts[query] = len(context.captured_queries)
+            if len(set(counts.values())) > 1:
+                raise CommandError(f"{url} makes a varying number of queries: {counts}")
+            query_counts[url_name] = counts
+        return query_counts
+
+    def _get_benchmarks(self, seed):
+        """Returns a mapping from name to a function making one call."""
+        teams, puzzles = seed
+        clients = []
+        for team in teams:
+            client = Client()
+            client.force_login(team.user_set.get())
+            clients.append(client)
+        admin_client = Client()
+        admin_client.force_login(User.objects.get(username=f"{BENCHMARK_SLUG}-admin"))
+
+        def cycle(i):
+            return clients[i % len(clients)], puzzles[i // len(clients) % len(puzzles)]
+
+        def puzzle_data(i):
+            client, puzzle = cycle(i)
+            return client.get(f"/api/puzzle/{puzzle.slug}").status_code
+
+        def submit_answer(i):
+            client, puzzle = cycle(i)
+            return client.post(
+                f"/api/solve/{puzzle.slug}",
+                {"answer": f"benchmark {uuid.uuid4().hex}", "uuid": uuid.uuid4().hex},
+            ).status_code
+
+        def get_rounds(i):
+            client, _ = cycle(i)
+            return client.get("/api/rounds").status_code
+
+        def check_access_allowed(i):
+            client, puzzle = cycle(i)
+            return client.get(f"/check/puzzles/{puzzle.slug}").status_code
+
+        def load_emails(i):
+            return len([email.subject for email in Email.objects.all()])
+
+        def load_emails_lite(i):
+            return len([email.subject for email in Email.objects.lite()])
+
+        def websocket_connect(i):
+            _, puzzle = cycle(i)
+            user = teams[i % len(teams)].user_set.get()
+            return async_to_sync(self._connect)(user, puzzle.slug)
+
+        benchmarks = {
+            "puzzle_data": puzzle_data,
+            "submit_answer": submit_answer,
+            "get_rounds": get_rounds,
+            "check_access_allowed": check_access_allowed,
+            "websocket_connect": websocket_connect,
+            "load_emails": load_emails,
+            "load_emails_lite": load_emails_lite,
+        }
+        for url_name in HQ_DASHBOARDS:
+            url = reverse(url_name)
+            benchmarks[
+                url_name.partition(".")[2]
+            ] = lambda i, url=url: admin_client.get(url).status_code
+        return benchmarks
+
+    async def _connect(self, user, slug):
+        communicator = ApplicationCommunicator(
+            ClientConsumer.as_asgi(),
+            {
+                "type": "websocket",
+                "path": f"/ws/puzzles/{slug}",
+                "query_string": f"slug={slug}".encode(),
+                "headers": [],
+                "subprotocols": [],
+                "user": user,
+                "url_route": {"kwargs": {"slug": slug}},
+            },
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        response = await communicator.receive_output(TIMEOUT_S)
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait(TIMEOUT_S)
+        return response["type"]
+
+    def _run(self, call, options):
+        for i in range(options["warmup"]):
+            call(i)
+
+        num_queries = 0
+
+        def count_queries(execute, *args):
+            nonlocal num_queries
+            num_queries += 1
+            return execute(*args)
+
+        timings = []
+        statuses = {}
+        with connection.execute_wrapper(count_queries):
+            for i in range(options["warmup"], options["warmup"] + options["rounds"]):
+                start_time = time.perf_counter()
+                status = call(i)
+                timings.append(time.perf_counter() - start_time)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return summarize(timings, num_queries, statuses)
+
+    def _compare(self, results, path, max_regression):
+        with open(path) as f:
+            baseline = json.load(f)["benchmarks"]
+        regressions = []
+        for name, result in results["benchmarks"].items():
+            if name not in baseline:
+                continue
+            ratio = result["median"] / baseline[name]["median"]
+            self.stderr.write(f"{name}: {ratio:.2f}x the baseline median")
+            if ratio > max_regression:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f"Regressed: {', '.join(regressions)}")
@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from spoilr.utils import json
+
+from puzzles.rate_limits import (
+    MemoryRateLimitBackend,
+    RateLimiter,
+    RateLimitResult,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from puzzles.utils import get_redis_handle, redis_lock
+
+BENCHMARK_SLUG = "benchmark-rate-limits"
+
+
+class LockRateLimiter(RateLimiter):
+    """A sliding window guarded by redis_lock, as rate limits were built before."""
+
+    def hit(self, key, cost=1):
+        redis_key = self.get_redis_key(key)
+        redis_handle = get_redis_handle()
+        with redis_lock(f"{redis_key}:lock", timeout=settings.REDIS_FAST_TIMEOUT):
+            now = time.time()
+            hits = json.loads(redis_handle.get(redis_key) or "[]")
+            hits = [t for t in hits if t > now - self.window]
+            allowed = len(hits) + cost <= self.limit
+            if allowed:
+                hits.extend([now] * cost)
+                redis_handle.set(redis_key, json.dumps(hits), ex=self.window)
+        return RateLimitResult(
+            allowed=allowed, remaining=self.limit - len(hits), retry_after=0
+        )
+
+    def reset(self, key):
+        get_redis_handle().delete(self.get_redis_key(key))
+
+
+class Command(BaseCommand):
+    help = (
+        "Hits a few rate limit keys from many threads at once and reports the "
+        "throughput of each rate limiter, and checks that none allowed more "
+        "hits than its limit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--hits", type=int, default=200, help="Per thread")
+        parser.add_argument("--keys", type=int, default=4)
+        parser.add_argument("--rate", default="100/m")
+
+    def handle(self, *args, **options):
+        if settings.IS_PYODIDE:
+            raise CommandError("The static site has no Redis")
+        name = BENCHMARK_SLUG
+        rate = options["rate"]
+        limiters = [
+            ("redis lock", LockRateLimiter(rate, name=name)),
+            ("sliding window", SlidingWindowRateLimiter(rate, name=name)),
+            ("token bucket", TokenBucketRateLimiter(rate, name=name)),
+            (
+                "sliding window, memory",
+                SlidingWindowRateLimiter(
+                    rate, name=name, backend=MemoryRateLimitBackend()
+                ),
+            ),
+        ]
+        num_threads = options["threads"]
+        num_hits = options["hits"]
+        keys = [f"key{i}" for i in range(options["keys"])]
+        for label, limiter in limiters:
+            for key in keys:
+                limiter.reset(key)
+
+            def run(thread_index):
+                allowed = 0
+                for i in range(num_hits):
+                    key = keys[(thread_index + i) % len(keys)]
+                    allowed += limiter.hit(key).allowed
+                return allowed
+
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(num_threads) as executor:
+                allowed = sum(executor.map(run, range(num_threads)))
+            elapsed = time.perf_counter() - start_time
+            for key in keys:
+                limiter.reset(key)
+
+            total = num_threads * num_hits
+            self.stdout.write(
+                f"{label}: {total / elapsed:.0f} hits/s, "
+                f"{allowed} of {total} allowed"
+            )
+            # Token buckets also refill during the run.
+            if label != "token bucket" and allowed > limiter.limit * len(keys):
+                raise CommandError(f"{label} allowed more hits than its limit")
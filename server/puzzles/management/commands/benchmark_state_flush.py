@@ -0,0 +1,129 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from puzzles.models import Puzzle, Team
+from puzzles.models.interactive import Session
+from puzzles.models.interactive_cache import (
+    DIRTY_STATES_KEY,
+    SessionCacheManager,
+    flush_dirty_states,
+    get_dirty_states_stats,
+)
+from puzzles.utils import get_redis_handle
+from tph.constants import IS_PYODIDE
+
+BENCHMARK_SLUG = "benchmark-state-flush"
+
+
+class BenchmarkSessionCacheManager(SessionCacheManager):
+    """Leaves the dirty states queued for the benchmark to flush."""
+
+    def schedule_db_flush(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mutates many cached sessions from concurrent threads, then reports the "
+        "time and queries to write them to the database one at a time and in "
+        "batches. The teams and sessions are created for the run and deleted "
+        "afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=10000)
+        parser.add_argument("--threads", type=int, default=16)
+
+    def handle(self, *args, **options):
+        if IS_PYODIDE:
+            raise CommandError("The static site writes states directly")
+        puzzle_ids = list(Puzzle.objects.order_by("id").values_list("id", flat=True))
+        if not puzzle_ids:
+            raise CommandError("Needs at least one puzzle")
+        if get_redis_handle().zcard(DIRTY_STATES_KEY):
+            raise CommandError("Flush the queued states before benchmarking")
+
+        num_sessions = options["sessions"]
+        teams = [
+            Team.objects.create(
+                username=f"{BENCHMARK_SLUG}-{i}", name=f"{BENCHMARK_SLUG}-{i}"
+            )
+            for i in range(math.ceil(num_sessions / len(puzzle_ids)))
+        ]
+        id_kwargs = [
+            {"team_id": team.id, "puzzle_id": puzzle_id, "storycard_id": None}
+            for team in teams
+            for puzzle_id in puzzle_ids
+        ][:num_sessions]
+        Session.objects.bulk_create(
+            Session(**kwargs, state={"count": 0}) for kwargs in id_kwargs
+        )
+        try:
+            self._benchmark(id_kwargs, options["threads"])
+        finally:
+            get_redis_handle().delete(
+                DIRTY_STATES_KEY,
+                *(
+                    BenchmarkSessionCacheManager(**kwargs).data_handle.key
+                    for kwargs in id_kwargs
+                ),
+            )
+            Team.objects.filter(id__in=[team.id for team in teams]).delete()
+
+    def _benchmark(self, id_kwargs, num_threads):
+        def mutate(kwargs):
+            try:
+                with BenchmarkSessionCacheManager(**kwargs, throttle_interval=1) as cm:
+                    data = cm.get_no_create()
+                    data["state"]["count"] += 1
+                    cm.set(data)
+            finally:
+                connections.close_all()
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(num_threads) as executor:
+            list(executor.map(mutate, id_kwargs))
+        elapsed = time.perf_counter() - start_time
+        backlog, lag = get_dirty_states_stats()
+        self.stdout.write(
+            f"mutated {len(id_kwargs)} sessions from {num_threads} threads in "
+            f"{elapsed:.2f}s, backlog {backlog}, oldest {lag:.2f}s"
+        )
+
+        def flush_each():
+            # What a throttled task per session used to do.
+            for kwargs in id_kwargs:
+                data_handle = BenchmarkSessionCacheManager(**kwargs).data_handle
+                serialized = data_handle.get_redis_state_serialized()
+                if serialized is not None:
+                    data_handle.set_db_state_serialized(serialized)
+
+        num_queries = 0
+
+        def count_queries(execute, *args):
+            # The query log holds too few queries for the per session flush.
+            nonlocal num_queries
+            num_queries += 1
+            return execute(*args)
+
+        for name, flush in (
+            ("per session", flush_each),
+            ("batched", flush_dirty_states),
+        ):
+            num_queries = 0
+            with connection.execute_wrapper(count_queries):
+                start_time = time.perf_counter()
+                flush()
+                elapsed = time.perf_counter() - start_time
+            self.stdout.write(f"{name}: {elapsed:.2f}s, {num_queries} queries")
+
+        num_flushed = Session.objects.filter(
+            team_id__in={kwargs["team_id"] for kwargs in id_kwargs},
+            state__count=1,
+        ).count()
+        if num_flushed != len(id_kwargs):
+            raise CommandError(f"Only {num_flushed} sessions were written")
@@ -0,0 +1,145 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from spoilr.core.models import User
+
+from puzzles.connect_auth import (
+    PUZZLE,
+    get_connect_token,
+    is_connect_auth_enabled,
+    reset_unlocked_bitmaps,
+)
+from puzzles.consumers import ClientConsumer
+from puzzles.models import Puzzle, PuzzleAccess, Team
+from puzzles.utils import is_unlocked
+
+BENCHMARK_SLUG = "benchmark-websocket-connects"
+TIMEOUT_S = 60
+
+
+class DatabaseConsumer(ClientConsumer):
+    """Checks every connect in the database, like before connect tokens."""
+
+    async def is_unlocked(self, token=None):
+        return await sync_to_async(is_unlocked)(
+            user=self.user, puzzle_slug=self.puzzle_slug
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulates a reconnect storm against ClientConsumer and reports connect "
+        "latency and database queries for each way of authorizing a connect. "
+        "The teams connecting are created for the run and deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=2000)
+        parser.add_argument("--teams", type=int, default=50)
+
+    def handle(self, *args, **options):
+        if not is_connect_auth_enabled():
+            raise CommandError("The static site does not use ClientConsumer")
+        slugs = list(Puzzle.objects.order_by("id").values_list("slug", flat=True))
+        if not slugs:
+            raise CommandError("Needs at least one puzzle")
+        with override_settings(
+            IS_POSTHUNT=False,
+            CHANNEL_LAYERS={
+                "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+            },
+        ):
+            self._benchmark(options["clients"], options["teams"], slugs)
+
+    def _benchmark(self, num_clients, num_teams, slugs):
+        teams = [
+            Team.objects.create(
+                username=f"{BENCHMARK_SLUG}-{i}", name=f"{BENCHMARK_SLUG}-{i}"
+            )
+            for i in range(num_teams)
+        ]
+        PuzzleAccess.objects.bulk_create(
+            PuzzleAccess(team_id=team.id, puzzle_id=puzzle_id)
+            for team in teams
+            for puzzle_id in Puzzle.objects.values_list("id", flat=True)
+        )
+        clients = [
+            (User(team_id=teams[i % num_teams].id), slugs[i % len(slugs)])
+            for i in range(num_clients)
+        ]
+        for team in teams:
+            reset_unlocked_bitmaps(team.id)
+
+        scenarios = [
+            ("database", DatabaseConsumer, False),
+            ("bitmap, cold", ClientConsumer, False),
+            ("bitmap, warm", ClientConsumer, False),
+            ("connect token", ClientConsumer, True),
+        ]
+        try:
+            for name, consumer, use_token in scenarios:
+                # The log holds a limited number of queries.
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    latencies, elapsed = async_to_sync(self._storm)(
+                        consumer, clients, use_token
+                    )
+                latencies.sort()
+                self.stdout.write(
+                    f"{name}: {len(latencies)} connects in {elapsed:.2f}s, "
+                    f"p50 {statistics.median(latencies) * 1000:.1f}ms, "
+                    f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms, "
+                    f"{len(queries)} queries"
+                )
+        finally:
+            for team in teams:
+                reset_unlocked_bitmaps(team.id)
+            # Consumers close the connection between calls, so the teams cannot
+            # be created in a transaction that is rolled back.
+            Team.objects.filter(id__in=[team.id for team in teams]).delete()
+
+    async def _storm(self, consumer, clients, use_token):
+        application = consumer.as_asgi()
+
+        async def connect(user, slug):
+            query_string = f"slug={slug}"
+            if use_token:
+                token = get_connect_token(user.team_id, PUZZLE, slug)
+                query_string += f"&token={token}"
+            communicator = ApplicationCommunicator(
+                application,
+                {
+                    "type": "websocket",
+                    "path": f"/ws/puzzles/{slug}",
+                    "query_string": query_string.encode(),
+                    "headers": [],
+                    "subprotocols": [],
+                    "user": user,
+                    "url_route": {"kwargs": {"slug": slug}},
+                },
+            )
+            start_time = time.perf_counter()
+            await communicator.send_input({"type": "websocket.connect"})
+            response = await communicator.receive_output(TIMEOUT_S)
+            latency = time.perf_counter() - start_time
+            if response["type"] != "websocket.accept":
+                raise CommandError(f"Connection was not accepted: {response}")
+            return communicator, latency
+
+        start_time = time.perf_counter()
+        results = await asyncio.gather(*(connect(user, slug) for user, slug in clients))
+        elapsed = time.perf_counter() - start_time
+
+        for communicator, _ in results:
+            await communicator.send_input(
+                {"type": "websocket.disconnect", "code": 1000}
+            )
+            await communicator.wait(TIMEOUT_S)
+        return [latency for _, latency in results], elapsed
@@ -0,0 +1,131 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from puzzles.consumers import ClientConsumer
+from puzzles.consumers.base import BasePuzzleHandler
+from tph.constants import IS_PYODIDE
+
+BENCHMARK_SLUG = "benchmark-websockets"
+TIMEOUT_S = 60
+
+
+class SyncHandler(BasePuzzleHandler):
+    work_s = 0
+
+    @staticmethod
+    def process_data(user, uuid, data, **kwargs):
+        time.sleep(SyncHandler.work_s)
+        return data
+
+
+class AsyncHandler(BasePuzzleHandler):
+    work_s = 0
+
+    @staticmethod
+    async def process_data(user, uuid, data, **kwargs):
+        await asyncio.sleep(AsyncHandler.work_s)
+        return data
+
+
+class BenchmarkConsumer(ClientConsumer):
+    handler = None
+
+    async def is_unlocked(self):
+        return True
+
+    def get_handler(self, puzzle_slug):
+        return self.handler
+
+
+class Command(BaseCommand):
+    help = (
+        "Connects many websocket clients to ClientConsumer over an in-memory "
+        "channel layer and reports message round trip latency for a blocking "
+        "handler and for an async one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=2000)
+        parser.add_argument("--messages", type=int, default=5)
+        parser.add_argument(
+            "--work-ms",
+            type=float,
+            default=1,
+            help="Time each handler call spends waiting, as if on I/O.",
+        )
+
+    def handle(self, *args, **options):
+        if IS_PYODIDE:
+            raise CommandError("The static site does not use ClientConsumer")
+        SyncHandler.work_s = AsyncHandler.work_s = options["work_ms"] / 1000
+        with override_settings(
+            IS_POSTHUNT=False,
+            CHANNEL_LAYERS={
+                "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+            },
+        ):
+            for handler in (SyncHandler, AsyncHandler):
+                latencies, elapsed = asyncio.run(
+                    self._benchmark(handler, options["clients"], options["messages"])
+                )
+                latencies.sort()
+                self.stdout.write(
+                    f"{handler.__name__}: {len(latencies)} messages in "
+                    f"{elapsed:.2f}s, "
+                    f"p50 {statistics.median(latencies) * 1000:.1f}ms, "
+                    f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms"
+                )
+
+    async def _benchmark(self, handler, num_clients, num_messages):
+        consumer = type(
+            f"{handler.__name__}Consumer", (BenchmarkConsumer,), {"handler": handler}
+        )
+        application = consumer.as_asgi()
+        communicators = []
+        for i in range(num_clients):
+            communicator = ApplicationCommunicator(
+                application,
+                {
+                    "type": "websocket",
+                    "path": f"/ws/puzzles/{BENCHMARK_SLUG}",
+                    "query_string": f"uuid={i}".encode(),
+                    "headers": [],
+                    "subprotocols": [],
+                    "user": AnonymousUser(),
+                    "url_route": {"kwargs": {"slug": BENCHMARK_SLUG}},
+                },
+            )
+            await communicator.send_input({"type": "websocket.connect"})
+            communicators.append(communicator)
+        for communicator in communicators:
+            response = await communicator.receive_output(TIMEOUT_S)
+            if response["type"] != "websocket.accept":
+                raise CommandError(f"Connection was not accepted: {response}")
+
+        async def run_client(communicator):
+            latencies = []
+            for i in range(num_messages):
+                start_time = time.perf_counter()
+                await communicator.send_input(
+                    {"type": "websocket.receive", "text": f'{{"message": {i}}}'}
+                )
+                await communicator.receive_output(TIMEOUT_S)
+                latencies.append(time.perf_counter() - start_time)
+            return latencies
+
+        start_time = time.perf_counter()
+        results = await asyncio.gather(*map(run_client, communicators))
+        elapsed = time.perf_counter() - start_time
+
+        for communicator in communicators:
+            await communicator.send_input(
+                {"type": "websocket.disconnect", "code": 1000}
+            )
+            await communicator.wait(TIMEOUT_S)
+        return [latency for latencies in results for latency in latencies], elapsed
@@ -0,0 +1,126 @@
+import os
+import statistics
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from spoilr.utils import json
+from tph.pyodide_bundle import (
+    ROUTES,
+    RUNTIME_PACKAGES,
+    PyodideBundle,
+    run_standin_process,
+)
+
+from puzzles.views.views import get_server_zip_extra_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds server.zip and site-packages.zip for the static site. With "
+        "--measure, also starts the site from the archives under CPython and "
+        "reports the startup time with and without .pyc files, as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Directory to write the archives to")
+        parser.add_argument(
+            "--python",
+            default=settings.PYODIDE_PYTHON,
+            help="Python to compile .pyc files with, matching the one in Pyodide",
+        )
+        parser.add_argument(
+            "--site-packages",
+            default=settings.PYODIDE_SITE_PACKAGES,
+            help="Directory holding the packages installed in Pyodide",
+        )
+        parser.add_argument(
+            "--route",
+            action="append",
+            dest="routes",
+            help="Path to request when tracing, with {host} for MAIN_HUNT_HOST",
+        )
+        parser.add_argument(
+            "--measure", type=int, default=0, help="Number of startups to time"
+        )
+
+    def handle(self, *args, **options):
+        if settings.IS_PYODIDE:
+            raise CommandError("Build the bundle from the server")
+        bundle = PyodideBundle(
+            extra_files=get_server_zip_extra_files(),
+            compile_python=options["python"],
+            site_packages_dir=options["site_packages"],
+            routes=options["routes"] or ROUTES,
+        )
+        archives = {
+            "server.zip": bundle.server_zip,
+            "site-packages.zip": bundle.site_packages_zip,
+        }
+        report = {
+            "traced_modules": len(bundle.traced_modules),
+            "bytes": {name: len(data) for name, data in archives.items()},
+        }
+        if options["output"]:
+            os.makedirs(options["output"], exist_ok=True)
+            for name, data in archives.items():
+                with open(os.path.join(options["output"], name), "wb") as f:
+                    f.write(data)
+
+        if options["measure"]:
+            # Measured under this Python, so compile for it.
+            report["startup"] = {
+                "sources": self._measure(
+                    bundle.get_server_zip(),
+                    bundle.get_site_packages_zip(),
+                    bundle.routes,
+                    options["measure"],
+                ),
+                "pyc": self._measure(
+                    bundle.get_server_zip(sys.executable),
+                    bundle.get_site_packages_zip(sys.executable),
+                    bundle.routes,
+                    options["measure"],
+                ),
+            }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def _measure(self, server_zip, site_packages_zip, routes, count):
+        with tempfile.TemporaryDirectory() as tmp:
+            server_path = os.path.join(tmp, "server.zip")
+            site_packages_path = os.path.join(tmp, "site-packages.zip")
+            with open(server_path, "wb") as f:
+                f.write(server_zip)
+            with open(site_packages_path, "wb") as f:
+                f.write(site_packages_zip)
+            reports = [
+                run_standin_process(
+                    [site_packages_path, server_path],
+                    server_path,
+                    routes,
+                    isolated=True,
+                )
+                for _ in range(count)
+            ]
+        timings = {
+            name: statistics.median(report["timings"][name] for report in reports)
+            for name in reports[0]["timings"]
+        }
+        # Modules that site-packages.zip should have held, but were imported
+        # from this environment instead.
+        missed = sorted(
+            name
+            for name, path in reports[0]["modules"].items()
+            if path
+            and path.endswith(".py")
+            and "site-packages" in path
+            and not path.startswith(site_packages_path)
+            and name.partition(".")[0] not in RUNTIME_PACKAGES
+        )
+        return {
+            "median_seconds": timings,
+            "statuses": reports[0]["statuses"],
+            "modules": len(reports[0]["modules"]),
+            "imported_outside_archives": missed,
+        }
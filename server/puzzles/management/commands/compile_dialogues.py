@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from puzzles.story.dialogue_tree import (
+    parse_dialogue_file,
+    get_dialogue_slugs,
+    validate_dialogue_tree,
+    write_dialogue_artifact,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Parses and validates every story dialogue CSV, and compiles them into "
+        "the artifact that is loaded at runtime"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only validate the dialogues, without writing the artifact",
+        )
+        parser.add_argument("--output", default=settings.DIALOGUE_ARTIFACT_PATH)
+
+    def handle(self, *args, **options):
+        trees = {}
+        problems = []
+        for slug in get_dialogue_slugs():
+            try:
+                trees[slug] = parse_dialogue_file(slug)
+            except AssertionError as e:
+                problems.append(f"{slug}: {e}")
+                continue
+            problems.extend(
+                f"{slug}: {problem}" for problem in validate_dialogue_tree(trees[slug])
+            )
+        if problems:
+            raise CommandError(
+                "Invalid dialogues:\n" + "\n".join(f"  {p}" for p in problems)
+            )
+
+        if options["check"]:
+            self.stdout.write(f"{len(trees)} dialogues are valid")
+            return
+        write_dialogue_artifact(options["output"], trees)
+        self.stdout.write(f"Compiled {len(trees)} dialogues to {options['output']}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from puzzles.models.story_cache import flush_story_state
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes cached story states to the database, e.g. before exporting the "
+        "database after the hunt"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--team-id", type=int, help="Only flush this team (default all)"
+        )
+
+    def handle(self, *args, **options):
+        flush_story_state(options["team_id"])
+        self.stdout.write("Flushed story states")
@@ -4,7 +4,6 @@ import time
 import traceback
 from collections import defaultdict
 
-import requests
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -18,6 +17,7 @@ from puzzles.hunt_config import (
     HUNT_TITLE,
     MESSAGING_SENDER_EMAIL,
 )
+from puzzles.webhooks import enqueue_alert
 
 if IS_PYODIDE:
     DISCORD_WEBHOOKS = defaultdict(str)
@@ -28,15 +28,13 @@ else:
 task_logger = get_task_logger(__name__)  # for Celery tasks
 
 
-def dispatch_discord_alert(webhook, content, username="Django"):
-    dispatch_discord_alert_internal.delay(webhook, content, username)
-
-
-@celery_app.task
-def dispatch_discord_alert_internal(webhook, content, username="Django"):
+def dispatch_discord_alert(webhook, content, username="Django", coalesce=True):
+    """
+    Queues an alert to be posted to a Discord webhook. Alerts sent in quick
+    succession may be joined into one message unless `coalesce` is False,
+    which should be used for messages parsed by the Discord bot.
+    """
     content = f"<t:{int(time.time())}:t> {content}"
-    if len(content) >= 2000:
-        content = content[:1996] + "..."
     if settings.IS_TEST:
         task_logger.info("Discord alert:\n" + content)
     if not settings.SEND_DISCORD_ALERTS:
@@ -49,17 +47,13 @@ def dispatch_discord_alert_internal(webhook, content, username="Django"):
         task_logger.warning("Invalid webhook (FIXME)")
         return  # TODO: fix this
 
-    try:
-        requests.post(
-            f"https://discord.com/api/webhooks/{webhook}",
-            data={"username": username, "content": content},
-        )
-    except:
-        task_logger.error(
-            "Failed to post to discord webhook with username %s, content: %s",
-            username,
-            content,
-        )
+    enqueue_alert(webhook, content, username, coalesce=coalesce)
+
+
+@celery_app.task
+def dispatch_discord_alert_internal(webhook, content, username="Django"):
+    # Kept so that tasks queued before deploying the delivery service still run.
+    dispatch_discord_alert(webhook, content, username)
 
 
 def dispatch_general_alert(content, username="AlertBot"):
@@ -112,6 +106,7 @@ def dispatch_interaction_alert(content, username="InteractionBot"):
         DISCORD_WEBHOOKS["BOT_SPAM"],
         content,
         username,
+        coalesce=False,
     )
 
 
@@ -137,6 +132,7 @@ def dispatch_email_alert(content, username="EmailBot"):
         DISCORD_WEBHOOKS["BOT_SPAM"],
         content,
         username,
+        coalesce=False,
     )
 
 
@@ -146,6 +142,7 @@ def dispatch_email_response_alert(content, username="EmailBot"):
         DISCORD_WEBHOOKS["BOT_SPAM"],
         content,
         username,
+        coalesce=False,
     )
 
 
@@ -155,6 +152,7 @@ def dispatch_interaction_response_alert(content, username="InteractionBot"):
         DISCORD_WEBHOOKS["BOT_SPAM"],
         content,
         username,
+        coalesce=False,
     )
 
 
@@ -164,6 +162,7 @@ def dispatch_hint_alert(content, username="HintBot"):
         DISCORD_WEBHOOKS["BOT_SPAM"],
         content,
         username,
+        coalesce=False,
     )
 
 
@@ -173,6 +172,7 @@ def dispatch_hint_response_alert(content, username="HintBot"):
         DISCORD_WEBHOOKS["BOT_SPAM"],
         content,
         username,
+        coalesce=False,
     )
 
 
@@ -182,6 +182,7 @@ def dispatch_bot_alert(content, username="Bot Relayer"):
         DISCORD_WEBHOOKS["BOT_SPAM"],
         content,
         username,
+        coalesce=False,
     )
 
 
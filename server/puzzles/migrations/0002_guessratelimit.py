@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzles", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GuessRateLimit",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("wrong_guess_count", models.PositiveIntegerField(default=0)),
+                ("window_start", models.DateTimeField(blank=True, null=True)),
+                ("next_allowed_time", models.DateTimeField(blank=True, null=True)),
+                (
+                    "puzzle",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="puzzles.puzzle"
+                    ),
+                ),
+                (
+                    "team",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="puzzles.team"
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("team", "puzzle")},
+            },
+        ),
+    ]
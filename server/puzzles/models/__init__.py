@@ -1,10 +1,8 @@
 import collections
 import datetime
 import logging
-import math
 import os
 import zoneinfo
-from itertools import groupby
 from typing import Optional
 from uuid import uuid4
 
@@ -13,8 +11,10 @@ import spoilr.email.models
 import spoilr.hints.models
 from django import forms
 from django.core.validators import FileExtensionValidator
+from django.dispatch import receiver
 from django.db import models, transaction
 from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, Sum, When
+from django.db.models.signals import post_delete, post_save
 from django.db.models.functions import FirstValue
 from django.utils import timezone
 from puzzles.hunt_config import (
@@ -30,7 +30,7 @@ from spoilr.core.api.events import (
     get_num_extra_a3_event_rewards,
     get_num_extra_event_rewards,
 )
-from spoilr.core.api.hunt import get_site_end_time, release_puzzle, release_round
+from spoilr.core.api.hunt import get_site_end_time
 from spoilr.utils import generate_url
 
 from .utils import SlugManager, SlugModel
@@ -426,57 +426,14 @@ class Team(spoilr.core.models.Team):
 
     def unlock_puzzles(self, deep):
         """Unlocks available puzzles to this team."""
+        from puzzles.unlocks import unlock_puzzles  # Avoid circular import
+
         # Internal users should see all puzzles.
         if self.is_internal or self.is_public:
             return list(Puzzle.objects.all())
 
-        # Otherwise, iterate through what the team can access.
-        puzzles = []
-        unlocked_ids = set()
-        for access in self.puzzleaccess_set.all():
-            puzzle = access.puzzle.puzzle
-            puzzles.append(puzzle)
-            unlocked_ids.add(puzzle.id)
-        unlocked_round_slugs = set()
-        for round in self.unlocked_rounds():
-            unlocked_round_slugs.add(round.slug)
-
-        # Round order must be 1st because later code relies on insertion order
-        # of the puzzles dict.
-        # Deep_key then deep is done such that for a given key, we see all unlocked
-        # puzzles then locked ones in order of round progress - this is needed for
-        # event unlocks to work.
-        # Slug is included because it enforces a consistent ordering in the case of
-        # deep ties, which is needed for event unlock functionality.
-        all_puzzles = Puzzle.objects.order_by(
-            "round__order", "deep_key", "deep", "slug"
-        )
-        extra_unlocks = collections.defaultdict(int)
-        for eu in ExtraUnlock.objects.filter(team=self):
-            extra_unlocks[eu.deep_key] = eu.count
-        extra_count = collections.defaultdict(int)
-        # Consider if we put in work to let us stop checking early - would need to order
-        # by (deep_key, deep) but requires resolving deep_key for everything and may not
-        # be as flexible.
-        for round_slug, puzzles_by_round in groupby(
-            all_puzzles, lambda p: p.round.slug
-        ):
-            for puzzle in puzzles_by_round:
-                deep_key = puzzle.deep_key or round_slug
-                if puzzle.deep > max(deep[deep_key], deep.get("all", -math.inf)):
-                    # Let first N puzzles proceed to unlocking code.
-                    extra_count[deep_key] += 1
-                    if extra_count[deep_key] > extra_unlocks[deep_key]:
-                        continue
-
-                if puzzle.id not in unlocked_ids:
-                    release_puzzle(self, puzzle)
-                    puzzles.append(puzzle)
-                if round_slug not in unlocked_round_slugs:
-                    release_round(self, puzzle.round)
-                    unlocked_round_slugs.add(round_slug)
-
-        return puzzles
+        # Only does release work when the team has crossed a new DEEP threshold.
+        return unlock_puzzles(self, deep)
 
     def compute_next_event_unlocks(self, deep):
         """Generate a list of puzzles that might be the next event unlock.
@@ -600,24 +557,19 @@ class PuzzleSubmission(spoilr.core.models.PuzzleSubmission):
 
 def build_guess_data(answer_submission):
     """Returns serialized data for a particular answer submission."""
-    from puzzles.views.puzzles import weaver
+    from puzzles.answers import get_guess_responses
 
     if answer_submission.correct:
         response = "Correct!"
     else:
         response = "Incorrect"
     partial = False
-    puzzle = answer_submission.puzzle.puzzle
-    for message in puzzle.pseudoanswer_set.all():
-        if answer_submission.answer == puzzle.normalize_answer(message.answer):
-            response = message.response
-            partial = True
-            break
-    if puzzle.slug == "weaver":
-        partial_message = weaver.get_partial_answer_message(answer_submission.answer)
-        if partial_message is not None:
-            response = partial_message
-            partial = True
+    message = get_guess_responses(answer_submission.puzzle_id).lookup(
+        answer_submission.answer
+    )
+    if message is not None:
+        response = message
+        partial = True
 
     return {
         "timestamp": str(answer_submission.timestamp or timezone.now()),
@@ -708,7 +660,7 @@ class CustomPuzzleSubmission(spoilr.core.models.MinipuzzleSubmission):
     def histogram_by_team(cls, puzzle: Puzzle):
         return (
             cls.objects.filter(puzzle=puzzle, timestamp__lt=get_site_end_time())
-            .values("raw_answer", "team")
+            .values("raw_answer", "team", "team__name")
             .annotate(counts=Sum("count"))
         )
 
@@ -769,6 +721,88 @@ class ExtraGuessGrant(models.Model):
         unique_together = ("team", "puzzle")
 
 
+def default_guess_rate_limit(i):
+    """Wait after the i-th most recent wrong guess (0 is the latest)."""
+    return datetime.timedelta(minutes=i**2 / 1.5)
+
+
+class GuessRateLimit(models.Model):
+    """
+    Guess rate limit of a team on a puzzle, kept up to date as guesses are made
+    so that checking the limit does not need to read every submission.
+    """
+
+    team = models.ForeignKey(Team, on_delete=models.CASCADE)
+    puzzle = models.ForeignKey(Puzzle, on_delete=models.CASCADE)
+
+    wrong_guess_count = models.PositiveIntegerField(default=0)
+    # Time of the latest wrong guess, which the backoff is counted from.
+    window_start = models.DateTimeField(null=True, blank=True)
+    # Guesses are limited until this time.
+    next_allowed_time = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return "%s on %s: %d wrong guesses" % (
+            self.team,
+            self.puzzle,
+            self.wrong_guess_count,
+        )
+
+    class Meta:
+        unique_together = ("team", "puzzle")
+
+    @classmethod
+    def compute(cls, team_id, puzzle, record=None):
+        """
+        Fills in the record, or a new unsaved one, from the wrong guesses of
+        the team. Does not save it.
+        """
+        from puzzles.rounds import CUSTOM_RATE_LIMITERS
+
+        rate_limit = CUSTOM_RATE_LIMITERS.get(
+            puzzle.round.slug, default_guess_rate_limit
+        )
+        if record is None:
+            record = cls(team_id=team_id, puzzle_id=puzzle.id)
+        wrong_guess_times = list(
+            PuzzleSubmission.objects.filter(
+                team_id=team_id, puzzle_id=puzzle.id, partial=False, correct=False
+            )
+            .order_by("-timestamp")
+            .values_list("timestamp", flat=True)
+        )
+        record.wrong_guess_count = len(wrong_guess_times)
+        record.window_start = wrong_guess_times[0] if wrong_guess_times else None
+        record.next_allowed_time = max(
+            (
+                timestamp + rate_limit(i)
+                for i, timestamp in enumerate(wrong_guess_times)
+            ),
+            default=None,
+        )
+        return record
+
+    @classmethod
+    def refresh(cls, team_id, puzzle):
+        """Recomputes and saves the record after a wrong guess."""
+        with transaction.atomic():
+            # Locks the record so that concurrent guesses are applied in turn.
+            record, _ = cls.objects.select_for_update().get_or_create(
+                team_id=team_id, puzzle_id=puzzle.id
+            )
+            cls.compute(team_id, puzzle, record).save()
+        return record
+
+
+@receiver(post_delete, sender=PuzzleSubmission)
+def reset_guess_rate_limit(sender, instance, **kwargs):
+    # Computed on each check until the next wrong guess saves it again. Not
+    # refreshed here in case the team is being deleted.
+    GuessRateLimit.objects.filter(
+        team_id=instance.team_id, puzzle_id=instance.puzzle_id
+    ).delete()
+
+
 class RatingField(models.PositiveSmallIntegerField):
     """Represents a single numeric rating (either fun or difficulty) of a puzzle."""
 
@@ -888,6 +922,68 @@ class ExtraUnlock(models.Model):
                 team=team,
                 deep_key=deep_key,
             ).update(count=F("count") + 1)
+            # update() does not send post_save.
+            reset_team_unlock_state_on_commit(team.id)
 
     class Meta:
         unique_together = ("team", "deep_key")
+
+
+# Keep the unlock engine in sync with puzzle and access changes. These live
+# here rather than in puzzles.signals so they are connected whenever models are.
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+@receiver(post_save, sender=spoilr.core.models.Round)
+@receiver(post_delete, sender=spoilr.core.models.Round)
+def invalidate_unlock_tables_on_change(sender, instance, **kwargs):
+    from puzzles.unlocks import invalidate_unlock_tables
+
+    transaction.on_commit(invalidate_unlock_tables)
+
+
+# spoilr.core only connects its own Puzzle, and signals are sent with the
+# concrete model as the sender.
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+def invalidate_answer_index_on_change(sender, instance, **kwargs):
+    from spoilr.core.api.answer import invalidate_answer_index
+
+    transaction.on_commit(invalidate_answer_index)
+
+
+def reset_team_unlock_state_on_commit(team_id):
+    from puzzles.unlocks import reset_team_unlock_state
+
+    transaction.on_commit(lambda: reset_team_unlock_state(team_id))
+
+
+@receiver(post_save, sender=ExtraUnlock)
+@receiver(post_delete, sender=ExtraUnlock)
+def reset_unlock_state_on_extra_unlock_change(sender, instance, **kwargs):
+    reset_team_unlock_state_on_commit(instance.team_id)
+
+
+# NB: Django signals are not inherited automatically, and deletes through the
+# proxy models are sent with the proxy as the sender.
+@receiver(post_delete, sender=spoilr.core.models.PuzzleAccess)
+@receiver(post_delete, sender=PuzzleAccess)
+@receiver(post_delete, sender=spoilr.core.models.RoundAccess)
+def reset_unlock_state_on_access_delete(sender, instance, **kwargs):
+    from puzzles.connect_auth import is_connect_auth_enabled, reset_unlocked_bitmaps
+    from puzzles.gate import is_gate_enabled, reset_unlocked_slugs
+
+    team_id = instance.team_id
+    reset_team_unlock_state_on_commit(team_id)
+    if is_gate_enabled():
+        transaction.on_commit(lambda: reset_unlocked_slugs(team_id))
+    if is_connect_auth_enabled():
+        transaction.on_commit(lambda: reset_unlocked_bitmaps(team_id))
+
+
+@receiver(post_delete, sender=spoilr.core.models.PuzzleAccess)
+@receiver(post_delete, sender=PuzzleAccess)
+@receiver(post_delete, sender=spoilr.core.models.InteractionAccess)
+def update_team_progress_on_access_delete(sender, instance, **kwargs):
+    from spoilr.progress.api import remove_access_from_team_progress
+
+    remove_access_from_team_progress(instance)
@@ -1,20 +1,46 @@
 import abc
+import collections
 import datetime
-import functools
 import math
+import time
 from spoilr.utils import json
 
 from django.conf import settings
+from django.db.models import Q
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.db import models, transaction
 
 from puzzles.models.interactive import PuzzleState, Session, UserState
 from puzzles.utils import get_redis_handle, redis_lock, throttleable_task
+from tph.constants import IS_PYODIDE
 from tph.utils import get_task_logger
 
 task_logger = get_task_logger(__name__)
 
+# States waiting to be written to the database, scored by when they first
+# became dirty. See flush_dirty_states.
+DIRTY_STATES_KEY = "cache-state:dirty"
+DIRTY_STATES_FLUSH_LOCK_KEY = "cache-state-flush-lock"
+DIRTY_STATES_THROTTLE_KEY = "cache-state-flush"
+DIRTY_STATES_CHUNK_SIZE = 500
+
+if IS_PYODIDE:
+    DIRTY_BACKLOG = FLUSH_LAG = None
+else:
+    from prometheus_client import Gauge, Histogram
+
+    DIRTY_BACKLOG = Gauge(
+        "state_cache_dirty_backlog",
+        "Number of cached states waiting to be written to the database",
+        multiprocess_mode="livemostrecent",
+    )
+    FLUSH_LAG = Histogram(
+        "state_cache_flush_lag_seconds",
+        "Time from a cached state becoming dirty to it being written",
+        buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300),
+    )
+
 
 class StateDataHandle:
     """
@@ -55,8 +81,19 @@ class StateDataHandle:
         return f"cache-state-lock:{self.key_base}"
 
     @property
-    def sync_task_key(self):
-        return f"cache-state-sync-task:{self.key_base}"
+    def dirty_member(self):
+        return json.dumps([self.model.__name__, sorted(self.id_kwargs.items())])
+
+    def mark_db_dirty(self):
+        """
+        Queues the Redis state to be written to the database by
+        flush_dirty_states. Returns whether it was not already queued.
+        """
+        return bool(
+            get_redis_handle().zadd(
+                DIRTY_STATES_KEY, {self.dirty_member: time.time()}, nx=True
+            )
+        )
 
     def serialize(self, data):
         needs_conversion = False
@@ -152,7 +189,6 @@ class StateCacheManager(abc.ABC):
     # subclasses must override these
     MODEL = None
     ID_FIELDS = ()
-    SYNC_STATE_TO_DB = None
 
     # subclasses can override to track additional fields
     ADDITIONAL_FIELDS = ()
@@ -171,7 +207,8 @@ class StateCacheManager(abc.ABC):
         lock_write: keep lock when writing back to the database
         initial_data: data to return if the data does not exist
         throttle_interval: number of seconds to wait before syncing to the db
-            again. These db syncs happen asynchronously via Celery.
+            again. These db syncs happen asynchronously via Celery, batched
+            with other dirty states by flush_dirty_states.
         id_kwargs: kwargs to instantiate the model. This should be the
         complete set of fields to uniquely specify the instance
         """
@@ -274,61 +311,28 @@ class StateCacheManager(abc.ABC):
             )
             self._redis_dirty = False
         if db and self._db_dirty:
-            if self.throttle_interval is None:
+            if self.throttle_interval is None or settings.IS_PYODIDE:
                 # set db now directly
                 self.data_handle.set_db_state_serialized(self._serialized)
-                self._db_dirty = False
-            else:
-                # set db async
-                self.SYNC_STATE_TO_DB.throttle(
-                    self.data_handle.sync_task_key,
-                    self.throttle_interval,
-                    kwargs=self.id_kwargs,
-                )
-
-
-def sync_state_to_db_maker(get_model_and_fields):
-    @functools.wraps(get_model_and_fields)
-    def wrapper(**kwargs):
-        model, additional_fields = get_model_and_fields()
-        data_handle = StateDataHandle(model, kwargs, additional_fields)
-        serialized = data_handle.get_redis_state_serialized()
-        if serialized is not None:
-            data_handle.set_db_state_serialized(serialized)
-
-    return throttleable_task(wrapper)
-
-
-# these should be module functions not class functions
-@sync_state_to_db_maker
-def sync_puzzle_state_to_db():
-    return PuzzleState, PuzzleStateCacheManager.ADDITIONAL_FIELDS
-
-
-@sync_state_to_db_maker
-def sync_session_state_to_db():
-    return Session, SessionCacheManager.ADDITIONAL_FIELDS
-
-
-"""
-Easy to do for UserState too, but quandle is the only thing using UserState,
-which it does not need Redis caching.
-"""
-# @sync_state_to_db_maker
-# def sync_user_state_to_db():
-#     return UserState, UserStateCacheManager.ADDITIONAL_FIELDS
+            elif self.data_handle.mark_db_dirty():
+                # set db async, batched with other dirty states
+                self.schedule_db_flush()
+            self._db_dirty = False
+
+    def schedule_db_flush(self):
+        flush_dirty_states_task.throttle(
+            DIRTY_STATES_THROTTLE_KEY, self.throttle_interval
+        )
 
 
 class PuzzleStateCacheManager(StateCacheManager):
     MODEL = PuzzleState
     ID_FIELDS = ("team_id", "puzzle_id")
-    SYNC_STATE_TO_DB = sync_puzzle_state_to_db
 
 
 class SessionCacheManager(StateCacheManager):
     MODEL = Session
     ID_FIELDS = ("team_id", "puzzle_id", "storycard_id")
-    SYNC_STATE_TO_DB = sync_session_state_to_db
     ADDITIONAL_FIELDS = (
         "start_time",
         "finish_time",
@@ -336,11 +340,125 @@ class SessionCacheManager(StateCacheManager):
     )
 
 
+"""
+Easy to do for UserState too, but quandle is the only thing using UserState,
+which it does not need Redis caching.
+"""
 # class UserStateCacheManager(StateCacheManager):
 #     MODEL = UserState
-#     SYNC_STATE_TO_DB = sync_user_state_to_db
 #     ID_FIELDS = ("puzzle_id", "team_id", "uuid")
 
+# Mapping from model name to the cache manager for it, for flush_dirty_states.
+CACHE_MANAGERS = {
+    manager.MODEL.__name__: manager
+    for manager in (PuzzleStateCacheManager, SessionCacheManager)
+}
+
+
+def _flush_dirty_chunk(popped):
+    """Writes a chunk of (dirty member, dirty time) pairs to the database."""
+    handles = collections.defaultdict(list)
+    for member, dirty_time in popped:
+        model_name, id_items = json.loads(member)
+        manager = CACHE_MANAGERS[model_name]
+        handles[manager].append(
+            StateDataHandle(manager.MODEL, dict(id_items), manager.ADDITIONAL_FIELDS)
+        )
+
+    redis_handle = get_redis_handle()
+    with transaction.atomic():
+        for manager, manager_handles in handles.items():
+            serialized = redis_handle.mget([handle.key for handle in manager_handles])
+            id_fields = sorted(manager.ID_FIELDS)
+            condition = Q()
+            for handle in manager_handles:
+                condition |= Q(**handle.id_kwargs)
+            # NB: Sessions are not unique, so several rows can share id fields.
+            instances = collections.defaultdict(list)
+            for instance in manager.MODEL.objects.filter(condition):
+                key = tuple(getattr(instance, field) for field in id_fields)
+                instances[key].append(instance)
+
+            updated = []
+            for handle, data_serialized in zip(manager_handles, serialized):
+                if data_serialized is None:
+                    # Evicted, the database is already up to date.
+                    continue
+                key = tuple(handle.id_kwargs[field] for field in id_fields)
+                if key not in instances:
+                    handle.set_db_state_serialized(data_serialized)
+                    continue
+                data = handle.deserialize(data_serialized)
+                if not manager.ADDITIONAL_FIELDS:
+                    data = {"state": data}
+                for instance in instances[key]:
+                    for field, value in data.items():
+                        setattr(instance, field, value)
+                    updated.append(instance)
+            # bulk_update does not call signals, so Redis is not evicted
+            manager.MODEL.objects.bulk_update(
+                updated,
+                ["state", *manager.ADDITIONAL_FIELDS],
+                batch_size=DIRTY_STATES_CHUNK_SIZE,
+            )
+
+    now = time.time()
+    for _, dirty_time in popped:
+        FLUSH_LAG.observe(now - dirty_time)
+
+
+def flush_dirty_states(chunk_size=DIRTY_STATES_CHUNK_SIZE):
+    """
+    Writes every state queued by mark_db_dirty to the database, chunk_size at
+    a time. Returns the number of states written, or None if another flush
+    was already running.
+    """
+    if settings.IS_PYODIDE:
+        # States are written to the database directly.
+        return 0
+    redis_handle = get_redis_handle()
+    # Flushes must not overlap, or an older chunk could overwrite a newer one.
+    lock = redis_lock(DIRTY_STATES_FLUSH_LOCK_KEY)
+    if not lock.acquire(blocking=False):
+        return None
+    num_flushed = 0
+    try:
+        while True:
+            # Popping before reading means a state changed during the flush is
+            # queued again rather than lost.
+            popped = redis_handle.zpopmin(DIRTY_STATES_KEY, chunk_size)
+            if not popped:
+                break
+            try:
+                _flush_dirty_chunk(popped)
+            except Exception:
+                redis_handle.zadd(DIRTY_STATES_KEY, dict(popped), nx=True)
+                raise
+            num_flushed += len(popped)
+            lock.extend(settings.REDIS_LONG_TIMEOUT, replace_ttl=True)
+    finally:
+        DIRTY_BACKLOG.set(redis_handle.zcard(DIRTY_STATES_KEY))
+        lock.release()
+    if num_flushed:
+        task_logger.info("Flushed %d cached states", num_flushed)
+    return num_flushed
+
+
+def get_dirty_states_stats():
+    """Returns the number of queued states and the age of the oldest one."""
+    redis_handle = get_redis_handle()
+    with redis_handle.pipeline(transaction=False) as pipe:
+        pipe.zcard(DIRTY_STATES_KEY)
+        pipe.zrange(DIRTY_STATES_KEY, 0, 0, withscores=True)
+        backlog, oldest = pipe.execute()
+    lag = time.time() - oldest[0][1] if oldest else 0
+    return backlog, lag
+
+
+@throttleable_task
+def flush_dirty_states_task():
+    flush_dirty_states()
+
 
 @receiver(post_save, sender=PuzzleState)
 @receiver(post_delete, sender=PuzzleState)
@@ -1,6 +1,7 @@
 from enum import IntEnum
 from typing import Optional, Union
 
+from django.conf import settings
 from django.db import models
 from puzzles.assets import get_hashed_url
 from spoilr.core.models import Team
@@ -114,6 +115,11 @@ class StoryState(models.Model):
         new_state: Union[StateEnum, int],
         force=False,
     ):
+        if not settings.IS_PYODIDE:
+            from .story_cache import set_cached_story_state
+
+            set_cached_story_state(team, new_state, force=force)
+            return
         story_state = cls.singleton(team)
         if force:
             story_state.state = int(new_state)
@@ -124,5 +130,9 @@ class StoryState(models.Model):
 
     @classmethod
     def get_state(cls, team: Team) -> StateEnum:
+        if not settings.IS_PYODIDE:
+            from .story_cache import get_cached_story_state
+
+            return StateEnum(get_cached_story_state(team))
         story_state = cls.singleton(team)
         return StateEnum(story_state.state)
@@ -0,0 +1,183 @@
+"""
+Redis cache for StoryState, written back to the database in the background.
+
+Each team's state is a Redis hash with two fields:
+- state: the StateEnum value.
+- version: incremented on every change, so a flush can tell whether the state
+  changed again while it was being written.
+
+The hash is loaded from the database the first time a team's state is needed.
+Changes are applied in Redis with a script, so concurrent updates never lose
+the higher state. Teams with unflushed changes are tracked in a Redis set, and
+a throttled Celery task writes all of them back with a single query.
+"""
+from typing import Union
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from spoilr.core.models import Team
+
+from puzzles.models.story import StateEnum, StoryState
+from puzzles.utils import get_redis_handle, throttleable_task
+from tph.utils import get_task_logger
+
+task_logger = get_task_logger(__name__)
+
+STORY_STATE_KEY_FORMAT = "story-state:{}"
+DIRTY_TEAMS_KEY = "story-state:dirty"
+FLUSH_THROTTLE_KEY = "story-state-flush"
+FLUSH_INTERVAL_S = 5
+
+# KEYS: state hash. ARGV: state from the database.
+# Returns the cached state, filling it in if the hash does not exist.
+_LOAD_SCRIPT = """
+if redis.call("HSETNX", KEYS[1], "state", ARGV[1]) == 1 then
+    redis.call("HSETNX", KEYS[1], "version", 0)
+    return tonumber(ARGV[1])
+end
+return tonumber(redis.call("HGET", KEYS[1], "state"))
+"""
+
+# KEYS: state hash, dirty set. ARGV: new state, "1" to force, team id.
+# Returns -1 if the hash is not loaded, otherwise whether the state changed.
+_SET_SCRIPT = """
+local current = redis.call("HGET", KEYS[1], "state")
+if not current then
+    return -1
+end
+current = tonumber(current)
+local new = tonumber(ARGV[1])
+if new == current or (ARGV[2] ~= "1" and new < current) then
+    return 0
+end
+redis.call("HSET", KEYS[1], "state", new)
+redis.call("HINCRBY", KEYS[1], "version", 1)
+redis.call("SADD", KEYS[2], ARGV[3])
+return 1
+"""
+
+# KEYS: state hash, dirty set. ARGV: flushed version, team id.
+# Marks the team clean unless it changed after the flush read it.
+_MARK_FLUSHED_SCRIPT = """
+if redis.call("HGET", KEYS[1], "version") == ARGV[1] then
+    redis.call("SREM", KEYS[2], ARGV[2])
+end
+"""
+
+
+def _get_team_id(team: Union[Team, int]) -> int:
+    return team if isinstance(team, int) else team.id
+
+
+def _load(team_id):
+    story_state = StoryState.objects.filter(team_id=team_id).first()
+    return get_redis_handle().eval(
+        _LOAD_SCRIPT,
+        1,
+        STORY_STATE_KEY_FORMAT.format(team_id),
+        story_state.state if story_state else StateEnum.DEFAULT.value,
+    )
+
+
+def get_cached_story_state(team: Union[Team, int]) -> int:
+    team_id = _get_team_id(team)
+    state = get_redis_handle().hget(STORY_STATE_KEY_FORMAT.format(team_id), "state")
+    if state is None:
+        return _load(team_id)
+    return int(state)
+
+
+def set_cached_story_state(
+    team: Union[Team, int], new_state: Union[StateEnum, int], force=False
+):
+    """
+    Updates the cached state, never decreasing it unless force is set, and
+    schedules a flush to the database if it changed.
+    """
+    team_id = _get_team_id(team)
+    args = (
+        2,
+        STORY_STATE_KEY_FORMAT.format(team_id),
+        DIRTY_TEAMS_KEY,
+        int(new_state),
+        "1" if force else "0",
+        team_id,
+    )
+    changed = get_redis_handle().eval(_SET_SCRIPT, *args)
+    if changed == -1:
+        _load(team_id)
+        changed = get_redis_handle().eval(_SET_SCRIPT, *args)
+    if changed == 1:
+        flush_story_states.throttle(FLUSH_THROTTLE_KEY, FLUSH_INTERVAL_S)
+
+
+def flush_story_state(team: Union[Team, int, None] = None):
+    """
+    Writes cached story states to the database now. Flushes the given team,
+    or every team with unflushed changes if team is None.
+    """
+    if settings.IS_PYODIDE:
+        # Story states are written to the database directly.
+        return
+    redis_handle = get_redis_handle()
+    if team is None:
+        team_ids = sorted(
+            int(team_id) for team_id in redis_handle.smembers(DIRTY_TEAMS_KEY)
+        )
+    else:
+        team_ids = [_get_team_id(team)]
+    if not team_ids:
+        return
+
+    with redis_handle.pipeline(transaction=False) as pipe:
+        for team_id in team_ids:
+            pipe.hmget(STORY_STATE_KEY_FORMAT.format(team_id), "state", "version")
+        cached = pipe.execute()
+    flushed = [
+        (team_id, int(state), version)
+        for team_id, (state, version) in zip(team_ids, cached)
+        if state is not None
+    ]
+    # Bulk writes skip the post_save signal, so the cache is not evicted.
+    StoryState.objects.bulk_create(
+        [StoryState(team_id=team_id, state=state) for team_id, state, _ in flushed],
+        update_conflicts=True,
+        unique_fields=["team"],
+        update_fields=["state"],
+    )
+    with redis_handle.pipeline(transaction=False) as pipe:
+        for team_id, _, version in flushed:
+            pipe.eval(
+                _MARK_FLUSHED_SCRIPT,
+                2,
+                STORY_STATE_KEY_FORMAT.format(team_id),
+                DIRTY_TEAMS_KEY,
+                version,
+                team_id,
+            )
+        pipe.execute()
+    task_logger.info("Flushed story state for %d teams", len(flushed))
+
+
+@throttleable_task
+def flush_story_states():
+    flush_story_state()
+
+
+@receiver(post_save, sender=StoryState)
+@receiver(post_delete, sender=StoryState)
+def evict_cached_story_state(sender, instance, **kwargs):
+    """Direct writes to the database (e.g. from the admin) win over the cache."""
+    if settings.IS_PYODIDE:
+        return
+    team_id = instance.team_id
+
+    def evict():
+        with get_redis_handle().pipeline() as pipe:
+            pipe.delete(STORY_STATE_KEY_FORMAT.format(team_id))
+            pipe.srem(DIRTY_TEAMS_KEY, team_id)
+            pipe.execute()
+
+    transaction.on_commit(evict)
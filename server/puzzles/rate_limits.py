@@ -0,0 +1,417 @@
+"""
+Rate limits kept in Redis, checked and updated by one Lua script per hit.
+
+Each hit is a single EVALSHA, so concurrent hits on the same key never wait on
+a lock and cannot race between reading and writing the count. Two algorithms
+are available:
+
+- SlidingWindowRateLimiter allows `limit` hits in any `window` seconds. It
+  stores the time of every hit in a sorted set, so it is exact but uses memory
+  proportional to the limit.
+- TokenBucketRateLimiter refills `limit` tokens evenly over `window` seconds,
+  allowing bursts of up to `limit` hits. It stores two numbers per key, and
+  can be paused when a remote service tells us to back off.
+
+The static site has no Redis, so it (and anything passing
+backend=MemoryRateLimitBackend()) keeps the same state in process memory.
+
+Use rate_limit to limit a view or a websocket handler:
+
+    @rate_limit("10/m")
+    def submit(request): ...
+
+    class Handler(BasePuzzleHandler):
+        @staticmethod
+        @rate_limit("5/s")
+        async def process_data(user, uuid, data, **kwargs): ...
+"""
+import asyncio
+import collections
+import dataclasses
+import functools
+import math
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import HttpRequest, JsonResponse
+
+# Unit suffixes accepted by parse_rate, as for django-ratelimit.
+RATE_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+RATE_RE = re.compile(r"^(\d+)/(\d*)([smhd])$")
+KEY_PREFIX = "ratelimit"
+# The memory backend drops expired keys once it holds this many.
+MEMORY_BACKEND_SWEEP_SIZE = 10000
+
+# KEYS[1]: sorted set of hit times
+# ARGV: now (ms), window (ms), limit, cost, unique member prefix
+_SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - window)
+local count = redis.call("ZCARD", KEYS[1])
+if count + cost > limit then
+    local retry_after = window
+    if cost <= limit then
+        -- wait until enough of the oldest hits leave the window
+        local index = count + cost - limit - 1
+        local oldest = redis.call("ZRANGE", KEYS[1], index, index, "WITHSCORES")
+        retry_after = tonumber(oldest[2]) + window - now
+    end
+    return {0, limit - count, retry_after}
+end
+for i = 1, cost do
+    redis.call("ZADD", KEYS[1], now, ARGV[5] .. ":" .. i)
+end
+redis.call("PEXPIRE", KEYS[1], window)
+return {1, limit - count - cost, 0}
+"""
+
+# KEYS[1]: hash of the tokens left and when they were counted
+# ARGV: now (ms), window (ms), limit, cost, pause (ms)
+# A pause empties the bucket and starts refilling it only once the pause is
+# over, for when a remote service has rate limited us.
+_TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local pause = tonumber(ARGV[5])
+local rate = limit / window
+local state = redis.call("HMGET", KEYS[1], "tokens", "time")
+local tokens = tonumber(state[1]) or limit
+local last = tonumber(state[2]) or now
+local allowed = 0
+local retry_after = 0
+if pause > 0 then
+    tokens = 0
+    last = math.max(last, now + pause)
+    retry_after = last - now
+else
+    if now > last then
+        tokens = math.min(limit, tokens + (now - last) * rate)
+        last = now
+    end
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    elseif cost > limit then
+        retry_after = window
+    else
+        retry_after = math.ceil((cost - tokens) / rate + (last - now))
+    end
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "time", last)
+redis.call("PEXPIRE", KEYS[1], math.ceil((limit - tokens) / rate + (last - now)) + 1)
+return {allowed, math.floor(tokens), retry_after}
+"""
+
+
+def parse_rate(rate):
+    """Parses a rate like "10/m" or "5/30s" into (limit, window in seconds)."""
+    match = RATE_RE.match(rate)
+    if match is None:
+        raise ValueError(f"Invalid rate {rate!r}")
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * RATE_UNITS[unit]
+
+
+@dataclasses.dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    # hits left in the current window, or tokens left in the bucket
+    remaining: int
+    # seconds until the hit would be allowed, 0 if it was
+    retry_after: float
+
+
+class RedisRateLimitBackend:
+    def __init__(self):
+        self.scripts = {}
+        self.async_scripts = {}
+
+    def _get_script(self, scripts, redis_handle, source):
+        # Scripts remember their sha and can run on any client.
+        script = scripts.get(source)
+        if script is None:
+            script = scripts[source] = redis_handle.register_script(source)
+        return script
+
+    def hit(self, limiter, key, cost, pause_ms=0):
+        # Import here to avoid circular import
+        from puzzles.utils import get_redis_handle
+
+        redis_handle = get_redis_handle()
+        script = self._get_script(self.scripts, redis_handle, limiter.SCRIPT)
+        return limiter.to_result(
+            script(
+                keys=[limiter.get_redis_key(key)],
+                args=limiter.get_script_args(cost, pause_ms),
+                client=redis_handle,
+            )
+        )
+
+    async def ahit(self, limiter, key, cost, pause_ms=0):
+        # Import here to avoid circular import
+        from puzzles.utils import get_async_redis_handle
+
+        redis_handle = get_async_redis_handle()
+        script = self._get_script(self.async_scripts, redis_handle, limiter.SCRIPT)
+        return limiter.to_result(
+            await script(
+                keys=[limiter.get_redis_key(key)],
+                args=limiter.get_script_args(cost, pause_ms),
+                client=redis_handle,
+            )
+        )
+
+    def reset(self, limiter, key):
+        # Import here to avoid circular import
+        from puzzles.utils import get_redis_handle
+
+        get_redis_handle().delete(limiter.get_redis_key(key))
+
+
+class MemoryRateLimitBackend:
+    """Keeps rate limit state in this process. For the static site and tests."""
+
+    def __init__(self):
+        # Mapping from redis key to (state, expiry time in ms)
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def hit(self, limiter, key, cost, pause_ms=0):
+        redis_key = limiter.get_redis_key(key)
+        now_ms = time.time() * 1000
+        with self.lock:
+            state, expiry_ms = self.states.get(redis_key, (None, None))
+            if expiry_ms is not None and expiry_ms <= now_ms:
+                state = None
+            result, state, ttl_ms = limiter.memory_hit(state, now_ms, cost, pause_ms)
+            self.states[redis_key] = (state, now_ms + ttl_ms)
+            if len(self.states) > MEMORY_BACKEND_SWEEP_SIZE:
+                self.states = {k: v for k, v in self.states.items() if v[1] > now_ms}
+        return result
+
+    async def ahit(self, limiter, key, cost, pause_ms=0):
+        return self.hit(limiter, key, cost, pause_ms)
+
+    def reset(self, limiter, key):
+        with self.lock:
+            self.states.pop(limiter.get_redis_key(key), None)
+
+
+_default_backend = None
+
+
+def get_default_backend():
+    global _default_backend
+    if _default_backend is None:
+        if settings.IS_PYODIDE:
+            _default_backend = MemoryRateLimitBackend()
+        else:
+            _default_backend = RedisRateLimitBackend()
+    return _default_backend
+
+
+class RateLimiter:
+    """
+    Base class for the rate limiting algorithms.
+
+    rate: a string for parse_rate, or (limit, window in seconds)
+    name: namespaces the keys, so that limiters can share keys
+    backend: defaults to Redis, or process memory on the static site
+    """
+
+    # subclasses must override these
+    SCRIPT = None
+
+    def __init__(self, rate, *, name="", backend=None):
+        if isinstance(rate, str):
+            rate = parse_rate(rate)
+        self.limit, self.window = rate
+        self.name = name
+        self.backend = backend
+
+    @property
+    def window_ms(self):
+        return int(self.window * 1000)
+
+    def get_redis_key(self, key):
+        return f"{KEY_PREFIX}:{type(self).__name__}:{self.name}:{key}"
+
+    def get_backend(self):
+        return self.backend or get_default_backend()
+
+    def hit(self, key, cost=1):
+        """Counts a hit against the key if it is allowed."""
+        return self.get_backend().hit(self, key, cost)
+
+    async def ahit(self, key, cost=1):
+        return await self.get_backend().ahit(self, key, cost)
+
+    def is_allowed(self, key, cost=1):
+        return self.hit(key, cost).allowed
+
+    def reset(self, key):
+        self.get_backend().reset(self, key)
+
+    def pause(self, key, seconds):
+        """
+        Denies hits on the key for the given number of seconds, for example
+        after a remote service has rate limited us. Not every algorithm can.
+        """
+        raise NotImplementedError
+
+    def get_script_args(self, cost, pause_ms=0):
+        return [int(time.time() * 1000), self.window_ms, self.limit, cost]
+
+    def to_result(self, response):
+        allowed, remaining, retry_after_ms = response
+        return RateLimitResult(
+            allowed=bool(allowed),
+            remaining=max(0, int(remaining)),
+            retry_after=max(0, int(retry_after_ms)) / 1000,
+        )
+
+    def memory_hit(self, state, now_ms, cost, pause_ms=0):
+        """
+        Same as SCRIPT, for MemoryRateLimitBackend. Returns the result, the new
+        state, and how long to keep it in ms.
+        """
+        raise NotImplementedError
+
+
+class SlidingWindowRateLimiter(RateLimiter):
+    SCRIPT = _SLIDING_WINDOW_SCRIPT
+
+    def get_script_args(self, cost, pause_ms=0):
+        return [*super().get_script_args(cost), uuid.uuid4().hex]
+
+    def memory_hit(self, state, now_ms, cost, pause_ms=0):
+        hits = state if state is not None else collections.deque()
+        while hits and hits[0] <= now_ms - self.window_ms:
+            hits.popleft()
+        count = len(hits)
+        if count + cost > self.limit:
+            retry_after_ms = self.window_ms
+            if cost <= self.limit:
+                retry_after_ms = hits[count + cost - self.limit - 1] + self.window_ms
+                retry_after_ms -= now_ms
+            result = (0, self.limit - count, retry_after_ms)
+        else:
+            hits.extend([now_ms] * cost)
+            result = (1, self.limit - count - cost, 0)
+        return self.to_result(result), hits, self.window_ms
+
+
+class TokenBucketRateLimiter(RateLimiter):
+    SCRIPT = _TOKEN_BUCKET_SCRIPT
+
+    def pause(self, key, seconds):
+        return self.get_backend().hit(self, key, 0, pause_ms=int(seconds * 1000))
+
+    def get_script_args(self, cost, pause_ms=0):
+        return [*super().get_script_args(cost), pause_ms]
+
+    def memory_hit(self, state, now_ms, cost, pause_ms=0):
+        rate = self.limit / self.window_ms
+        tokens, last_ms = state if state is not None else (self.limit, now_ms)
+        allowed = False
+        retry_after_ms = 0
+        if pause_ms > 0:
+            tokens = 0
+            last_ms = max(last_ms, now_ms + pause_ms)
+            retry_after_ms = last_ms - now_ms
+        else:
+            if now_ms > last_ms:
+                tokens = min(self.limit, tokens + (now_ms - last_ms) * rate)
+                last_ms = now_ms
+            if tokens >= cost:
+                tokens -= cost
+                allowed = True
+            elif cost > self.limit:
+                retry_after_ms = self.window_ms
+            else:
+                retry_after_ms = math.ceil((cost - tokens) / rate + (last_ms - now_ms))
+        result = (allowed, tokens, retry_after_ms)
+        ttl_ms = (self.limit - tokens) / rate + (last_ms - now_ms) + 1
+        return self.to_result(result), (tokens, last_ms), ttl_ms
+
+
+def default_rate_limit_key(*args, **kwargs):
+    """
+    Keys views by team, or IP address for anonymous requests, and websocket
+    handlers by team, or uuid for anonymous users.
+    """
+    if args and isinstance(args[0], HttpRequest):
+        request = args[0]
+        team = getattr(getattr(request, "context", None), "team", None)
+        if team is not None:
+            return f"team:{team.id}"
+        return f"ip:{request.META.get('REMOTE_ADDR')}"
+    user = kwargs.get("user", args[0] if args else None)
+    team_id = getattr(user, "team_id", None)
+    if team_id is not None:
+        return f"team:{team_id}"
+    return f"uuid:{kwargs.get('uuid', args[1] if len(args) > 1 else None)}"
+
+
+def default_on_limited(result, *args, **kwargs):
+    """Views get a 429 response. Websocket messages are dropped."""
+    if args and isinstance(args[0], HttpRequest):
+        response = JsonResponse(
+            {"error": "Too many requests, please try again later."}, status=429
+        )
+        response["Retry-After"] = str(max(1, round(result.retry_after)))
+        return response
+    return None
+
+
+def rate_limit(
+    rate,
+    *,
+    key=default_rate_limit_key,
+    limiter_class=SlidingWindowRateLimiter,
+    on_limited=default_on_limited,
+    backend=None,
+):
+    """
+    Decorator limiting calls to a view or websocket handler, sync or async.
+
+    key: called with the function's arguments, returns the key to count against
+    on_limited: called as on_limited(result, *args, **kwargs) instead of the
+        function when over the limit, and its value returned
+    """
+
+    def decorator(func):
+        limiter = limiter_class(
+            rate, name=f"{func.__module__}.{func.__qualname__}", backend=backend
+        )
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                result = await limiter.ahit(key(*args, **kwargs))
+                if not result.allowed:
+                    return on_limited(result, *args, **kwargs)
+                return await func(*args, **kwargs)
+
+        else:
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                result = limiter.hit(key(*args, **kwargs))
+                if not result.allowed:
+                    return on_limited(result, *args, **kwargs)
+                return func(*args, **kwargs)
+
+        wrapper.limiter = limiter
+        return wrapper
+
+    return decorator
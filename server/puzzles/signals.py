@@ -280,7 +280,9 @@ def notify_on_answer_submission(sender, instance, created, **kwargs):
                 websocket_data["cryptKeys"] = get_encryption_keys([story_card.slug])
 
         channels_group = ClientConsumer.get_team_group(id=instance.team_id)
-        ClientConsumer.send_event(channels_group, "submission", websocket_data)
+        ClientConsumer.broadcast_event(
+            channels_group, "submission", websocket_data, priority=is_correct
+        )
 
         if instance.correct:
             on_puzzle_solve(puzzle, instance)
@@ -327,7 +329,7 @@ def notify_on_new_hint(sender, instance, created, **kwargs):
             instance.puzzle.puzzle, instance.team, notification_type="hint"
         )
         channels_group = ClientConsumer.get_team_group(id=instance.team_id)
-        ClientConsumer.send_event(channels_group, "hint", websocket_data)
+        ClientConsumer.broadcast_event(channels_group, "hint", websocket_data)
 
 
 @receiver(post_save, sender=ExtraGuessGrant)
@@ -338,7 +340,7 @@ def notify_on_extra_guess_grant_update(sender, instance, **kwargs):
     channels_group = ClientConsumer.get_puzzle_group(
         id=instance.team_id, slug=instance.puzzle.slug
     )
-    ClientConsumer.send_event(channels_group, "submission", websocket_data)
+    ClientConsumer.broadcast_event(channels_group, "submission", websocket_data)
 
     # Handle status = GRANTED inside API call.
     if instance.status == ExtraGuessGrant.NO_RESPONSE:
@@ -379,7 +381,7 @@ def notify_on_storycardaccess_update(sender, instance, created, **kwargs):
     data["message"] = message
     data["icon"] = icon
     channels_group = ClientConsumer.get_team_group(id=team.id)
-    ClientConsumer.send_event(channels_group, "unlock", data)
+    ClientConsumer.broadcast_event(channels_group, "unlock", data)
 
 
 @receiver(post_save, sender=Feedback)
@@ -518,7 +520,7 @@ def _on_puzzle_unlock(*, team, puzzle, **kwargs):
         return
 
     channels_group = ClientConsumer.get_team_group(id=team.id)
-    ClientConsumer.send_event(channels_group, "unlock", websocket_data)
+    ClientConsumer.broadcast_event(channels_group, "unlock", websocket_data)
 
 
 def _on_round_unlock(*, team, round, **kwargs):
@@ -541,7 +543,7 @@ def _on_round_unlock(*, team, round, **kwargs):
     data["message"] = message
     data["title"] = title
     channels_group = ClientConsumer.get_team_group(id=team.id)
-    ClientConsumer.send_event(channels_group, "unlock", data)
+    ClientConsumer.broadcast_event(channels_group, "unlock", data)
 
 
 def _on_hint_resolved(**kwargs):
@@ -570,9 +572,11 @@ def _on_interaction_acomplished(**kwargs):
     )
 
 
-register(HuntEvent.PUZZLE_RELEASED, _on_puzzle_unlock)
-register(HuntEvent.METAPUZZLE_RELEASED, _on_puzzle_unlock)
-register(HuntEvent.ROUND_RELEASED, _on_round_unlock)
+# Unlock notifications are sent for every team on a global release, so move them
+# off the request.
+register(HuntEvent.PUZZLE_RELEASED, _on_puzzle_unlock, run_async=True)
+register(HuntEvent.METAPUZZLE_RELEASED, _on_puzzle_unlock, run_async=True)
+register(HuntEvent.ROUND_RELEASED, _on_round_unlock, run_async=True)
 register(HuntEvent.HINT_RESOLVED, _on_hint_resolved)
 register(HuntEvent.EMAIL_REPLIED, _on_email_reply)
 register(HuntEvent.INTERACTION_ACCOMPLISHED, _on_interaction_acomplished)
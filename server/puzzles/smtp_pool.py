@@ -0,0 +1,199 @@
+"""
+Bounded pool of long-lived SMTP connections, and a parallel sender on top of it.
+
+Connections are opened lazily, reused across tasks in the same worker process,
+and checked with NOOP before reuse if they have been idle for a while. The
+sender pushes emails through every connection in the pool at once, paced by a
+single rate limit instead of sleeping between sends.
+"""
+import contextlib
+import dataclasses
+import queue
+import smtplib
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connection as db_connection
+from tph.utils import get_task_logger
+
+from puzzles.rate_limits import MemoryRateLimitBackend, TokenBucketRateLimiter
+
+task_logger = get_task_logger(__name__)  # for Celery tasks
+
+# Check that a connection is still alive if it has been idle this long.
+IDLE_CHECK_S = 30
+
+
+def open_smtp_connection():
+    # port 465 starts in SSL mode, port 587 needs to upgrade the connection
+    SMTP = smtplib.SMTP if settings.EMAIL_PORT == 587 else smtplib.SMTP_SSL
+    connection = SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT)
+    try:
+        if settings.EMAIL_PORT == 587:
+            connection.starttls()
+        connection.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
+    except:
+        connection.close()
+        raise
+    return connection
+
+
+class SmtpPool:
+    def __init__(self, size, connect=open_smtp_connection):
+        self.size = size
+        self.connect = connect
+        self.slots = threading.BoundedSemaphore(size)
+        # (connection, time it was last used), most recently used last.
+        self.idle = queue.LifoQueue()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Checks out a connection, waiting if all of them are in use."""
+        with self.slots:
+            connection = self._checkout()
+            disconnected = False
+            try:
+                yield connection
+            except smtplib.SMTPServerDisconnected:
+                disconnected = True
+                raise
+            finally:
+                if disconnected:
+                    connection.close()
+                else:
+                    self.idle.put((connection, time.monotonic()))
+
+    def _checkout(self):
+        while True:
+            try:
+                connection, last_used = self.idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            if time.monotonic() - last_used < IDLE_CHECK_S:
+                return connection
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except smtplib.SMTPException:
+                pass
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                connection, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                connection.quit()
+            except smtplib.SMTPException:
+                connection.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    """Returns the SMTP connection pool shared by this worker process."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SmtpPool(settings.EMAIL_SMTP_POOL_SIZE)
+    return _pool
+
+
+@dataclasses.dataclass
+class SendStats:
+    sent: int = 0
+    failed: int = 0
+    elapsed_s: float = 0
+
+    @property
+    def per_second(self):
+        return self.sent / self.elapsed_s if self.elapsed_s else 0
+
+
+class ParallelSender:
+    """
+    Sends emails by pk over every connection in the pool at once. Use it as a
+    context manager: emails can be submitted while earlier ones are sending, and
+    exiting waits for all of them.
+
+    send_func is called as send_func(pk, active_connection=connection).
+    """
+
+    def __init__(self, send_func, *, rate, pool=None):
+        self.send_func = send_func
+        self.pool = pool or get_smtp_pool()
+        # Spaces sends out evenly. The limit is per sender, so it is kept in
+        # process memory.
+        self.rate_limiter = (
+            TokenBucketRateLimiter(
+                (1, 1 / rate), name="smtp", backend=MemoryRateLimitBackend()
+            )
+            if rate
+            else None
+        )
+        self.pending = queue.Queue()
+        self.stats = SendStats()
+        self.stats_lock = threading.Lock()
+        self.threads = []
+
+    def __enter__(self):
+        self.start_time = time.monotonic()
+        self.threads = [
+            threading.Thread(target=self._run, daemon=True)
+            for _ in range(self.pool.size)
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.stats.elapsed_s = time.monotonic() - self.start_time
+        task_logger.info(
+            "Sent %d emails (%d failed) in %.1fs, %.1f/s over %d connections",
+            self.stats.sent,
+            self.stats.failed,
+            self.stats.elapsed_s,
+            self.stats.per_second,
+            self.pool.size,
+        )
+
+    def submit(self, pk):
+        self.pending.put(pk)
+
+    def _wait_for_rate_limit(self):
+        if self.rate_limiter is None:
+            return
+        while not (result := self.rate_limiter.hit("send")).allowed:
+            time.sleep(result.retry_after)
+
+    def _run(self):
+        try:
+            while (pk := self.pending.get()) is not None:
+                self._wait_for_rate_limit()
+                try:
+                    with self.pool.connection() as connection:
+                        self.send_func(pk, active_connection=connection)
+                except:
+                    # The email stays in the sending state and can be resent.
+                    task_logger.error(traceback.format_exc())
+                    succeeded = False
+                else:
+                    succeeded = True
+                with self.stats_lock:
+                    if succeeded:
+                        self.stats.sent += 1
+                    else:
+                        self.stats.failed += 1
+        finally:
+            # Each thread gets its own database connection.
+            db_connection.close()
@@ -105,10 +105,21 @@ async function loadPyodideAndPackages() {
     import sys
     import zipfile
     import js
+    print('Fetching site packages')
+    # Pure python packages imported by the site, see tph/pyodide_bundle.py
+    try:
+      response = await js.fetch('/20xx/mypuzzlehunt.com/api/site-packages.zip')
+      if not response.ok:
+        raise RuntimeError(response.status)
+      js_buffer = await response.arrayBuffer()
+      with open('/${INDEXEDDB_PREFIX}site-packages-prebuilt.zip', 'wb') as f:
+        f.write(js_buffer.to_py())
+      sys.path.append('/${INDEXEDDB_PREFIX}site-packages-prebuilt.zip')
+    except Exception as e:
+      logging.warn(e)
     sys.path.append('/${INDEXEDDB_PREFIX}indexeddb/site-packages.zip')
     sys.path.append('/${INDEXEDDB_PREFIX}server.zip')
     sys_packages = []
-    os.environ['SETUPTOOLS_USE_DISTUTILS'] = 'local'
     try:
       with zipfile.ZipFile('/${INDEXEDDB_PREFIX}indexeddb/immovable-packages.zip') as zipf:
         package_root = '/lib/python3.10'
@@ -120,7 +131,6 @@ async function loadPyodideAndPackages() {
     print('Checking packages')
     for pkg in (
       'micropip',
-      'setuptools',
     ):
       try:
         importlib.import_module(pkg)
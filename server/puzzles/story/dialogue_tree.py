@@ -1,73 +1,241 @@
+"""
+Dialogue trees for story cards, written as CSV files in data/story.
+
+In production, the CSV files are compiled ahead of time by the
+compile_dialogues command into a single artifact: a header with the format
+version and the byte range of each tree, followed by the trees as JSON, with
+transitions already linked to the index of their target node. Trees are read
+out of the memory mapped artifact on first use, so processes do not
+parse CSVs or hold trees they never serve. Without an artifact (e.g. in
+development), trees are parsed from the CSV files instead.
+"""
 import csv
+import dataclasses
+import json
+import logging
+import mmap
+import os
 import re
-from functools import lru_cache
+import tempfile
+import typing
+from functools import cache, lru_cache
 
+from django.conf import settings
 from puzzles.assets import get_hashed_url
 from spoilr.core.models import PuzzleSubmission
 from tph.utils import load_file
 
+logger = logging.getLogger(__name__)
+
 OPTIONS = ("Option 1", "Option 2", "Option 3", "Option 4")
+OPTION_PATTERN = re.compile(r"\[\[(\(IF:(.+?)\))?(.+?)\|(.+?)\]\]\Z")
+# Transition target that ends the dialogue.
+EXIT_STATE = "EXIT"
+DIALOGUE_DIR = "data/story"
 
+# Bump when the structure of compiled trees changes.
+DIALOGUE_ARTIFACT_VERSION = 2
+DIALOGUE_ARTIFACT_MAGIC = b"tph-dialogues\n"
+DIALOGUE_TREE_CACHE_SIZE = 32
 
-@lru_cache(maxsize=None)
-def get_dialogue_tree(storycard: str):
+
+def parse_dialogue_tree(f):
     """
-    Loads a CSV for a dialogue tree into memory.
+    Parses a CSV for a dialogue tree.
     Supports raw text, html, and selectable options. See data/story/sample.csv.
     """
     tree = {}
-    with load_file(f"data/story/{storycard}.csv", base_module="puzzles").open() as f:
-        reader = csv.DictReader(f)
-        temp_state = 0
-        for row in reader:
-            state = row["State"]
-            text = row["Dialogue"].replace("\n", "<br>")  # Support line breaks
-            sprite = row.get("Sprite")
-            if not text:
-                continue
-
-            if not state:
-                state = f"temp{temp_state}"
-                temp_state += 1
-
-            assert state not in tree, f"Duplicate state found: {state}"
-
-            transitions = []
-            if row["Next State"]:
-                transitions.append({"state": row["Next State"]})
-            elif not any((row.get(option) for option in OPTIONS)):
-                # If there are no options, default to the next available state
-                transitions.append({"state": f"temp{temp_state}"})
-
-            for option in OPTIONS:
-                if row.get(option):
-                    match = re.match(
-                        r"\[\[(\(IF:(.+?)\))?(.+?)\|(.+?)\]\]\Z", row[option].strip()
-                    )
-                    assert match, f"No match found for option {row[option]}"
-                    groups = match.groups()
-                    assert (
-                        groups and len(groups) == 4
-                    ), f"Invalid syntax found for state {state}, option {option}: {row[option]}"
-
-                    transitions.append({"state": groups[3], "text": groups[2]})
-                    if groups[1]:
-                        transitions[-1]["condition"] = groups[1]
-
-            tree[state] = {
-                "state": state,
-                "sprite": sprite,
-                "text": text,
-                "transitions": transitions,
-            }
+    reader = csv.DictReader(f)
+    temp_state = 0
+    for row in reader:
+        state = row["State"]
+        text = row["Dialogue"].replace("\n", "<br>")  # Support line breaks
+        sprite = row.get("Sprite")
+        if not text:
+            continue
+
+        if not state:
+            state = f"temp{temp_state}"
+            temp_state += 1
+
+        assert state not in tree, f"Duplicate state found: {state}"
+
+        transitions = []
+        if row["Next State"]:
+            transitions.append({"state": row["Next State"]})
+        elif not any((row.get(option) for option in OPTIONS)):
+            # If there are no options, default to the next available state
+            transitions.append({"state": f"temp{temp_state}"})
+
+        for option in OPTIONS:
+            if row.get(option):
+                match = OPTION_PATTERN.match(row[option].strip())
+                assert match, f"No match found for option {row[option]}"
+                groups = match.groups()
+                assert (
+                    groups and len(groups) == 4
+                ), f"Invalid syntax found for state {state}, option {option}: {row[option]}"
+
+                transitions.append({"state": groups[3], "text": groups[2]})
+                if groups[1]:
+                    transitions[-1]["condition"] = groups[1]
+
+        tree[state] = {
+            "state": state,
+            "sprite": sprite,
+            "text": text,
+            "transitions": transitions,
+        }
 
     assert "start" in tree, "Missing start node"
 
     return tree
 
 
-def get_next_state(slug, tree, team, state="start"):
-    node = tree[state]
+def validate_dialogue_tree(tree):
+    """Returns a list of problems: links to missing nodes and unreachable nodes."""
+    problems = []
+    for state, node in tree.items():
+        for transition in node["transitions"]:
+            target = transition["state"]
+            if target != EXIT_STATE and target not in tree:
+                problems.append(f"{state} links to missing node {target}")
+
+    reachable = set()
+    pending = ["start"]
+    while pending:
+        state = pending.pop()
+        if state in reachable or state not in tree:
+            continue
+        reachable.add(state)
+        pending.extend(transition["state"] for transition in tree[state]["transitions"])
+    for state in tree:
+        if state not in reachable:
+            problems.append(f"{state} is unreachable from start")
+    return problems
+
+
+def compile_dialogue_tree(tree):
+    """
+    Converts a parsed tree (state -> node) into the form used at runtime: the
+    nodes in a list, and a mapping from state to index. Each transition gets
+    the index of its target node in "node", or None for EXIT.
+    """
+    states = {state: i for i, state in enumerate(tree)}
+    return {
+        "states": states,
+        "nodes": [
+            {
+                **node,
+                "transitions": [
+                    {**transition, "node": states.get(transition["state"])}
+                    for transition in node["transitions"]
+                ],
+            }
+            for node in tree.values()
+        ],
+    }
+
+
+def get_dialogue_slugs():
+    directory = load_file(DIALOGUE_DIR, base_module="puzzles")
+    return sorted(
+        path.name[: -len(".csv")]
+        for path in directory.iterdir()
+        if path.name.endswith(".csv")
+    )
+
+
+def parse_dialogue_file(storycard):
+    with load_file(
+        f"{DIALOGUE_DIR}/{storycard}.csv", base_module="puzzles"
+    ).open() as f:
+        return parse_dialogue_tree(f)
+
+
+def write_dialogue_artifact(path, trees):
+    """Writes the parsed trees (slug -> tree), compiled, to path atomically."""
+    body = bytearray()
+    index = {}
+    for slug, tree in sorted(trees.items()):
+        serialized = json.dumps(
+            compile_dialogue_tree(tree), separators=(",", ":")
+        ).encode()
+        index[slug] = (len(body), len(serialized))
+        body += serialized
+    header = json.dumps({"version": DIALOGUE_ARTIFACT_VERSION, "trees": index}).encode()
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        f.write(DIALOGUE_ARTIFACT_MAGIC)
+        f.write(header + b"\n")
+        f.write(body)
+    os.replace(f.name, path)
+
+
+@dataclasses.dataclass
+class DialogueArtifact:
+    data: mmap.mmap
+    body_offset: int
+    # slug -> (offset, length) in the body
+    index: typing.Dict[str, typing.Tuple[int, int]]
+
+    def load(self, slug):
+        offset, length = self.index[slug]
+        start = self.body_offset + offset
+        return json.loads(self.data[start : start + length])
+
+
+@cache
+def get_dialogue_artifact():
+    """Returns the compiled artifact, or None if it is missing or out of date."""
+    path = settings.DIALOGUE_ARTIFACT_PATH
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # mmap raises ValueError for an empty file.
+        return None
+    header_end = data.find(b"\n", len(DIALOGUE_ARTIFACT_MAGIC))
+    if (
+        data[: len(DIALOGUE_ARTIFACT_MAGIC)] != DIALOGUE_ARTIFACT_MAGIC
+        or header_end < 0
+    ):
+        logger.warning("Ignoring invalid dialogue artifact at %s", path)
+        return None
+    header = json.loads(data[len(DIALOGUE_ARTIFACT_MAGIC) : header_end])
+    if header["version"] != DIALOGUE_ARTIFACT_VERSION:
+        logger.warning(
+            "Ignoring dialogue artifact with version %s, expected %s",
+            header["version"],
+            DIALOGUE_ARTIFACT_VERSION,
+        )
+        return None
+    return DialogueArtifact(
+        data=data,
+        body_offset=header_end + 1,
+        index={slug: tuple(entry) for slug, entry in header["trees"].items()},
+    )
+
+
+@lru_cache(maxsize=DIALOGUE_TREE_CACHE_SIZE)
+def get_dialogue_tree(storycard: str):
+    """Loads a dialogue tree into memory. The result is shared, do not modify it."""
+    artifact = get_dialogue_artifact()
+    if artifact is not None and storycard in artifact.index:
+        return artifact.load(storycard)
+    return compile_dialogue_tree(parse_dialogue_file(storycard))
+
+
+def get_next_state(slug, tree, team, state="start", node=None):
+    """
+    Returns the node for a state. Transitions pass the index of their target
+    node, which skips looking up the state.
+    """
+    if node is None:
+        node = tree["states"][state]
+    node = tree["nodes"][node]
     sprite = node.get("sprite")
     # FIXME set sprite
     return {
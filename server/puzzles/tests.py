@@ -0,0 +1,526 @@
+import contextlib
+import datetime
+import os
+import tempfile
+import time
+from unittest import mock
+
+import fakeredis
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from spoilr.core.api.events import HuntEvent
+from spoilr.core.models import HuntSetting, RoundAccess, SystemLog, UserTeamRole, User
+
+from puzzles import gate, rate_limits, utils, webhooks
+from puzzles.models import (
+    GuessRateLimit,
+    Puzzle,
+    PuzzleAccess,
+    PuzzleSubmission,
+    Round,
+    Team,
+)
+from puzzles.rate_limits import (
+    MemoryRateLimitBackend,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+    rate_limit,
+)
+from puzzles.rounds import CUSTOM_RATE_LIMITERS
+from puzzles.smtp_pool import ParallelSender
+from puzzles.story import dialogue_tree
+from puzzles.views.submissions import get_ratelimit, process_guess
+
+
+def start_hunt():
+    now = timezone.now()
+    for name, value in (
+        ("spoilr.hunt.launch_time", now - datetime.timedelta(days=1)),
+        ("spoilr.hunt.end_time", now + datetime.timedelta(days=1)),
+    ):
+        HuntSetting.objects.update_or_create(name=name, defaults={"date_value": value})
+
+
+def create_team(username):
+    team = Team.objects.create(username=username, name=username)
+    User.objects.create_user(
+        username=username,
+        password=username,
+        team=team.spoilr_team,
+        team_role=UserTeamRole.SHARED_ACCOUNT,
+    )
+    return team
+
+
+class FakeRedisTestCase(TestCase):
+    """Points the Redis handle of the given modules at a fresh fakeredis."""
+
+    redis_modules = ()
+
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        for module in self.redis_modules:
+            patcher = mock.patch(f"{module}._redis", return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # The hunt settings are cached.
+        for alias in caches:
+            caches[alias].clear()
+
+
+@override_settings(FAKE_REDIS=True)
+class FakeRedisSettingTest(SimpleTestCase):
+    def setUp(self):
+        for function in (utils.get_fake_redis_server, utils.get_redis_handle):
+            function.cache_clear()
+            self.addCleanup(function.cache_clear)
+
+    def test_sync_and_async_clients_share_a_server(self):
+        utils.get_redis_handle().set("key", "value")
+
+        async def get():
+            value = await utils.get_async_redis_handle().get("key")
+            # The handle is only valid for this event loop.
+            utils._async_redis_handles.clear()
+            return value
+
+        self.assertEqual(async_to_sync(get)(), b"value")
+
+
+class GateTest(FakeRedisTestCase):
+    redis_modules = ("puzzles.gate",)
+
+    @classmethod
+    def setUpTestData(cls):
+        start_hunt()
+        round = Round.objects.create(slug="round", name="Round", order=0)
+        cls.unlocked, cls.locked = [
+            Puzzle.objects.create(
+                external_id=i,
+                round=round,
+                slug=slug,
+                name=slug,
+                answer=slug.upper(),
+                order=i,
+                deep=deep,
+            )
+            for i, (slug, deep) in enumerate((("unlocked", 0), ("locked", 10**6)))
+        ]
+        cls.team = create_team("team")
+        PuzzleAccess.objects.create(team=cls.team, puzzle=cls.unlocked)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.team.user_set.get())
+        self.key = gate.UNLOCKED_SLUGS_KEY_FORMAT.format(self.team.id)
+
+    def test_init_unlocked_slugs_creates_missing_set_only(self):
+        gate.add_unlocked_slugs(self.team.id, ["a"])
+        self.assertFalse(self.redis.exists(self.key))
+
+        gate.init_unlocked_slugs(self.team.id, ["a", "b"])
+        gate.init_unlocked_slugs(self.team.id, ["c"])
+        self.assertEqual(self.redis.smembers(self.key), {b"a", b"b"})
+        self.assertGreater(self.redis.ttl(self.key), 0)
+
+        gate.add_unlocked_slugs(self.team.id, ["c", "d"])
+        self.assertEqual(gate.get_slug_unlocked_state(self.team.id, "d"), (True, True))
+        self.assertEqual(
+            gate.get_slug_unlocked_state(self.team.id + 1, "d"), (False, False)
+        )
+
+    def test_check_fills_unlocked_set(self):
+        response = self.client.get("/check/puzzles/unlocked/index.html")
+        self.assertEqual(response["X-Accel-Redirect"], "/puzzles/unlocked/index.html")
+        self.assertEqual(self.redis.smembers(self.key), {b"unlocked"})
+
+        response = self.client.get("/check/puzzles/locked/index.html")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.redis.smembers(self.key), {b"unlocked"})
+
+    def test_check_answers_from_unlocked_set(self):
+        gate.init_unlocked_slugs(self.team.id, ["locked"])
+        response = self.client.get("/check/puzzles/locked/index.html")
+        self.assertEqual(response["X-Accel-Redirect"], "/puzzles/locked/index.html")
+
+    def test_allow_decisions_are_per_subpart(self):
+        self.assertEqual(gate.get_gate_prefix("puzzles/slug"), "/puzzles/slug")
+        self.assertEqual(
+            gate.get_gate_prefix("puzzles/slug/mini/image.png"), "/puzzles/slug/mini"
+        )
+        self.assertEqual(gate.get_gate_prefix("hints/slug/1"), "/hints/slug")
+        self.assertIsNone(gate.get_gate_prefix("solutions/slug"))
+
+        self.client.get("/check/puzzles/unlocked/mini/image.png")
+        with mock.patch.object(
+            gate, "remember_allow_decision"
+        ) as remember_allow_decision, mock.patch(
+            "puzzles.context.Context.is_minipuzzle_unlocked", return_value=False
+        ):
+            # Remembered for this subpart only.
+            response = self.client.get("/check/puzzles/unlocked/mini/other.png")
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get("/check/puzzles/unlocked/other/image.png")
+            self.assertEqual(response.status_code, 404)
+        remember_allow_decision.assert_not_called()
+
+
+class MemoryRateLimitBackendTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(rate_limits, "time")
+        self.time = patcher.start().time
+        self.addCleanup(patcher.stop)
+        self.time.return_value = 1000.0
+        self.backend = MemoryRateLimitBackend()
+
+    def advance(self, seconds):
+        self.time.return_value += seconds
+
+    def test_sliding_window(self):
+        limiter = SlidingWindowRateLimiter("2/10s", backend=self.backend)
+        self.assertTrue(limiter.hit("key").allowed)
+        self.advance(4)
+        result = limiter.hit("key")
+        self.assertEqual((result.allowed, result.remaining), (True, 0))
+
+        result = limiter.hit("key")
+        self.assertFalse(result.allowed)
+        # The first hit leaves the window 10s after it was made.
+        self.assertEqual(result.retry_after, 6)
+        self.assertTrue(limiter.hit("other").allowed)
+
+        self.advance(6)
+        self.assertTrue(limiter.hit("key").allowed)
+        self.assertFalse(limiter.hit("key").allowed)
+
+        limiter.reset("key")
+        self.assertTrue(limiter.hit("key").allowed)
+
+    def test_token_bucket(self):
+        limiter = TokenBucketRateLimiter("2/10s", backend=self.backend)
+        self.assertTrue(limiter.hit("key").allowed)
+        self.assertTrue(limiter.hit("key").allowed)
+        result = limiter.hit("key")
+        self.assertFalse(result.allowed)
+        # A token is added every 5s.
+        self.assertEqual(result.retry_after, 5)
+
+        self.advance(5)
+        self.assertTrue(limiter.hit("key").allowed)
+        self.assertFalse(limiter.hit("key").allowed)
+        self.assertFalse(limiter.hit("key", cost=3).allowed)
+
+    def test_token_bucket_pause(self):
+        limiter = TokenBucketRateLimiter("2/10s", backend=self.backend)
+        self.assertEqual(limiter.pause("key", 30).retry_after, 30)
+        self.advance(20)
+        self.assertEqual(limiter.hit("key").retry_after, 15)
+        # The bucket starts refilling once the pause is over.
+        self.advance(15)
+        self.assertTrue(limiter.hit("key").allowed)
+
+    def test_expired_keys_are_dropped(self):
+        limiter = TokenBucketRateLimiter("2/10s", backend=self.backend)
+        with mock.patch.object(rate_limits, "MEMORY_BACKEND_SWEEP_SIZE", 2):
+            for key in range(3):
+                limiter.hit(key)
+            self.advance(60)
+            limiter.hit("key")
+        self.assertEqual(len(self.backend.states), 1)
+
+
+class RedisRateLimitBackendTest(SimpleTestCase):
+    """Runs the Lua scripts against fakeredis, with the same results."""
+
+    def setUp(self):
+        redis_patcher = mock.patch(
+            "puzzles.utils.get_redis_handle", return_value=fakeredis.FakeRedis()
+        )
+        redis_patcher.start()
+        self.addCleanup(redis_patcher.stop)
+        time_patcher = mock.patch.object(rate_limits, "time")
+        self.time = time_patcher.start().time
+        self.addCleanup(time_patcher.stop)
+        self.time.return_value = 1000.0
+        self.backend = rate_limits.RedisRateLimitBackend()
+
+    def test_sliding_window(self):
+        limiter = SlidingWindowRateLimiter("2/10s", backend=self.backend)
+        self.assertTrue(limiter.hit("key").allowed)
+        self.time.return_value += 4
+        self.assertTrue(limiter.hit("key").allowed)
+        result = limiter.hit("key")
+        self.assertEqual((result.allowed, result.retry_after), (False, 6))
+
+    def test_token_bucket_pause(self):
+        limiter = TokenBucketRateLimiter("2/10s", backend=self.backend)
+        self.assertTrue(limiter.hit("key").allowed)
+        self.assertTrue(limiter.hit("key").allowed)
+        self.assertEqual(limiter.hit("key").retry_after, 5)
+        self.assertEqual(limiter.pause("key", 30).retry_after, 30)
+        self.time.return_value += 20
+        self.assertEqual(limiter.hit("key").retry_after, 15)
+        self.time.return_value += 15
+        self.assertTrue(limiter.hit("key").allowed)
+
+
+class RateLimitDecoratorTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_view(self):
+        @rate_limit("2/m", backend=MemoryRateLimitBackend())
+        def view(request):
+            return "ok"
+
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(view(request), "ok")
+        self.assertEqual(view(request), "ok")
+        response = view(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertEqual(view(self.factory.get("/", REMOTE_ADDR="10.0.0.2")), "ok")
+
+    def test_view_keyed_by_team(self):
+        @rate_limit("1/m", backend=MemoryRateLimitBackend())
+        def view(request):
+            return "ok"
+
+        requests = [self.factory.get("/", REMOTE_ADDR=f"10.0.0.{i}") for i in range(2)]
+        for request in requests:
+            request.context = mock.Mock(team=mock.Mock(id=1))
+        self.assertEqual(view(requests[0]), "ok")
+        self.assertEqual(view(requests[1]).status_code, 429)
+
+    def test_async_handler(self):
+        calls = []
+
+        @rate_limit("1/s", backend=MemoryRateLimitBackend())
+        async def process_data(user, uuid, data, **kwargs):
+            calls.append(data)
+            return data
+
+        user = mock.Mock(team_id=None)
+        process = async_to_sync(process_data)
+        self.assertEqual(process(user=user, uuid="a", data=1), 1)
+        # Messages over the limit are dropped.
+        self.assertIsNone(process(user=user, uuid="a", data=2))
+        self.assertEqual(process(user, "b", 3), 3)
+        self.assertEqual(calls, [1, 3])
+
+
+class RateLimitedClientsTest(SimpleTestCase):
+    def test_webhook_token_bucket(self):
+        with mock.patch.object(
+            webhooks._token_bucket, "backend", MemoryRateLimitBackend()
+        ):
+            for _ in range(webhooks.BUCKET_CAPACITY):
+                self.assertEqual(webhooks._take_token("webhook"), 0)
+            self.assertGreater(webhooks._take_token("webhook"), 0)
+            self.assertEqual(webhooks._take_token("other"), 0)
+            # A 429 from Discord pauses the webhook for its retry_after.
+            self.assertEqual(webhooks._take_token("other", retry_after_s=3), 3)
+            self.assertGreater(webhooks._take_token("other"), 2)
+
+    def test_parallel_sender_is_paced(self):
+        class Pool:
+            size = 4
+
+            @contextlib.contextmanager
+            def connection(self):
+                yield None
+
+        sent = []
+        rate = 50
+        start = time.monotonic()
+        with mock.patch("puzzles.smtp_pool.db_connection"):
+            with ParallelSender(
+                lambda pk, active_connection: sent.append(pk), rate=rate, pool=Pool()
+            ) as sender:
+                for pk in range(6):
+                    sender.submit(pk)
+        self.assertEqual(sorted(sent), list(range(6)))
+        self.assertEqual(sender.stats.sent, 6)
+        self.assertGreaterEqual(time.monotonic() - start, 5 / rate)
+
+
+class GuessRateLimitTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start_hunt()
+        round = Round.objects.create(slug="round", name="Round", order=0)
+        cls.puzzle = Puzzle.objects.create(
+            external_id=0,
+            round=round,
+            slug="puzzle",
+            name="Puzzle",
+            answer="ANSWER",
+            order=0,
+            deep=0,
+        )
+        cls.team = create_team("team")
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        self.puzzle = Puzzle.objects.select_related("round").get(id=self.puzzle.id)
+
+    def guess(self, *answers):
+        for answer in answers:
+            process_guess(timezone.now(), self.team, self.puzzle, answer)
+
+    def set_guess_times(self, now):
+        # The latest wrong guess is at `now`, the ones before a minute apart.
+        submissions = list(
+            PuzzleSubmission.objects.filter(correct=False).order_by("-timestamp")
+        )
+        for i, submission in enumerate(submissions):
+            submission.timestamp = now - datetime.timedelta(minutes=i)
+        PuzzleSubmission.objects.bulk_update(submissions, ["timestamp"])
+        GuessRateLimit.refresh(self.team.id, self.puzzle)
+
+    def test_reading_without_guesses_does_not_write(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                get_ratelimit(self.puzzle, self.team), {"shouldLimit": False}
+            )
+        self.assertFalse(GuessRateLimit.objects.exists())
+
+    def test_backoff(self):
+        self.guess("WRONG1")
+        record = GuessRateLimit.objects.get()
+        # The first wrong guess limits nothing.
+        self.assertEqual(record.next_allowed_time, record.window_start)
+        self.assertFalse(get_ratelimit(self.puzzle, self.team)["shouldLimit"])
+
+        self.guess("WRONG2", "WRONG3", "WRONG4")
+        # Correct guesses don't count.
+        PuzzleSubmission.objects.create(
+            team=self.team.spoilr_team,
+            puzzle=self.puzzle.spoilr_puzzle,
+            answer="ANSWER",
+            correct=True,
+            used_free_answer=False,
+        )
+        now = timezone.now()
+        self.set_guess_times(now)
+        record = GuessRateLimit.objects.get()
+        self.assertEqual(record.wrong_guess_count, 4)
+        self.assertEqual(record.window_start, now)
+        # The oldest guess waits 3^2 / 1.5 = 6 minutes, until 3 minutes from now.
+        self.assertEqual(record.next_allowed_time, now + datetime.timedelta(minutes=3))
+        ratelimit = get_ratelimit(self.puzzle, self.team, include_guesses=True)
+        self.assertTrue(ratelimit["shouldLimit"])
+        self.assertAlmostEqual(ratelimit["secondsToWait"], 181, delta=5)
+        self.assertEqual(len(ratelimit["guessesMade"]), 5)
+
+        with mock.patch.dict(
+            CUSTOM_RATE_LIMITERS,
+            {"round": lambda i: datetime.timedelta(minutes=10 * (i + 1))},
+        ):
+            self.set_guess_times(now)
+        # The oldest guess waits 40 minutes.
+        self.assertEqual(
+            GuessRateLimit.objects.get().next_allowed_time,
+            now + datetime.timedelta(minutes=37),
+        )
+
+    def test_deleted_guess_is_recomputed_without_writing(self):
+        self.guess("WRONG1", "WRONG2")
+        PuzzleSubmission.objects.order_by("timestamp").first().delete()
+        self.assertFalse(GuessRateLimit.objects.exists())
+
+        self.assertFalse(get_ratelimit(self.puzzle, self.team)["shouldLimit"])
+        self.assertFalse(GuessRateLimit.objects.exists())
+        self.guess("WRONG3")
+        self.assertEqual(GuessRateLimit.objects.get().wrong_guess_count, 2)
+
+
+class DialogueTreeTest(SimpleTestCase):
+    def setUp(self):
+        for function in (
+            dialogue_tree.get_dialogue_artifact,
+            dialogue_tree.get_dialogue_tree,
+        ):
+            function.cache_clear()
+            self.addCleanup(function.cache_clear)
+
+    def test_artifact_links_transitions_to_nodes(self):
+        tree = dialogue_tree.parse_dialogue_file("sample")
+        self.assertEqual(dialogue_tree.validate_dialogue_tree(tree), [])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dialogues")
+            dialogue_tree.write_dialogue_artifact(path, {"sample": tree})
+            with self.settings(DIALOGUE_ARTIFACT_PATH=path):
+                compiled = dialogue_tree.get_dialogue_tree("sample")
+                self.assertIsNotNone(dialogue_tree.get_dialogue_artifact())
+        self.assertEqual(compiled, dialogue_tree.compile_dialogue_tree(tree))
+
+        # Follow the last option of each node to the end.
+        node = dialogue_tree.get_next_state("sample", compiled, None)
+        states = [node["state"]]
+        transition = node["transitions"][-1]
+        while transition["node"] is not None:
+            node = dialogue_tree.get_next_state(
+                "sample", compiled, None, node=transition["node"]
+            )
+            states.append(node["state"])
+            transition = node["transitions"][-1]
+        self.assertEqual(states, ["start", "temp0", "temp1", "end"])
+        self.assertEqual(transition["state"], dialogue_tree.EXIT_STATE)
+
+
+class UnlockTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start_hunt()
+        round = Round.objects.create(slug="round", name="Round", order=0)
+        cls.puzzles = [
+            Puzzle.objects.create(
+                external_id=i,
+                round=round,
+                slug=f"puzzle-{i}",
+                name=f"Puzzle {i}",
+                answer=f"ANSWER {i}",
+                order=i,
+                deep=i * 10,
+                is_meta=i == 1,
+            )
+            for i in range(3)
+        ]
+        cls.team = create_team("team")
+
+    def setUp(self):
+        patcher = mock.patch(
+            "puzzles.utils.get_redis_handle", return_value=fakeredis.FakeRedis()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # The unlock tables and team state are cached.
+        for alias in caches:
+            caches[alias].clear()
+
+    def unlock(self, deep):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.team.unlock_puzzles({"round": deep})
+
+    def test_releases_log_the_same_events_as_release_puzzle(self):
+        self.assertEqual(len(self.unlock(10)), 2)
+        self.assertEqual(
+            list(SystemLog.objects.order_by("id").values_list("event_type", "message")),
+            [
+                (HuntEvent.ROUND_RELEASED, 'Released round "Round"'),
+                (HuntEvent.PUZZLE_RELEASED, f"Released {self.puzzles[0]}"),
+                (HuntEvent.METAPUZZLE_RELEASED, f"Released {self.puzzles[1]}"),
+            ],
+        )
+
+    def test_deleted_round_access_is_released_again(self):
+        self.unlock(0)
+        with self.captureOnCommitCallbacks(execute=True):
+            RoundAccess.objects.filter(team=self.team).delete()
+        self.unlock(0)
+        self.assertTrue(RoundAccess.objects.filter(team=self.team).exists())
@@ -0,0 +1,223 @@
+"""
+Incremental unlock engine for DEEP-based puzzle releases.
+
+Every page view asks which puzzles a team has unlocked. Rather than walking
+every puzzle and calling get_or_create for each one, we precompute a threshold
+table per DEEP key from Puzzle.deep / Puzzle.deep_key, and remember the last
+(threshold, extra unlocks) pair evaluated for each key of each team. Release
+work only happens for keys whose values changed since the last evaluation, and
+newly crossed puzzles are written with a single bulk insert.
+"""
+import collections
+import dataclasses
+import math
+import threading
+import typing
+from bisect import bisect_right
+from uuid import uuid4
+
+from django.conf import settings
+from spoilr.core.api.cache import cache
+from spoilr.core.api.hunt import release_puzzles, release_rounds
+
+from puzzles.models import ExtraUnlock, Puzzle, Round
+
+TABLES_VERSION_KEY = "unlocks:tables_version"
+TEAM_STATE_KEY_FORMAT = "unlocks:team:{}"
+# Long enough to cover a hunt, the state is cheap to recompute if evicted.
+TEAM_STATE_TIMEOUT_S = 7 * 24 * 60 * 60
+
+# Same ordering as the original unlock loop. Round order must be first because
+# extra unlocks are handed out in round order, deep_key then deep guarantees
+# we see unlocked puzzles before locked ones for a key, and slug breaks ties.
+PUZZLE_UNLOCK_ORDERING = ("round__order", "deep_key", "deep", "slug")
+
+
+@dataclasses.dataclass
+class KeyTable:
+    """Unlock thresholds for all puzzles sharing a DEEP key."""
+
+    # (deep, puzzle_id) in unlock order, used to hand out extra unlocks.
+    entries: typing.List[typing.Tuple[int, int]]
+    # Sorted deep thresholds and the matching puzzle ids.
+    deeps: typing.List[int]
+    puzzle_ids: typing.List[int]
+
+    def unlocked_ids(self, threshold, num_extra):
+        """Returns the ids of puzzles unlocked at this threshold."""
+        unlocked = self.puzzle_ids[: bisect_right(self.deeps, threshold)]
+        if num_extra > 0:
+            # Let the first N locked puzzles through.
+            locked = (puzzle_id for deep, puzzle_id in self.entries if deep > threshold)
+            for _, puzzle_id in zip(range(num_extra), locked):
+                unlocked.append(puzzle_id)
+        return unlocked
+
+
+@dataclasses.dataclass
+class UnlockTables:
+    version: str
+    tables: typing.Dict[str, KeyTable]
+    # puzzle id -> round id
+    round_ids: typing.Dict[int, int]
+
+    def thresholds(self, deep, extra_unlocks):
+        """Returns the (threshold, extra unlocks) pair for every DEEP key."""
+        deep_all = deep.get("all", -math.inf)
+        return {
+            deep_key: (max(deep.get(deep_key, 0), deep_all), extra_unlocks[deep_key])
+            for deep_key in self.tables
+        }
+
+
+_tables = None
+_tables_lock = threading.Lock()
+
+
+def _build_tables(version):
+    entries = collections.defaultdict(list)
+    round_ids = {}
+    for puzzle_id, deep, deep_key, round_id, round_slug in Puzzle.objects.order_by(
+        *PUZZLE_UNLOCK_ORDERING
+    ).values_list("id", "deep", "deep_key", "round_id", "round__slug"):
+        entries[deep_key or round_slug].append((deep, puzzle_id))
+        round_ids[puzzle_id] = round_id
+
+    tables = {}
+    for deep_key, key_entries in entries.items():
+        # Stable sort so ties on deep keep the unlock order.
+        by_deep = sorted(key_entries, key=lambda entry: entry[0])
+        tables[deep_key] = KeyTable(
+            entries=key_entries,
+            deeps=[deep for deep, _ in by_deep],
+            puzzle_ids=[puzzle_id for _, puzzle_id in by_deep],
+        )
+    return UnlockTables(version=version, tables=tables, round_ids=round_ids)
+
+
+def get_unlock_tables(version=None):
+    """Returns the threshold tables, rebuilding them if puzzles have changed."""
+    global _tables
+
+    if version is None:
+        version = _get_tables_version()
+    tables = _tables
+    if tables is None or tables.version != version:
+        with _tables_lock:
+            if _tables is None or _tables.version != version:
+                _tables = _build_tables(version)
+            tables = _tables
+    return tables
+
+
+def _get_tables_version():
+    version = cache.get(TABLES_VERSION_KEY)
+    if version is None:
+        version = _new_tables_version()
+    return version
+
+
+def _new_tables_version():
+    version = uuid4().hex
+    if not cache.add(TABLES_VERSION_KEY, version, timeout=None):
+        version = cache.get(TABLES_VERSION_KEY, version)
+    return version
+
+
+def invalidate_unlock_tables():
+    """Forces every process to rebuild its threshold tables."""
+    cache.delete(TABLES_VERSION_KEY)
+
+
+def reset_team_unlock_state(team_id):
+    """Forces the next unlock evaluation for this team to consider all keys."""
+    cache.delete(TEAM_STATE_KEY_FORMAT.format(team_id))
+
+
+def _get_state(team):
+    state_key = TEAM_STATE_KEY_FORMAT.format(team.id)
+    values = cache.get_many([TABLES_VERSION_KEY, state_key])
+    version = values.get(TABLES_VERSION_KEY) or _new_tables_version()
+    return version, values.get(state_key)
+
+
+def _get_unlocked_puzzles(team):
+    return list(
+        Puzzle.objects.filter(puzzleaccess__team=team).order_by("puzzleaccess__id")
+    )
+
+
+def _get_extra_unlocks(team):
+    extra_unlocks = collections.defaultdict(int)
+    for deep_key, count in ExtraUnlock.objects.filter(team=team).values_list(
+        "deep_key", "count"
+    ):
+        extra_unlocks[deep_key] = count
+    return extra_unlocks
+
+
+def unlock_puzzles(team, deep):
+    """
+    Releases any puzzles the team has newly crossed the threshold for, and
+    returns all puzzles the team has access to.
+    """
+    version, state = _get_state(team)
+    tables = get_unlock_tables(version)
+    if state is not None and state[0] == tables.version:
+        # Changing an ExtraUnlock resets the state, so the counts in it are
+        # current and the fast path does not need to query them.
+        extra_unlocks = collections.defaultdict(int)
+        for deep_key, (_, num_extra) in state[1].items():
+            extra_unlocks[deep_key] = num_extra
+        if state[1] == tables.thresholds(deep, extra_unlocks):
+            return _get_unlocked_puzzles(team)
+
+    thresholds = tables.thresholds(deep, _get_extra_unlocks(team))
+
+    # Import here to avoid circular import
+    from puzzles.utils import redis_lock
+
+    with redis_lock(f"unlock_puzzles:{team.id}", timeout=settings.REDIS_FAST_TIMEOUT):
+        # Another request may have done the work while we waited.
+        _, state = _get_state(team)
+        puzzles = _get_unlocked_puzzles(team)
+        if state == (tables.version, thresholds):
+            return puzzles
+
+        previous = {}
+        if state is not None and state[0] == tables.version:
+            previous = state[1]
+        crossed_ids = set()
+        for deep_key, (threshold, num_extra) in thresholds.items():
+            if previous.get(deep_key) == (threshold, num_extra):
+                continue
+            crossed_ids.update(
+                tables.tables[deep_key].unlocked_ids(threshold, num_extra)
+            )
+
+        if crossed_ids:
+            # Like the original unlock loop, this releases the round of every
+            # crossed puzzle, not only of new ones. Deleting a RoundAccess
+            # resets the state, so the round is released again.
+            release_rounds(
+                team,
+                Round.objects.filter(
+                    id__in={tables.round_ids[puzzle_id] for puzzle_id in crossed_ids}
+                ).select_related("superround"),
+            )
+        crossed_ids.difference_update(puzzle.id for puzzle in puzzles)
+        if crossed_ids:
+            new_puzzles = list(
+                Puzzle.objects.filter(id__in=crossed_ids).order_by(
+                    *PUZZLE_UNLOCK_ORDERING
+                )
+            )
+            release_puzzles(team, new_puzzles)
+            puzzles.extend(new_puzzles)
+
+        cache.set(
+            TEAM_STATE_KEY_FORMAT.format(team.id),
+            (tables.version, thresholds),
+            timeout=TEAM_STATE_TIMEOUT_S,
+        )
+    return puzzles
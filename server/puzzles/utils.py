@@ -1,14 +1,17 @@
+import asyncio
 import contextlib
 import enum
 import functools
 import hashlib
 import math
 import re
+import weakref
 from datetime import datetime
-from functools import cache, lru_cache, wraps
+from functools import cache, wraps
 from typing import Tuple
 
 import redis
+import redis.asyncio
 from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.db.models import Prefetch
@@ -63,24 +66,6 @@ def login_required(function=None):
     return decorator
 
 
-class RateLimiter:
-    def __init__(self, interval):
-        self.interval = interval
-        self.last_guess = 0
-
-    def is_allowed(self):
-        now = time.time()
-        if now - self.last_guess > self.interval:
-            self.last_guess = now
-            return True
-        return False
-
-
-@lru_cache(maxsize=32768)
-def get_rate_limiter_for(key, limit=1):
-    return RateLimiter(12)
-
-
 def is_unlocked(*, puzzle_slug=None, story_slug=None, user=None, team_id=None):
     if team_id is None:
         team_id = user.team_id
@@ -136,8 +121,24 @@ def get_encryption_keys(names):
     return d
 
 
+@cache
+def get_fake_redis_server():
+    """Shared by the fakeredis clients used when settings.FAKE_REDIS is set."""
+    # Import here since fakeredis is only a dev dependency
+    import fakeredis
+
+    return fakeredis.FakeServer()
+
+
 @cache
 def get_redis_handle():
+    if settings.FAKE_REDIS:
+        import fakeredis
+
+        return fakeredis.FakeRedis(
+            server=get_fake_redis_server(),
+            db=settings.REDIS_DATABASE_ENUM.REDIS_CLIENT.value,
+        )
     return redis.Redis(
         host=settings.REDIS_HOST,
         port=settings.REDIS_PORT,
@@ -145,6 +146,36 @@ def get_redis_handle():
     )
 
 
+# Async clients cannot be shared between event loops.
+_async_redis_handles = weakref.WeakKeyDictionary()
+# Callers past this many wait for a connection instead of failing, which
+# matters when thousands of websockets connect at once.
+ASYNC_REDIS_MAX_CONNECTIONS = 50
+
+
+def get_async_redis_handle():
+    """Returns a redis.asyncio client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    redis_handle = _async_redis_handles.get(loop)
+    if redis_handle is None and settings.FAKE_REDIS:
+        import fakeredis
+
+        redis_handle = _async_redis_handles[loop] = fakeredis.FakeAsyncRedis(
+            server=get_fake_redis_server(),
+            db=settings.REDIS_DATABASE_ENUM.REDIS_CLIENT.value,
+        )
+    elif redis_handle is None:
+        redis_handle = _async_redis_handles[loop] = redis.asyncio.Redis(
+            connection_pool=redis.asyncio.BlockingConnectionPool(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DATABASE_ENUM.REDIS_CLIENT.value,
+                max_connections=ASYNC_REDIS_MAX_CONNECTIONS,
+            )
+        )
+    return redis_handle
+
+
 def redis_lock(*args, timeout=settings.REDIS_LONG_TIMEOUT, **kwargs):
     """
     Multiprocess lock using redis.
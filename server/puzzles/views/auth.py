@@ -27,6 +27,14 @@ from puzzles.forms import (
     TeamCreationForm,
     TeamEditForm,
 )
+from puzzles.gate import (
+    accel_redirect_response,
+    get_gate_prefix,
+    get_slug_unlocked_state,
+    init_unlocked_slugs,
+    is_gate_enabled,
+    remember_allow_decision,
+)
 from puzzles.models import Puzzle, PuzzleAccess, PuzzleSubmission
 from puzzles.utils import login_required
 
@@ -465,6 +473,27 @@ def solution_allowed(request):
     ) or request.context.is_superuser
 
 
+def is_unlocked_for_gate(request, slug):
+    """
+    Like Context.is_unlocked, but answers from the team's unlocked set in Redis
+    when possible, and fills in the set if it does not exist yet. Slugs missing
+    from an existing set, such as locked ones, are answered from the database.
+    """
+    team = request.context.team
+    if not is_gate_enabled() or team is None or not request.context.hunt_has_started:
+        allowed, _ = request.context.is_unlocked(slug)
+        return allowed
+    is_member, exists = get_slug_unlocked_state(team.id, slug)
+    if is_member:
+        return True
+    allowed, _ = request.context.is_unlocked(slug)
+    if not exists:
+        init_unlocked_slugs(
+            team.id, [puzzle.slug for puzzle in request.context.puzzle_unlocks]
+        )
+    return allowed
+
+
 @require_GET
 def check_access_allowed(request, original_path):
     """
@@ -510,7 +539,7 @@ def check_access_allowed(request, original_path):
 
     if resource_type in ("puzzle", "hint"):
         if slug:
-            allowed, _ = request.context.is_unlocked(slug)
+            allowed = is_unlocked_for_gate(request, slug)
         if allowed and resource_type == "puzzle" and subpart:
             allowed = request.context.is_minipuzzle_unlocked(slug, subpart)
         if not allowed:
@@ -540,9 +569,9 @@ def check_access_allowed(request, original_path):
             # check if already authenticated
             if request.user.is_authenticated:
                 return login_redirect(request, request.GET)
-        response = HttpResponse(status=200)
-        response["X-Accel-Redirect"] = original_uri
-        return response
+        if is_gate_enabled() and (prefix := get_gate_prefix(original_path[1:])):
+            remember_allow_decision(request, prefix)
+        return accel_redirect_response(original_uri)
     # 404 page
     response = HttpResponse(status=404)
     if is_static:
@@ -1,5 +1,4 @@
 import base64
-import csv
 import datetime
 import functools
 import os
@@ -15,7 +14,6 @@ from django.db.models import (
     Avg,
     Case,
     Count,
-    F,
     Max,
     Min,
     OuterRef,
@@ -24,15 +22,18 @@ from django.db.models import (
     When,
     Window,
 )
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
 from django.views.decorators.http import require_GET, require_POST
 from spoilr.core.api.hunt import is_site_solutions_published
 from spoilr.core.models import HQUpdate, InteractionAccess, InteractionType, Round
 from spoilr.hints.models import CannedHint, Hint
+from spoilr.hq.util.export import keyset_iterator, streaming_csv_response
 from spoilr.utils import generate_url, json
 
+from puzzles.answers import get_guess_responses
+from puzzles.connect_auth import get_connect_tokens
 from puzzles.forms import ExtraGuessGrantForm, RequestHintForm
 from puzzles.messaging import (
     dispatch_event_used_alert,
@@ -356,6 +357,9 @@ def get_puzzle_data(request, puzzle, team):
     if team and (team.is_prerelease_testsolver or team.is_internal):
         data["puzzleUrl"] = puzzle.testsolve_url
 
+    if team:
+        data["connectTokens"] = get_connect_tokens(team, puzzle_slugs=[puzzle.slug])
+
     interaction = None
     if team:
         # Add interaction for physical puzzles, unless hunt is over
@@ -368,12 +372,10 @@ def get_puzzle_data(request, puzzle, team):
 
         data["partialMessagesB64Encoded"] = [
             [
-                base64.b64encode(
-                    puzzle.normalize_answer(message.answer).encode("utf-8")
-                ).decode("utf-8"),
-                base64.b64encode(message.response.encode("utf-8")).decode("utf-8"),
+                base64.b64encode(answer.encode("utf-8")).decode("utf-8"),
+                base64.b64encode(message.encode("utf-8")).decode("utf-8"),
             ]
-            for message in puzzle.pseudoanswer_set.all()
+            for answer, message in get_guess_responses(puzzle.id).messages.items()
         ]
         if interaction:
             data["interaction"] = {"slug": interaction["slug"], "ended": True}
@@ -753,7 +755,9 @@ def manage_extra_guess_grant(request, id):
                     is_prehunt=False,
                 )
 
-    ratelimit = get_ratelimit(guess_grant.puzzle, guess_grant.team)
+    ratelimit = get_ratelimit(
+        guess_grant.puzzle, guess_grant.team, include_guesses=True
+    )
     form = ExtraGuessGrantForm(instance=guess_grant)
 
     return render(
@@ -766,50 +770,68 @@ def manage_extra_guess_grant(request, id):
 @require_GET
 @restrict_access()
 def guess_csv(request):
-    response = HttpResponse(content_type="text/csv")
     fname = "tph_guesslog_{}.csv".format(request.context.now.strftime("%Y%m%dT%H%M%S"))
-    response["Content-Disposition"] = 'attachment; filename="{}"'.format(fname)
-    writer = csv.writer(response)
-    for ans in (
-        PuzzleSubmission.objects.annotate(
-            name=F("team__team_name"), puzzle_name=F("puzzle__name")
-        )
-        .order_by("timestamp")
-        .exclude(team__is_hidden=True)
-    ):
-        writer.writerow(
+    submissions = keyset_iterator(
+        PuzzleSubmission.objects.exclude(team__team__is_hidden=True),
+        "timestamp",
+        "team__name",
+        "puzzle__name",
+        "answer",
+        "used_free_answer",
+        "correct",
+        ordering=("timestamp", "pk"),
+    )
+    return streaming_csv_response(
+        fname,
+        (
             [
-                ans.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                ans.name,
-                ans.puzzle_name,
-                ans.answer,
-                "F" if ans.used_free_answer else ("Y" if ans.correct else "N"),
+                timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                name,
+                puzzle_name,
+                answer,
+                "F" if used_free_answer else ("Y" if correct else "N"),
             ]
-        )
-    return response
+            for timestamp, name, puzzle_name, answer, used_free_answer, correct in submissions
+        ),
+    )
 
 
 @require_GET
 @restrict_access()
 def hint_csv(request):
-    response = HttpResponse(content_type="text/csv")
     fname = "tph_hintlog_{}.csv".format(request.context.now.strftime("%Y%m%dT%H%M%S"))
-    response["Content-Disposition"] = 'attachment; filename="{}"'.format(fname)
-    writer = csv.writer(response)
-    for hint in Hint.objects.annotate(
-        name=F("team__team__name"),
-        puzzle_name=F("puzzle__name"),
-        answered_datetime=F("response__timestamp"),
-    ).order_by("timestamp"):
-        writer.writerow(
+    hints = keyset_iterator(
+        Hint.objects.all(),
+        "timestamp",
+        "response__timestamp",
+        "team__name",
+        "puzzle__name",
+        "response_id",
+        "response__team__name",
+        "response__puzzle__name",
+        "response__text_content",
+        "response__status",
+        ordering=("timestamp", "pk"),
+    )
+    return streaming_csv_response(
+        fname,
+        (
             [
-                hint.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                timestamp.strftime("%Y-%m-%d %H:%M:%S"),
                 None
-                if hint.answered_datetime is None
-                else (hint.answered_datetime.strftime("%Y-%m-%d %H:%M:%S")),
-                hint.name,
-                hint.puzzle_name,
-                hint.response,
+                if answered_datetime is None
+                else (answered_datetime.strftime("%Y-%m-%d %H:%M:%S")),
+                name,
+                puzzle_name,
+                None if response_id is None else Hint.summarize(*response),
             ]
-        )
-    return response
+            for (
+                timestamp,
+                answered_datetime,
+                name,
+                puzzle_name,
+                response_id,
+                *response,
+            ) in hints
+        ),
+    )
@@ -8,6 +8,7 @@ from django.views.decorators.http import require_GET, require_POST
 from spoilr.utils import generate_url
 
 from puzzles.assets import get_hashed_url
+from puzzles.connect_auth import get_connect_tokens
 from puzzles.models.interactive import Session
 from puzzles.models.story import StoryCard, StoryCardAccess, StoryState
 from puzzles.story.dialogue_tree import get_dialogue_tree, get_next_state
@@ -52,6 +53,9 @@ def story_cards(request):
         "cryptKeys": get_encryption_keys(
             [story_card.slug for story_card in story_cards]
         ),
+        "connectTokens": get_connect_tokens(
+            team, story_slugs=[story_card.slug for story_card in story_cards]
+        ),
     }
 
     return JsonResponse(data)
@@ -73,7 +77,9 @@ def story_card(request, slug):
     ):
         return JsonResponse({}, status=404)
 
-    return JsonResponse(story_card_data(story_card))
+    data = story_card_data(story_card)
+    data["connectTokens"] = get_connect_tokens(team, story_slugs=[story_card.slug])
+    return JsonResponse(data)
 
 
 @require_GET
@@ -12,7 +12,7 @@ from spoilr.core.api.answer import (
 from spoilr.core.api.hunt import get_site_end_time
 
 from puzzles.hunt_config import EVENTS_ROUND_SLUG
-from puzzles.models import PuzzleSubmission, build_guess_data
+from puzzles.models import GuessRateLimit, PuzzleSubmission, build_guess_data
 from puzzles.rounds import CUSTOM_ROUND_VALIDATORS
 from puzzles.rounds.utils import SKIP_ROUNDS
 
@@ -46,6 +46,8 @@ def process_guess(solve_time, team, puzzle, normalized_answer, used_free_answer=
         return guess_data
 
     answer_submission.save()
+    if not (correct or answer_submission.partial):
+        GuessRateLimit.refresh(team.id, puzzle)
 
     if correct:
         puzzle.on_solved(team)
@@ -67,45 +69,29 @@ def process_guess(solve_time, team, puzzle, normalized_answer, used_free_answer=
     return guess_data
 
 
-def get_ratelimit(puzzle, team, puzzle_submissions=None):
-    from puzzles.rounds import CUSTOM_RATE_LIMITERS
+def get_ratelimit(puzzle, team, include_guesses=False):
+    """
+    Returns the guess rate limit of the team on the puzzle. include_guesses
+    adds the guesses made and the time the limit ends, for HQ.
+    """
+    record = GuessRateLimit.objects.filter(team_id=team.id, puzzle_id=puzzle.id).first()
+    if record is None:
+        # No wrong guesses since the record was added or reset. Only
+        # process_guess saves records, so reading the limit never writes.
+        record = GuessRateLimit.compute(team.id, puzzle)
 
-    if puzzle_submissions is None:
-        puzzle_submissions = PuzzleSubmission.objects.filter(
-            team_id=team.id,
-            puzzle_id=puzzle.id,
-        )
-    assert all(
-        submission.team_id == team.id and submission.puzzle_id == puzzle.id
-        for submission in puzzle_submissions
-    )
-    curr_time = timezone.now()
-    guesses_made = sorted(
-        [submission for submission in puzzle_submissions],
-        key=lambda submission: submission.timestamp,
-    )
-
-    rate_limit = CUSTOM_RATE_LIMITERS.get(
-        puzzle.round.slug, lambda i: datetime.timedelta(minutes=i**2 / 1.5)
-    )
-    expiration = max(
-        (
-            submission.timestamp + rate_limit(i)
-            for i, submission in enumerate(
-                guess
-                for guess in reversed(guesses_made)
-                # Filter out partial or correct guesses
-                if not (guess.partial or guess.correct)
-            )
-        ),
-        default=None,
-    )
-
-    should_limit = expiration is not None and expiration >= curr_time
+    expiration = record.next_allowed_time
+    should_limit = expiration is not None and expiration >= timezone.now()
     data = {
         "shouldLimit": should_limit,
-        "guessesMade": [g.answer for g in guesses_made],
     }
+    if include_guesses:
+        data["guessesMade"] = list(
+            PuzzleSubmission.objects.filter(team_id=team.id, puzzle_id=puzzle.id)
+            .order_by("timestamp")
+            .values_list("answer", flat=True)
+        )
+        data["countdownDate"] = expiration
     if should_limit:
         # Adding a small buffer to the submit time. This should guarantee that
         # by the time countdown expires, the server will be ready to respond to
@@ -1,17 +1,16 @@
-import csv
 import datetime
 import functools
 import glob
+import heapq
 import io
+import itertools
 import os
-import subprocess
-import tempfile
-import zipfile
 from collections import Counter, OrderedDict, defaultdict
 from pathlib import Path
 
 from django.conf import settings
-from django.db.models import Count, Q, Sum
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q, Sum
 from django.http import FileResponse, HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.template.loader import render_to_string
@@ -27,6 +26,11 @@ from spoilr.core.api.hunt import (
 from spoilr.email.models import Email
 from spoilr.email.utils import get_all_emails
 from spoilr.hints.models import Hint
+from spoilr.hq.util.export import (
+    EXPORT_CHUNK_SIZE,
+    keyset_iterator,
+    streaming_csv_response,
+)
 from spoilr.registration.models import TeamRegistrationInfo
 from spoilr.utils import generate_url, json
 from tph.utils import load_file, staticfiles_storage
@@ -130,6 +134,122 @@ def sort_puzzle(puzzle):
     return (puzzle.is_meta, puzzle.deep, puzzle.slug)
 
 
+HUNT_STATS_CACHE_TIMEOUT_S = 60 * 60
+# A solve this close to (or after) a meta solve counts as a backsolve.
+BACKSOLVE_WINDOW = datetime.timedelta(minutes=5)
+
+
+def _count_forward_solves(solves, metas_by_feeder, close_time):
+    """
+    Takes (team_id, puzzle_id, solve_time) tuples ordered by team, and returns
+    the ids of the forward solved puzzles for each team. A puzzle is forward
+    solved if it was solved at least five minutes before each of its metas,
+    counting unsolved metas as solved at close time.
+    """
+    forward_solves = {}
+    for team_id, team_solves in itertools.groupby(solves, key=lambda solve: solve[0]):
+        solve_times = {
+            puzzle_id: solve_time for _, puzzle_id, solve_time in team_solves
+        }
+        forward_solves[team_id] = {
+            puzzle_id
+            for puzzle_id, solve_time in solve_times.items()
+            if all(
+                solve_time <= solve_times.get(meta_id, close_time) - BACKSOLVE_WINDOW
+                for meta_id in metas_by_feeder[puzzle_id]
+            )
+        }
+    return forward_solves
+
+
+def _compute_hunt_stats():
+    end_time = get_site_end_time()
+    close_time = get_site_close_time()
+    submissions = PuzzleSubmission.objects.filter(
+        used_free_answer=False,
+        team__team__is_hidden=False,
+        timestamp__lt=end_time,
+    )
+
+    # A hint is used if it has not been marked as REFUNDED or OBSOLETE. A
+    # response requesting more information still uses the hint because teams
+    # can reply to the thread.
+    hint_counts = {
+        (puzzle_id, team_id): count
+        for puzzle_id, team_id, count in Hint.objects.filter(
+            team__team__is_hidden=False,
+            root_ancestor_request__isnull=True,
+            is_request=True,
+        )
+        .exclude(status__in=(Hint.REFUNDED, Hint.OBSOLETE))
+        .values("puzzle_id", "team_id")
+        .annotate(count=Count("id"))
+        .values_list("puzzle_id", "team_id", "count")
+    }
+    hints_by_puzzle = defaultdict(int)
+    for (puzzle_id, _), count in hint_counts.items():
+        hints_by_puzzle[puzzle_id] += count
+
+    stats_by_puzzle = {
+        row["puzzle_id"]: row
+        for row in submissions.values("puzzle_id").annotate(
+            guesses=Count("id"),
+            solves=Count("id", filter=Q(correct=True)),
+            guess_teams=Count("team_id", distinct=True),
+            solve_teams=Count("team_id", distinct=True, filter=Q(correct=True)),
+            first_solve=Min("timestamp", filter=Q(correct=True)),
+        )
+    }
+
+    # Metas always count as forward solves, even if they feed a supermeta.
+    metas_by_feeder = defaultdict(list)
+    for feeder_id, meta_id in Puzzle.metas.through.objects.exclude(
+        from_puzzle__is_meta=True
+    ).values_list("from_puzzle_id", "to_puzzle_id"):
+        metas_by_feeder[feeder_id].append(meta_id)
+    forward_solves = _count_forward_solves(
+        submissions.filter(correct=True)
+        .values("team_id", "puzzle_id")
+        .annotate(solve_time=Min("timestamp"))
+        .order_by("team_id")
+        .values_list("team_id", "puzzle_id", "solve_time"),
+        metas_by_feeder,
+        close_time,
+    )
+
+    # puzzle id -> [forward, 0-hint, 1-hint, 2+-hint forward solves]
+    forward_by_puzzle = {}
+    for team_id, puzzle_ids in forward_solves.items():
+        for puzzle_id in puzzle_ids:
+            numbers = forward_by_puzzle.setdefault(puzzle_id, [0] * 4)
+            numbers[0] += 1
+            numbers[1 + min(hint_counts.get((puzzle_id, team_id), 0), 2)] += 1
+
+    return {
+        "total_hints": sum(hints_by_puzzle.values()),
+        "total_guesses": sum(row["guesses"] for row in stats_by_puzzle.values()),
+        "total_solves": sum(row["solves"] for row in stats_by_puzzle.values()),
+        "hints_by_puzzle": dict(hints_by_puzzle),
+        "stats_by_puzzle": stats_by_puzzle,
+        "forward_by_puzzle": forward_by_puzzle,
+    }
+
+
+def get_hunt_stats():
+    """
+    Returns the stats for hunt_stats. These only change with new submissions or
+    hints, so they are cached by the latest of each.
+    """
+    latest_submission_id = PuzzleSubmission.objects.aggregate(Max("id"))["id__max"]
+    latest_hint_id = Hint.objects.aggregate(Max("id"))["id__max"]
+    key = f"hunt_stats:{latest_submission_id}:{latest_hint_id}"
+    stats = cache.get(key)
+    if stats is None:
+        stats = _compute_hunt_stats()
+        cache.set(key, stats, timeout=HUNT_STATS_CACHE_TIMEOUT_S)
+    return stats
+
+
 @require_GET
 @restrict_access(after_hunt_end=True)
 def hunt_stats(request):
@@ -138,105 +258,30 @@ def hunt_stats(request):
     total_participants = TeamRegistrationInfo.objects.aggregate(Sum("tm_total"))[
         "tm_total__sum"
     ]
+    stats = get_hunt_stats()
 
-    def is_forward_solve(puzzle, team_id):
-        return puzzle.is_meta or all(
-            solve_times[puzzle.id, team_id]
-            <= solve_times[meta.id, team_id] - datetime.timedelta(minutes=5)
-            for meta in puzzle.metas.all()
-        )
-
-    total_hints = 0
-    hints_by_puzzle = defaultdict(int)
-    hint_counts = defaultdict(int)
-    # A hint is used if it has not been marked as REFUNDED or OBSOLETE. A
-    # response requesting more information still uses the hint because teams
-    # can reply to the thread.
-    for hint in Hint.objects.filter(
-        team__team__is_hidden=False,
-        root_ancestor_request__isnull=True,
-        is_request=True,
-    ).exclude(
-        status__in=(Hint.REFUNDED, Hint.OBSOLETE),
-    ):
-        total_hints += 1
-        hints_by_puzzle[hint.puzzle_id] += 1
-        if hint.status != Hint.OBSOLETE:
-            hint_counts[hint.puzzle_id, hint.team_id] += 1
-
-    total_guesses = 0
-    total_solves = 0
     total_metas = 0
-    guesses_by_puzzle = defaultdict(int)
-    solves_by_puzzle = defaultdict(int)
-    guess_teams = defaultdict(set)
-    solve_teams = defaultdict(set)
-    solve_times = defaultdict(lambda: get_site_close_time())
-    for submission in PuzzleSubmission.objects.filter(
-        used_free_answer=False,
-        team__team__is_hidden=False,
-        timestamp__lt=get_site_end_time(),
-    ):
-        total_guesses += 1
-        guesses_by_puzzle[submission.puzzle_id] += 1
-        guess_teams[submission.puzzle_id].add(submission.team_id)
-        if submission.correct:
-            total_solves += 1
-            solves_by_puzzle[submission.puzzle_id] += 1
-            solve_teams[submission.puzzle_id].add(submission.team_id)
-            solve_times[submission.puzzle_id, submission.team_id] = submission.timestamp
-
     data = []
     for puzzle in sorted(request.context.all_puzzles, key=sort_puzzle):
+        puzzle_stats = stats["stats_by_puzzle"].get(puzzle.id, {})
+        solves = puzzle_stats.get("solves", 0)
+        solve_teams = puzzle_stats.get("solve_teams", 0)
+        forward, *forward_by_hints = stats["forward_by_puzzle"].get(puzzle.id, [0] * 4)
         if puzzle.is_meta:
-            total_metas += solves_by_puzzle[puzzle.id]
+            total_metas += solves
         data.append(
             {
                 "puzzle": puzzle,
                 "numbers": [
-                    solves_by_puzzle[puzzle.id],
-                    guesses_by_puzzle[puzzle.id],
-                    hints_by_puzzle[puzzle.id],
-                    len(
-                        [
-                            1
-                            for team_id in solve_teams[puzzle.id]
-                            if is_forward_solve(puzzle, team_id)
-                        ]
-                    ),
-                    len(
-                        [
-                            1
-                            for team_id in solve_teams[puzzle.id]
-                            if is_forward_solve(puzzle, team_id)
-                            and hint_counts[puzzle.id, team_id] < 1
-                        ]
-                    ),
-                    len(
-                        [
-                            1
-                            for team_id in solve_teams[puzzle.id]
-                            if is_forward_solve(puzzle, team_id)
-                            and hint_counts[puzzle.id, team_id] == 1
-                        ]
-                    ),
-                    len(
-                        [
-                            1
-                            for team_id in solve_teams[puzzle.id]
-                            if is_forward_solve(puzzle, team_id)
-                            and hint_counts[puzzle.id, team_id] > 1
-                        ]
-                    ),
-                    len(
-                        [
-                            1
-                            for team_id in solve_teams[puzzle.id]
-                            if not is_forward_solve(puzzle, team_id)
-                        ]
-                    ),
-                    len(guess_teams[puzzle.id] - solve_teams[puzzle.id]),
+                    solves,
+                    puzzle_stats.get("guesses", 0),
+                    stats["hints_by_puzzle"].get(puzzle.id, 0),
+                    forward,
+                    *forward_by_hints,
+                    solve_teams - forward,
+                    puzzle_stats.get("guess_teams", 0) - solve_teams,
                 ],
+                "first_solve": puzzle_stats.get("first_solve"),
             }
         )
 
@@ -246,9 +291,9 @@ def hunt_stats(request):
         {
             "total_teams": total_teams,
             "total_participants": total_participants,
-            "total_hints": total_hints,
-            "total_guesses": total_guesses,
-            "total_solves": total_solves,
+            "total_hints": stats["total_hints"],
+            "total_guesses": stats["total_guesses"],
+            "total_solves": stats["total_solves"],
             "total_metas": total_metas,
             "data": data,
         },
@@ -335,159 +380,133 @@ def stats_internal(request):
 @restrict_access()
 def histogram(request, slug):
     puzzle = Puzzle.objects.get(slug=slug)
-    data = CustomPuzzleSubmission.histogram(puzzle).order_by("-counts")
-    response = HttpResponse(content_type="text/csv")
-    response[
-        "Content-Disposition"
-    ] = f'attachment; filename="teammate_hunt_{slug}_histogram.csv"'
-    fieldnames = ["submission", "counts"]
-    writer = csv.DictWriter(response, fieldnames=fieldnames)
-    writer.writeheader()
-    for row in data:
-        writer.writerow(row)
-    return response
+    data = (
+        CustomPuzzleSubmission.histogram(puzzle)
+        .order_by("-counts", "raw_answer")
+        .values_list("raw_answer", "counts")
+    )
+    return streaming_csv_response(
+        f"teammate_hunt_{slug}_histogram.csv",
+        data.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        header=["submission", "counts"],
+    )
 
 
 @require_GET
 @restrict_access()
 def histogram_by_team(request, slug):
     puzzle = Puzzle.objects.get(slug=slug)
-    data = CustomPuzzleSubmission.histogram_by_team(puzzle).order_by("team", "-counts")
-    # team is the PK, replace with team name
-    pk_to_teamname = {}
-    for team in Team.objects.all():
-        pk_to_teamname[team.pk] = team.name
-    rows = []
-    for row in data:
-        rows.append(row)
-        rows[-1]["team"] = pk_to_teamname[rows[-1]["team"]]
-    response = HttpResponse(content_type="text/csv")
-    response[
-        "Content-Disposition"
-    ] = f'attachment; filename="teammate_hunt_{slug}_histogram_by_team.csv"'
-    fieldnames = ["submission", "team", "counts"]
-    writer = csv.DictWriter(response, fieldnames=fieldnames)
-    writer.writeheader()
-    for row in data:
-        writer.writerow(row)
-    return response
+    data = (
+        CustomPuzzleSubmission.histogram_by_team(puzzle)
+        .order_by("team", "-counts", "raw_answer")
+        .values_list("raw_answer", "team__name", "counts")
+    )
+    return streaming_csv_response(
+        f"teammate_hunt_{slug}_histogram_by_team.csv",
+        data.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        header=["submission", "team", "counts"],
+    )
 
 
 @require_GET
 @restrict_access()
 def custom_puzzle_csv(request, slug):
     puzzle = Puzzle.objects.get(slug=slug)
-    submissions = CustomPuzzleSubmission.objects.filter(
-        puzzle=puzzle, timestamp__lt=get_site_end_time()
-    ).select_related()
-    rows = []
-    for guess in submissions:
-        rows.append(
-            {
-                "team": guess.team.name,
-                "minipuzzle": guess.minipuzzle,
-                "submission": guess.submission,
-                "count": guess.count,
-                "first_submit": guess.timestamp,
-                "correct": guess.correct,
-            }
-        )
-    rows.sort(key=lambda d: d["first_submit"])
-    response = HttpResponse(content_type="text/csv")
-    response[
-        "Content-Disposition"
-    ] = f'attachment; filename="teammate_hunt_{slug}_submissions.csv"'
-    fieldnames = ["team", "subpuzzle", "submission", "count", "first_submit", "correct"]
-    writer = csv.DictWriter(response, fieldnames=fieldnames)
-    writer.writeheader()
-    for row in rows:
-        writer.writerow(row)
-    return response
+    submissions = keyset_iterator(
+        CustomPuzzleSubmission.objects.filter(
+            puzzle=puzzle, timestamp__lt=get_site_end_time()
+        ),
+        "team__name",
+        "minipuzzle__ref",
+        "raw_answer",
+        "count",
+        "timestamp",
+        "correct",
+        ordering=("timestamp", "pk"),
+    )
+    return streaming_csv_response(
+        f"teammate_hunt_{slug}_submissions.csv",
+        submissions,
+        header=["team", "subpuzzle", "submission", "count", "first_submit", "correct"],
+    )
 
 
 @require_GET
 @restrict_access()
 def activity_csv(request):
     END_TIME = get_site_end_time()
-    answers = (
-        PuzzleSubmission.objects.filter(timestamp__lt=END_TIME, team__is_hidden=False)
-        .order_by("timestamp")
-        .select_related()
+    launch_time = get_site_launch_time()
+    answers = keyset_iterator(
+        PuzzleSubmission.objects.filter(
+            timestamp__lt=END_TIME, team__team__is_hidden=False
+        ),
+        "timestamp",
+        "team__name",
+        "puzzle__name",
+        "answer",
+        "correct",
+        ordering=("timestamp", "pk"),
     )
-    unlocks = (
-        PuzzleAccess.objects.filter(timestamp__lt=END_TIME, team__team__is_hidden=False)
-        .order_by("timestamp")
-        .select_related()
+    unlocks = keyset_iterator(
+        PuzzleAccess.objects.filter(
+            timestamp__lt=END_TIME, team__team__is_hidden=False
+        ),
+        "timestamp",
+        "team__name",
+        "puzzle__name",
+        ordering=("timestamp", "pk"),
     )
 
     csv_header = ["team", "event", "puzzle", "time", "submission", "correct"]
     date_pattern = "%Y-%m-%d %H:%M:%S"
 
     def process_guess(guess):
-        out = []
-        out.append(
-            [
-                guess.team.name,
-                "guess",
-                guess.puzzle.name,
-                guess.timestamp.strftime(date_pattern),
-                guess.answer,
-                guess.correct,
-            ]
-        )
-        if guess.correct:
-            out.append(
-                [
-                    guess.team.name,
-                    "solve",
-                    guess.puzzle.name,
-                    guess.timestamp.strftime(date_pattern),
-                    "",
-                    "",
-                ]
-            )
-        return out
-
-    def process_unlock(unlock):
-        unlock_time = max(unlock.timestamp, get_site_launch_time())
-        return [
-            [
-                unlock.team.name,
-                "unlock",
-                unlock.puzzle.name,
-                unlock_time.strftime(date_pattern),
+        timestamp, team_name, puzzle_name, answer, correct = guess
+        yield [
+            team_name,
+            "guess",
+            puzzle_name,
+            timestamp.strftime(date_pattern),
+            answer,
+            correct,
+        ]
+        if correct:
+            yield [
+                team_name,
+                "solve",
+                puzzle_name,
+                timestamp.strftime(date_pattern),
                 "",
                 "",
             ]
+
+    def process_unlock(unlock):
+        timestamp, team_name, puzzle_name = unlock
+        unlock_time = max(timestamp, launch_time)
+        yield [
+            team_name,
+            "unlock",
+            puzzle_name,
+            unlock_time.strftime(date_pattern),
+            "",
+            "",
         ]
 
-    rows = []
-    i = 0
-    j = 0
-    while i < len(answers) and j < len(unlocks):
-        # gueses and solve events before unlocks if there's a tie
-        if answers[i].timestamp <= unlocks[j].timestamp:
-            rows.extend(process_guess(answers[i]))
-            i += 1
-        else:
-            rows.extend(process_unlock(unlocks[j]))
-            j += 1
-    while i < len(answers):
-        rows.extend(process_guess(answers[i]))
-        i += 1
-    while j < len(unlocks):
-        rows.extend(process_unlock(unlocks[j]))
-        j += 1
-
-    response = HttpResponse(content_type="text/csv")
-    response[
-        "Content-Disposition"
-    ] = 'attachment; filename="teammate_hunt_submit_log.csv"'
-    writer = csv.writer(response)
-    writer.writerow(csv_header)
-    for row in rows:
-        writer.writerow(row)
-    return response
+    # Both are sorted by timestamp already, so merge them as they stream.
+    # Guesses and solve events come before unlocks if there's a tie.
+    events = heapq.merge(
+        ((answer[0], 0, answer) for answer in answers),
+        ((unlock[0], 1, unlock) for unlock in unlocks),
+        key=lambda event: event[:2],
+    )
+    rows = (
+        row
+        for _, is_unlock, event in events
+        for row in (process_unlock(event) if is_unlock else process_guess(event))
+    )
+    return streaming_csv_response(
+        "teammate_hunt_submit_log.csv", rows, header=csv_header
+    )
 
 
 @require_GET
@@ -802,61 +821,39 @@ def clipboard(request):
     return render(request, "clipboard.html")
 
 
+def get_server_zip_extra_files():
+    """Returns the files added to the server code in server.zip."""
+    extra_files = {
+        "tph/staticfiles_mapping.json": json.dumps(_get_staticfiles()).encode(),
+    }
+    if os.path.exists(settings.ASSET_MAPPING):
+        with open(settings.ASSET_MAPPING, "rb") as f:
+            extra_files["tph/media_mapping.yaml"] = f.read()
+    return extra_files
+
+
 @functools.lru_cache(maxsize=1)
-def _get_server_zip():
-    server_dir = Path(__file__).parents[2]
-    fileobj = io.BytesIO()
-    with zipfile.ZipFile(fileobj, mode="w", compression=zipfile.ZIP_DEFLATED) as zipf:
-        # store resource files
-        for parent, dirs, filenames in os.walk(server_dir):
-            for filename in filenames:
-                path = os.path.join(parent, filename)
-                relpath = os.path.relpath(path, server_dir)
-                if any(
-                    (
-                        relpath.startswith("puzzles/migrations/"),
-                        relpath.startswith("puzzles/static/"),
-                        relpath.startswith("puzzles/static_root/"),
-                        relpath.startswith("static/"),
-                        relpath.startswith("tph/fixtures/"),
-                        relpath.startswith("tph/secrets.py"),
-                        relpath.endswith(".npz"),
-                        relpath.endswith(".pyc"),
-                    )
-                ):
-                    continue
-                zipf.write(path, relpath)
-
-        # store staticfiles mapping
-        staticfiles_bytes = json.dumps(_get_staticfiles()).encode()
-        zipf.writestr("tph/staticfiles_mapping.json", staticfiles_bytes)
-
-        # store media files mapping
-        if os.path.exists(settings.ASSET_MAPPING):
-            zipf.write(settings.ASSET_MAPPING, "tph/media_mapping.yaml")
-
-        # create and store sqlite database
-        with tempfile.TemporaryDirectory() as tmp:
-            fname = "db.sqlite3"
-            subprocess.run(
-                [
-                    f"{server_dir}/create_pyodide_database.py",
-                    f"{tmp}/{fname}",
-                    f"{server_dir}/tph/fixtures/posthunt/team.yaml",
-                    f"{server_dir}/tph/fixtures/posthunt/dump.yaml",
-                    f"{server_dir}/tph/fixtures/posthunt/access.yaml",
-                ],
-                check=True,
-            )
-            zipf.write(f"{tmp}/{fname}", fname)
-    fileobj.seek(0)
-    return fileobj.read()
+def _get_pyodide_bundle():
+    # Import here to avoid loading the bundler with the views
+    from tph.pyodide_bundle import PyodideBundle
+
+    return PyodideBundle(
+        extra_files=get_server_zip_extra_files(),
+        compile_python=settings.PYODIDE_PYTHON,
+        site_packages_dir=settings.PYODIDE_SITE_PACKAGES,
+    )
 
 
 @require_GET
 @restrict_access(after_hunt_end=True)
 def server_zip(request):
-    return FileResponse(io.BytesIO(_get_server_zip()))
+    return FileResponse(io.BytesIO(_get_pyodide_bundle().server_zip))
+
+
+@require_GET
+@restrict_access(after_hunt_end=True)
+def site_packages_zip(request):
+    return FileResponse(io.BytesIO(_get_pyodide_bundle().site_packages_zip))
 
 
 @functools.lru_cache(maxsize=1)
@@ -0,0 +1,191 @@
+"""
+Delivery service for Discord webhook alerts.
+
+Alerts are pushed onto a Redis list per (webhook, username) and delivered by a
+single Celery task scheduled a short window later, so a burst of solves turns
+into a handful of multi-line messages instead of hundreds of requests. Each
+worker process reuses one HTTP connection pool, and every webhook shares a
+token bucket from puzzles.rate_limits across workers, which is paused for
+Discord's 429 `retry_after`.
+
+Set DISCORD_WEBHOOK_URL to point at a local HTTP server to test delivery.
+"""
+import json
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from tph.utils import get_task_logger
+
+from puzzles.celery import celery_app
+from puzzles.rate_limits import TokenBucketRateLimiter
+
+# Discord rejects messages with more than this many characters.
+MAX_MESSAGE_LENGTH = 2000
+# How long to wait for more alerts before sending.
+COALESCE_WINDOW_S = 2
+# Max alerts read from a queue by a single delivery task.
+MAX_ALERTS_PER_DELIVERY = 200
+# Discord allows 5 requests per 2 seconds per webhook.
+BUCKET_CAPACITY = 5
+BUCKET_REFILL_PER_S = 2.5
+REQUEST_TIMEOUT_S = 10
+
+QUEUE_KEY_FORMAT = "discord:queue:{}:{}"
+SCHEDULED_KEY_FORMAT = "discord:scheduled:{}:{}"
+
+task_logger = get_task_logger(__name__)  # for Celery tasks
+
+_session = None
+# Keyed by webhook. Emptied on a 429 until Discord's retry_after has passed.
+_token_bucket = TokenBucketRateLimiter(
+    (BUCKET_CAPACITY, BUCKET_CAPACITY / BUCKET_REFILL_PER_S), name="discord"
+)
+
+
+def get_session():
+    """Returns the HTTP session for this process, so connections are reused."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_maxsize=10))
+        _session.mount("http://", HTTPAdapter(pool_maxsize=10))
+    return _session
+
+
+def _get_redis():
+    # Avoid circular import
+    from puzzles.utils import get_redis_handle
+
+    return get_redis_handle()
+
+
+def _take_token(webhook, retry_after_s=0):
+    """Returns how many seconds to wait before sending to this webhook."""
+    if retry_after_s > 0:
+        return _token_bucket.pause(webhook, retry_after_s).retry_after
+    return _token_bucket.hit(webhook).retry_after
+
+
+def enqueue_alert(webhook, content, username, coalesce=True):
+    """Queues an alert, and schedules delivery if none is pending."""
+    redis_handle = _get_redis()
+    alert = json.dumps({"content": content, "coalesce": coalesce})
+    with redis_handle.pipeline() as pipe:
+        pipe.rpush(QUEUE_KEY_FORMAT.format(webhook, username), alert)
+        pipe.set(
+            SCHEDULED_KEY_FORMAT.format(webhook, username),
+            1,
+            nx=True,
+            ex=COALESCE_WINDOW_S + settings.REDIS_FAST_TIMEOUT,
+        )
+        _, scheduled = pipe.execute()
+    if scheduled:
+        deliver_alerts.apply_async(
+            args=(webhook, username), countdown=COALESCE_WINDOW_S
+        )
+
+
+def pack_messages(alerts):
+    """
+    Joins alerts into as few messages as possible within Discord's length
+    limit. Alerts that must not be coalesced are always sent on their own.
+    """
+    messages = []
+    current = None
+    for alert in alerts:
+        content = alert["content"]
+        if len(content) > MAX_MESSAGE_LENGTH:
+            content = content[: MAX_MESSAGE_LENGTH - 3] + "..."
+        if not alert["coalesce"]:
+            current = None
+            messages.append(content)
+        elif (
+            current is not None
+            and len(messages[current]) + 1 + len(content) <= MAX_MESSAGE_LENGTH
+        ):
+            messages[current] += "\n" + content
+        else:
+            current = len(messages)
+            messages.append(content)
+    return messages
+
+
+@celery_app.task
+def deliver_alerts(webhook, username):
+    redis_handle = _get_redis()
+    queue_key = QUEUE_KEY_FORMAT.format(webhook, username)
+    # Alerts queued from here on schedule another delivery.
+    redis_handle.delete(SCHEDULED_KEY_FORMAT.format(webhook, username))
+    with redis_handle.pipeline() as pipe:
+        pipe.lrange(queue_key, 0, MAX_ALERTS_PER_DELIVERY - 1)
+        pipe.ltrim(queue_key, MAX_ALERTS_PER_DELIVERY, -1)
+        pipe.llen(queue_key)
+        serialized, _, remaining = pipe.execute()
+    if not serialized:
+        return
+
+    messages = pack_messages(json.loads(alert) for alert in serialized)
+    for i, message in enumerate(messages):
+        wait_s = _take_token(webhook)
+        if wait_s <= 0:
+            wait_s = _post(webhook, username, message)
+        if wait_s > 0:
+            # Put undelivered messages back in front, in order, and try later.
+            unsent = [
+                json.dumps({"content": content, "coalesce": False})
+                for content in messages[i:]
+            ]
+            redis_handle.lpush(queue_key, *reversed(unsent))
+            _reschedule(redis_handle, webhook, username, wait_s)
+            return
+
+    if remaining:
+        _reschedule(redis_handle, webhook, username, 0)
+
+
+def _reschedule(redis_handle, webhook, username, countdown):
+    if redis_handle.set(
+        SCHEDULED_KEY_FORMAT.format(webhook, username),
+        1,
+        nx=True,
+        ex=int(countdown) + 1 + settings.REDIS_FAST_TIMEOUT,
+    ):
+        deliver_alerts.apply_async(args=(webhook, username), countdown=countdown)
+
+
+def _post(webhook, username, content):
+    """Sends a message, and returns how long to back off for if rate limited."""
+    try:
+        response = get_session().post(
+            f"{settings.DISCORD_WEBHOOK_URL}{webhook}",
+            data={"username": username, "content": content},
+            timeout=REQUEST_TIMEOUT_S,
+        )
+    except requests.RequestException:
+        task_logger.error(
+            "Failed to post to discord webhook with username %s, content: %s",
+            username,
+            content,
+        )
+        return 0
+
+    if response.status_code == 429:
+        try:
+            retry_after = float(response.json()["retry_after"])
+        except (ValueError, KeyError):
+            retry_after = float(response.headers.get("Retry-After", 1))
+        task_logger.warning(
+            "Discord webhook rate limited for %ss (username %s)",
+            retry_after,
+            username,
+        )
+        return _take_token(webhook, retry_after_s=retry_after)
+    if not response.ok:
+        task_logger.error(
+            "Discord webhook returned %s with username %s, content: %s",
+            response.status_code,
+            username,
+            content,
+        )
+    return 0
@@ -13,6 +13,9 @@ INDEXEDDB_PREFIX = "20xx-"
 os.environ["SERVER_HOSTNAME"] = "mypuzzlehunt.com"
 os.makedirs("/srv", exist_ok=True)
 print("Caching site packages")
+# When the worker downloaded the packages traced by tph.pyodide_bundle, only
+# the packages provided by Pyodide need caching.
+has_prebuilt_packages = os.path.isfile(f"/{INDEXEDDB_PREFIX}site-packages-prebuilt.zip")
 compression = zipfile.ZIP_DEFLATED
 with zipfile.ZipFile(
     f"/{INDEXEDDB_PREFIX}indexeddb/site-packages.zip", "a", compression=compression
@@ -41,7 +44,9 @@ with zipfile.ZipFile(
                         prefix
                     ):
                         is_immovable = True
-                if not is_immovable and not parent.startswith(site_packages):
+                if not is_immovable and (
+                    has_prebuilt_packages or not parent.startswith(site_packages)
+                ):
                     continue
                 zipf = immovablef if is_immovable else zippedf
                 relpath = rel_packages if is_immovable else rel_site_packages
@@ -71,11 +76,11 @@ django.setup()
 from tph.utils import sync_indexeddb, reset_db
 
 print("Updating database")
-dbcrc_path = Path(f"/{INDEXEDDB_PREFIX}indexeddb/dbcrc.txt")
-db_old_crc = None
-if dbcrc_path.is_file():
-    with open(dbcrc_path) as f:
-        db_old_crc = f.read()
-reset_db(old_crc=db_old_crc)
+dbhash_path = Path(f"/{INDEXEDDB_PREFIX}indexeddb/dbhash.txt")
+db_old_hash = None
+if dbhash_path.is_file():
+    with open(dbhash_path) as f:
+        db_old_hash = f.read()
+reset_db(old_hash=db_old_hash)
 
 sync_indexeddb()
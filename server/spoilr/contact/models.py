@@ -18,6 +18,11 @@ class ContactRequest(models.Model):
 
     tasks = GenericRelation(Task, related_query_name="task")
 
+    @property
+    def task(self):
+        tasks = list(self.tasks.all())
+        return tasks[0] if tasks else None
+
     def __str__(self):
         return "%s: %s wants to talk to HQ" % (self.create_time, self.team)
 
@@ -0,0 +1,52 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from spoilr.contact.models import ContactRequest
+from spoilr.core.models import Team, TeamType, User, UserTeamRole
+from spoilr.hq.models import Handler, Task
+
+NUM_CONTACT_REQUESTS = 40
+
+
+class DashboardQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teams = [
+            Team.objects.create(username=f"team-{i}", name=f"Team {i}")
+            for i in range(3)
+        ]
+        # Half of the contact requests are claimed.
+        handler = Handler.objects.create(name="handler", discord="handler")
+        for i in range(NUM_CONTACT_REQUESTS):
+            contact_request = ContactRequest.objects.create(
+                team=teams[i % len(teams)],
+                email=f"team-{i}@example.com",
+                comment=f"Contact request {i}",
+            )
+            contact_request.tasks.add(
+                Task(handler=handler, claim_time=timezone.now()) if i % 2 else Task(),
+                bulk=False,
+            )
+
+        admin_team = Team.objects.create(
+            username="admin", name="Admin", type=TeamType.INTERNAL
+        )
+        cls.admin = User.objects.create_superuser(
+            username=admin_team.username,
+            password="admin",
+            team=admin_team,
+            team_role=UserTeamRole.SHARED_ACCOUNT,
+        )
+
+    def test_dashboard_queries_do_not_grow_with_limit(self):
+        self.client.force_login(self.admin)
+        url = reverse("spoilr.contact:dashboard")
+        # The first request also loads the session and caches.
+        self.client.get(url)
+
+        for limit in (5, NUM_CONTACT_REQUESTS):
+            with self.subTest(limit=limit), self.assertNumQueries(5):
+                response = self.client.get(url, {"open": 0, "limit": limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context["contact_requests"]), limit)
@@ -12,6 +12,7 @@ from spoilr.contact.models import ContactRequest
 from spoilr.hq.models import Task, TaskStatus, HqLog
 from spoilr.hq.util.decorators import hq
 from spoilr.hq.util.redirect import redirect_with_message
+from spoilr.hq.util.tasks import prefetch_tasks
 
 MAX_CONTACT_REQUEST_LIMIT = 200
 
@@ -21,7 +22,6 @@ def dashboard_view(request):
     contact_requests = (
         ContactRequest.objects.filter(tasks__isnull=False)
         .select_related("team")
-        .prefetch_related("tasks")
         .order_by("-update_time")
     )
 
@@ -43,6 +43,7 @@ def dashboard_view(request):
         contact_requests = contact_requests[:limit]
 
     teams = Team.objects.values_list("username", flat=True).order_by("username")
+    contact_requests = prefetch_tasks(list(contact_requests))
 
     return render(
         request,
@@ -51,7 +52,7 @@ def dashboard_view(request):
             "contact_requests": [
                 {
                     "contact_request": contact_request,
-                    "task": contact_request.tasks.first(),
+                    "task": contact_request.task,
                 }
                 for contact_request in contact_requests
             ],
@@ -260,6 +260,7 @@ class SystemLogAdmin(admin.ModelAdmin):
 
 
 admin.site.register(SystemLog, SystemLogAdmin)
+admin.site.register(SystemLogArchive, SystemLogAdmin)
 
 
 class RoundAccessRoundFilter(admin.SimpleListFilter):
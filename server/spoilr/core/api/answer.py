@@ -1,7 +1,11 @@
+import collections
+import copy
 import dataclasses
 import logging
 import re
+import threading
 import typing
+from uuid import uuid4
 
 import typing_extensions
 from django.conf import settings
@@ -18,9 +22,11 @@ from spoilr.core.models import (
 )
 from unidecode import unidecode
 
+from .cache import cache
 from .events import HuntEvent, dispatch
 
 INCORRECT_ATTEMPT_ALERT_THRESHOLD = 10
+ANSWER_INDEX_VERSION_KEY = "answers:index_version"
 
 logger = logging.getLogger(__name__)
 
@@ -144,11 +150,62 @@ class Response:
         return Response(AnswerStr.from_true(pa.answer), status, pa.response)
 
 
+@dataclasses.dataclass
+class AnswerIndex:
+    """Every PseudoAnswer, compiled once per process until answers change."""
+
+    version: str
+    # Puzzle id -> {canonical answer: Response}.
+    pseudos: typing.Dict[int, typing.Dict[str, Response]]
+
+
+_answer_index = None
+_answer_index_lock = threading.Lock()
+
+
+def _build_answer_index(version):
+    pseudos = collections.defaultdict(dict)
+    for pa in PseudoAnswer.objects.order_by("puzzle_id", "answer"):
+        response = Response.from_pa(pa)
+        pseudos[pa.puzzle_id][response.answer.canon] = response
+    return AnswerIndex(version=version, pseudos=dict(pseudos))
+
+
+def get_answer_index(version=None):
+    """Returns the answer index, rebuilding it if answers have changed."""
+    global _answer_index
+
+    if version is None:
+        version = _get_answer_index_version()
+    index = _answer_index
+    if index is None or index.version != version:
+        with _answer_index_lock:
+            if _answer_index is None or _answer_index.version != version:
+                _answer_index = _build_answer_index(version)
+            index = _answer_index
+    return index
+
+
+def _get_answer_index_version():
+    version = cache.get(ANSWER_INDEX_VERSION_KEY)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(ANSWER_INDEX_VERSION_KEY, version, timeout=None):
+            version = cache.get(ANSWER_INDEX_VERSION_KEY, version)
+    return version
+
+
+def invalidate_answer_index():
+    """Forces every process to rebuild its answer index."""
+    cache.delete(ANSWER_INDEX_VERSION_KEY)
+
+
 def get_pseudos(puzzle: m.Puzzle) -> typing.Dict[str, Response]:
-    """Returns {canonical answer: Response} for all PseudoAnswers."""
-    pas = m.PseudoAnswer.objects.filter(puzzle=puzzle)
-    responses = (Response.from_pa(pa) for pa in pas)
-    return {r.answer.canon: r for r in responses}
+    """
+    Returns {canonical answer: Response} for all PseudoAnswers. The result is
+    shared by the whole process and must not be modified.
+    """
+    return get_answer_index().pseudos.get(puzzle.id, {})
 
 
 def get_partials(puzzle: m.Puzzle) -> typing.Dict[str, AnswerStr]:
@@ -167,7 +224,7 @@ def get_response(
     if pseudoanswers is None:
         pseudoanswers = get_pseudos(puzzle)
     if answer.canon in pseudoanswers:
-        return pseudoanswers[answer.canon]
+        return copy.copy(pseudoanswers[answer.canon])
 
     if answer.matches(puzzle.answer):
         return Response(AnswerStr.from_true(puzzle.answer), "correct")
@@ -265,6 +322,7 @@ def submit_puzzle_answer(
 
 
 def _handle_puzzle_correct_answer(maybe_team, puzzle, noop_submission=False):
+    puzzle_access = None
     if not noop_submission and maybe_team:
         # A team might not have access if it was an admin team.
         try:
@@ -280,6 +338,7 @@ def _handle_puzzle_correct_answer(maybe_team, puzzle, noop_submission=False):
         HuntEvent.METAPUZZLE_SOLVED if puzzle.is_meta else HuntEvent.PUZZLE_SOLVED,
         team=maybe_team,
         puzzle=puzzle,
+        puzzle_access=puzzle_access,
         object_id=puzzle.slug,
         noop_submission=noop_submission,
         message=f"Solved {puzzle}",
@@ -1,18 +1,86 @@
-import functools, hashlib
+"""
+Two-tier memoization for hunt state that rarely changes.
+
+Results are cached in a small per-process LRU in front of the shared spoilr
+cache. Every bucket has a version counter in the shared cache that is part of
+each key, so invalidating a bucket bumps the version and every process picks
+it up the next time it checks (at most once every VERSION_CHECK_INTERVAL_S per
+bucket), without a round trip on each lookup.
+
+Deleting a single entry leaves a short-lived tombstone next to it instead of
+bumping the bucket version. Each process rechecks the tombstone of a local
+entry at most once every VERSION_CHECK_INTERVAL_S, so other entries in the
+bucket stay cached.
+"""
+import collections, functools, hashlib, math, pickle, random, threading, time, uuid
 
 from django.conf import settings
 from django.core.cache import caches
 
 SERVER_CACHE_TIMEOUT_S = 60 * 60
+LOCAL_CACHE_TIMEOUT_S = 5
+LOCAL_CACHE_MAX_SIZE = 1024
+VERSION_CHECK_INTERVAL_S = 1
 
 cache = caches[settings.SPOILR_CACHE_NAME]
 
 
+class _LocalCache:
+    """Thread-safe LRU with a TTL. Values are stored pickled so callers never
+    share mutable objects, matching what they would get from the shared cache."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (value, tombstone, monotonic time last checked) or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expiry, serialized, tombstone, checked_time = entry
+            if expiry < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return pickle.loads(serialized), tombstone, checked_time
+
+    def set(self, key, value, timeout, tombstone=None):
+        serialized = pickle.dumps(value)
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = (now + timeout, serialized, tombstone, now)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def mark_checked(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = (*entry[:3], time.monotonic())
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = _LocalCache(LOCAL_CACHE_MAX_SIZE)
+# bucket -> (version, monotonic time it was last read from the shared cache)
+_bucket_versions = {}
+
+
 def memoized_cache(bucket, timeout=None):
     def decorator(view_func):
         @functools.wraps(view_func)
         def wrapped(*args):
-            key = f"memoized:{bucket}:{view_func.__name__}:{_hash_args(*args)}"
+            key = _get_key(view_func, bucket, *args)
             return _memoized_cache(view_func, key, *args, timeout=timeout)
 
         return wrapped
@@ -24,8 +92,9 @@ def clear_memoized_cache(bucket):
     def decorator(view_func):
         @functools.wraps(view_func)
         def wrapped(*args):
-            delete_memoized_cache_entry(view_func, bucket, *args)
-            return view_func(*args)
+            result = view_func(*args)
+            invalidate_memoized_cache_bucket(bucket)
+            return result
 
         return wrapped
 
@@ -35,20 +104,94 @@ def clear_memoized_cache(bucket):
 def _memoized_cache(result_factory, key, *args, timeout=None, **kwargs):
     if timeout is None:
         timeout = SERVER_CACHE_TIMEOUT_S
-    result = cache.get(key)
-    if not result:
-        result = result_factory(*args, **kwargs)
-        cache.set(key, result, timeout=timeout)
-    return result
+    tombstone_key = _get_tombstone_key(key)
+    local_entry = local_cache.get(key)
+    if local_entry is not None:
+        wrapped_result, tombstone, checked_time = local_entry
+        if time.monotonic() - checked_time < VERSION_CHECK_INTERVAL_S:
+            return wrapped_result[0]
+        if cache.get(tombstone_key) == tombstone:
+            local_cache.mark_checked(key)
+            return wrapped_result[0]
+        local_cache.delete(key)
+
+    # Results are wrapped in a tuple so that falsy results can be cached too.
+    values = cache.get_many([key, tombstone_key])
+    wrapped_result = values.get(key)
+    if wrapped_result is None:
+        wrapped_result = (result_factory(*args, **kwargs),)
+        cache.set(key, wrapped_result, timeout=timeout)
+    local_cache.set(
+        key,
+        wrapped_result,
+        min(timeout, LOCAL_CACHE_TIMEOUT_S),
+        tombstone=values.get(tombstone_key),
+    )
+    return wrapped_result[0]
 
 
 def delete_memoized_cache_entry(func, bucket, *args):
-    key = f"memoized:{bucket}:{func.__name__}:{_hash_args(*args)}"
+    """Invalidates one entry, in all processes."""
+    key = _get_key(func, bucket, *args)
     cache.delete(key)
+    local_cache.delete(key)
+    # Other processes may still hold the entry locally, and drop it when they
+    # see a tombstone different from the one they loaded it with. It is set
+    # after the delete so that nobody loads the old entry with the new
+    # tombstone, and only needs to outlive their local copies.
+    cache.set(
+        _get_tombstone_key(key),
+        uuid.uuid4().hex,
+        timeout=LOCAL_CACHE_TIMEOUT_S + VERSION_CHECK_INTERVAL_S,
+    )
+
+
+def invalidate_memoized_cache_bucket(bucket):
+    """Invalidates every entry in the bucket, in all processes."""
+    version_key = _get_version_key(bucket)
+    try:
+        version = cache.incr(version_key)
+    except ValueError:
+        version = _init_bucket_version(bucket)
+    _bucket_versions[bucket] = (version, time.monotonic())
 
 
 def nuke_cache():
     cache.clear()
+    local_cache.clear()
+    _bucket_versions.clear()
+
+
+def _get_key(func, bucket, *args):
+    version = _get_bucket_version(bucket)
+    return f"memoized:{bucket}:{version}:{func.__name__}:{_hash_args(*args)}"
+
+
+def _get_tombstone_key(key):
+    return f"memoized_tombstone:{key}"
+
+
+def _get_version_key(bucket):
+    return f"memoized_version:{bucket}"
+
+
+def _get_bucket_version(bucket):
+    now = time.monotonic()
+    version, checked_time = _bucket_versions.get(bucket, (None, -math.inf))
+    if now - checked_time >= VERSION_CHECK_INTERVAL_S:
+        version = cache.get(_get_version_key(bucket))
+        if version is None:
+            version = _init_bucket_version(bucket)
+        _bucket_versions[bucket] = (version, now)
+    return version
+
+
+def _init_bucket_version(bucket):
+    # Start from a random version so that a cleared cache does not reuse the
+    # versions of entries other processes still hold locally.
+    version_key = _get_version_key(bucket)
+    cache.add(version_key, random.getrandbits(48), timeout=None)
+    return cache.get(version_key)
 
 
 def _hash_args(*args):
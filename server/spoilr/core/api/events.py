@@ -9,9 +9,12 @@ It's very similar to Django's signals.
 # TODO(sahil): Consider using Django signals?
 """
 
-import collections, importlib, logging
+import collections, contextlib, contextvars, functools, importlib, logging
 from enum import Enum
 
+from django.conf import settings
+from django.db import transaction
+
 from .cache import delete_memoized_cache_entry, memoized_cache
 
 EVENTS_CACHE_BUCKET = "events"
@@ -76,23 +79,31 @@ class HuntEvent(str, Enum):
 wildcard_subscriptions = []
 subscriptions = collections.defaultdict(list)
 
+# SystemLog rows waiting to be inserted by the enclosing batched_system_log().
+_system_log_buffer = contextvars.ContextVar("system_log_buffer", default=None)
+
 
-def register(event_type, subscriber, priority=HandlerPriority.MEDIUM):
+def register(event_type, subscriber, priority=HandlerPriority.MEDIUM, run_async=False):
     """
     Register for the subscriber to be called when the specified event type occurs.
 
     The priority is used to control whether some handlers are run before others. A
     handler registered with a higher `priority` value will run first.
 
+    Slow subscribers can set `run_async` to be run on a Celery worker after the
+    transaction commits, if `SPOILR_ASYNC_EVENT_TASK` is configured. They must
+    be module-level functions, and model instances they receive are re-fetched
+    from the database (or None if they were never saved).
+
     Note: wildcard subscriptions implicitly have the lowest priority.
     """
-    subscriptions[event_type].append((subscriber, priority))
+    subscriptions[event_type].append((subscriber, priority, run_async))
     subscriptions[event_type].sort(key=lambda sub: sub[1].value * -1)
 
 
-def register_wildcard(subscriber):
+def register_wildcard(subscriber, run_async=False):
     """Register for the subscriber to be called when any event type occurs."""
-    wildcard_subscriptions.append(subscriber)
+    wildcard_subscriptions.append((subscriber, run_async))
 
 
 def dispatch(event_type, *, message, object_id=None, team=None, **kwargs):
@@ -105,27 +116,79 @@ def dispatch(event_type, *, message, object_id=None, team=None, **kwargs):
             team,
             object_id,
         )
-        # Lazily import the model, so that this can module can be imported at
-        # configuration time.
-        from spoilr.core.models import SystemLog
-
-        SystemLog.objects.create(
-            event_type=event_type, message=message, team=team, object_id=object_id
-        )
+        _log_event(event_type, message=message, team=team, object_id=object_id)
 
     _dispatch_internal(event_type, message=message, team=team, **kwargs)
 
 
+def _log_event(event_type, *, message, team, object_id):
+    # Lazily import the model, so that this can module can be imported at
+    # configuration time.
+    from spoilr.core.models import SystemLog
+
+    system_log = SystemLog(
+        event_type=event_type, message=message, team=team, object_id=object_id
+    )
+    buffer = _system_log_buffer.get()
+    if buffer is None or not settings.SPOILR_BATCH_SYSTEM_LOG:
+        system_log.save()
+    else:
+        buffer.append(system_log)
+
+
+@contextlib.contextmanager
+def batched_system_log():
+    """
+    Buffer the SystemLog rows written by dispatch and insert them with a single
+    query when the outermost block exits, or once the enclosing transaction
+    commits. Nested blocks share the outermost buffer, which is also the value
+    of the block.
+    """
+    if _system_log_buffer.get() is not None:
+        yield _system_log_buffer.get()
+        return
+
+    buffer = []
+    token = _system_log_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _system_log_buffer.reset(token)
+        if buffer:
+            transaction.on_commit(functools.partial(_flush_system_log, buffer))
+
+
+def _flush_system_log(buffer):
+    from spoilr.core.models import SystemLog
+
+    SystemLog.objects.bulk_create(buffer)
+
+
+def batched_system_log_middleware(get_response):
+    """Writes all SystemLog rows from a request with a single insert."""
+
+    def middleware(request):
+        with batched_system_log():
+            return get_response(request)
+
+    return middleware
+
+
 def _dispatch_internal(event_type, **kwargs):
-    for subscriber, unused_priority in map(
-        _resolve_subscriber, subscriptions[event_type]
-    ):
-        subscriber(**kwargs)
+    for subscriber, unused_priority, run_async in subscriptions[event_type]:
+        if run_async and settings.SPOILR_ASYNC_EVENT_TASK:
+            _dispatch_async(subscriber, event_type, kwargs)
+        else:
+            _resolve_subscriber(subscriber)(**kwargs)
 
-    for subscriber in map(_resolve_subscriber, wildcard_subscriptions):
-        subscriber(event_type, **kwargs)
+    for subscriber, run_async in wildcard_subscriptions:
+        if run_async and settings.SPOILR_ASYNC_EVENT_TASK:
+            _dispatch_async(subscriber, event_type, kwargs, wildcard=True)
+        else:
+            _resolve_subscriber(subscriber)(event_type, **kwargs)
 
 
+@functools.lru_cache(maxsize=None)
 def _resolve_subscriber(subscriber_or_name):
     if isinstance(subscriber_or_name, str):
         module_name, function_name = subscriber_or_name.rsplit(".", 1)
@@ -133,6 +196,61 @@ def _resolve_subscriber(subscriber_or_name):
     return subscriber_or_name
 
 
+def _get_subscriber_name(subscriber_or_name):
+    if isinstance(subscriber_or_name, str):
+        return subscriber_or_name
+    return f"{subscriber_or_name.__module__}.{subscriber_or_name.__qualname__}"
+
+
+def _dispatch_async(subscriber, event_type, kwargs, wildcard=False):
+    # Import here so that celery is only required when async events are enabled.
+    from celery import current_app
+
+    args = [
+        _get_subscriber_name(subscriber),
+        event_type.value,
+        {key: _serialize_event_arg(value) for key, value in kwargs.items()},
+        wildcard,
+    ]
+    # Wait for the commit so the worker can see any rows created by the event.
+    transaction.on_commit(
+        lambda: current_app.send_task(settings.SPOILR_ASYNC_EVENT_TASK, args=args)
+    )
+
+
+def run_async_subscriber(subscriber_name, event_type_value, kwargs, wildcard=False):
+    """Run a subscriber that was dispatched asynchronously, on a Celery worker."""
+    subscriber = _resolve_subscriber(subscriber_name)
+    event_type = HuntEvent(event_type_value)
+    kwargs = {key: _deserialize_event_arg(value) for key, value in kwargs.items()}
+    with batched_system_log():
+        if wildcard:
+            subscriber(event_type, **kwargs)
+        else:
+            subscriber(**kwargs)
+
+
+def _serialize_event_arg(value):
+    from django.db import models
+
+    if isinstance(value, models.Model):
+        return {"__model__": value._meta.label, "pk": value.pk}
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _deserialize_event_arg(value):
+    from django.apps import apps
+
+    if isinstance(value, dict) and "__model__" in value:
+        if value["pk"] is None:
+            return None
+        model = apps.get_model(value["__model__"])
+        return model._default_manager.filter(pk=value["pk"]).first()
+    return value
+
+
 @memoized_cache(EVENTS_CACHE_BUCKET)
 def get_num_extra_event_rewards(site_ref=EVENTS_REF):
     # import locally to avoid importing before django is set up
@@ -14,7 +14,7 @@ from spoilr.core.models import (
 )
 
 from .cache import clear_memoized_cache, memoized_cache
-from .events import HuntEvent, dispatch
+from .events import HuntEvent, batched_system_log, dispatch
 
 logger = logging.getLogger(__name__)
 
@@ -147,7 +147,20 @@ def release_puzzle_all_teams(puzzle):
 
 def release_puzzles(team, puzzles):
     """Release many puzzles to a team."""
-    _release_many(team, puzzles, "puzzle", PuzzleAccess, HuntEvent.PUZZLE_RELEASED)
+    _release_many(
+        team,
+        puzzles,
+        "puzzle",
+        PuzzleAccess,
+        _get_puzzle_released_event,
+        get_message=lambda puzzle: f"Released {puzzle}",
+    )
+
+
+def _get_puzzle_released_event(puzzle):
+    return (
+        HuntEvent.METAPUZZLE_RELEASED if puzzle.is_meta else HuntEvent.PUZZLE_RELEASED
+    )
 
 
 def release_interaction(team, interaction, *, reopen=False, request_comments=None):
@@ -235,19 +248,20 @@ def _release_many_teams(model, model_name, AccessModel, event_type):
     ]
     AccessModel.objects.bulk_create(missing_accesses)
 
-    for access in missing_accesses:
-        model = getattr(access, model_name)
-        logger.info(f"released {access.team.username}/{model_name}/{model.slug}")
-        dispatch(
-            event_type,
-            team=access.team,
-            **{model_name: model, f"{model_name}_access": access},
-            object_id=model.slug,
-            message=f'Released {model_name} "{model}"',
-        )
+    with batched_system_log():
+        for access in missing_accesses:
+            model = getattr(access, model_name)
+            logger.info(f"released {access.team.username}/{model_name}/{model.slug}")
+            dispatch(
+                event_type,
+                team=access.team,
+                **{model_name: model, f"{model_name}_access": access},
+                object_id=model.slug,
+                message=f'Released {model_name} "{model}"',
+            )
 
 
-def _release_many(team, models, model_name, AccessModel, event_type):
+def _release_many(team, models, model_name, AccessModel, event_type, get_message=None):
     existing_ids = set(
         [
             getattr(access, f"{model_name}_id")
@@ -257,23 +271,40 @@ def _release_many(team, models, model_name, AccessModel, event_type):
         ]
     )
 
-    missing_accesses = [
-        AccessModel(team=team, **{model_name: model})
-        for model in models
-        if model.id not in existing_ids
-    ]
-    AccessModel.objects.bulk_create(missing_accesses)
-
-    for access in missing_accesses:
-        model = getattr(access, model_name)
-        logger.info(f"released {team.username}/{model_name}/{model.slug}")
-        dispatch(
-            event_type,
-            team=team,
-            **{model_name: model, f"{model_name}_access": access},
-            object_id=model.slug,
-            message=f'Released {model_name} "{model}"',
+    missing_models = [model for model in models if model.id not in existing_ids]
+    if not missing_models:
+        return
+    # Another request may have released some of these concurrently.
+    AccessModel.objects.bulk_create(
+        [AccessModel(team=team, **{model_name: model}) for model in missing_models],
+        ignore_conflicts=True,
+    )
+    # Conflicting rows are skipped without setting primary keys, so read back
+    # the saved accesses to pass to the subscribers.
+    released_accesses = {
+        getattr(access, f"{model_name}_id"): access
+        for access in AccessModel.objects.filter(
+            team=team, **{f"{model_name}__in": missing_models}
         )
+    }
+
+    # Import here to avoid circular import
+    from spoilr.progress.api import batched_team_progress
+
+    with batched_system_log(), batched_team_progress():
+        for model in missing_models:
+            access = released_accesses[model.id]
+            setattr(access, model_name, model)
+            logger.info(f"released {team.username}/{model_name}/{model.slug}")
+            dispatch(
+                event_type(model) if callable(event_type) else event_type,
+                team=team,
+                **{model_name: model, f"{model_name}_access": access},
+                object_id=model.slug,
+                message=get_message(model)
+                if get_message
+                else f'Released {model_name} "{model}"',
+            )
 
 
 @lru_cache(maxsize=None)
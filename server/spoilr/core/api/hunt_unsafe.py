@@ -10,6 +10,7 @@ from django.core.cache import caches
 from spoilr.core.models import (
     HuntSetting,
     SystemLog,
+    SystemLogArchive,
     PuzzleAccess,
     RoundAccess,
     InteractionAccess,
@@ -38,3 +39,4 @@ def reset_hunt_activity():
 def reset_hunt_log():
     """Resets the hunt system log."""
     SystemLog.objects.all().delete()
+    SystemLogArchive.objects.all().delete()
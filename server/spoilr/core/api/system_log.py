@@ -0,0 +1,99 @@
+"""Searching and archiving the system log."""
+import datetime
+import logging
+import re
+from functools import cache
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.timezone import now
+from spoilr.core.models import SystemLog, SystemLogArchive
+
+logger = logging.getLogger(__name__)
+
+# Created by the spoilr_core 0002 migration.
+SEARCH_COLUMN = "search"
+SQLITE_SEARCH_TABLE = "spoilr_core_systemlog_fts"
+
+ARCHIVE_CHUNK_SIZE = 2000
+
+
+def search_system_log(queryset, search):
+    """
+    Filters SystemLog rows to those with every word of `search` starting a word
+    of their event type, object id or message.
+
+    This uses the full-text index on Postgres, or the FTS5 table on sqlite, and
+    otherwise falls back to a substring match that scans the table.
+    """
+    terms = re.findall(r"[^\W_]+", search)
+    connection = connections[queryset.db]
+    if terms and connection.vendor == "postgresql":
+        query = " & ".join(f"{term}:*" for term in terms)
+        return queryset.filter(
+            RawSQL(
+                f"{SystemLog._meta.db_table}.{SEARCH_COLUMN} @@ to_tsquery('simple', %s)",
+                (query,),
+                output_field=BooleanField(),
+            )
+        )
+    if terms and connection.vendor == "sqlite" and _has_sqlite_search(queryset.db):
+        query = " ".join(f'"{term}"*' for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SQLITE_SEARCH_TABLE} WHERE {SQLITE_SEARCH_TABLE} MATCH %s",
+                (query,),
+            )
+        )
+    return queryset.filter(
+        Q(message__icontains=search)
+        | Q(object_id__icontains=search)
+        | Q(event_type__icontains=search)
+    )
+
+
+@cache
+def _has_sqlite_search(alias):
+    return SQLITE_SEARCH_TABLE in connections[alias].introspection.table_names()
+
+
+def archive_system_log(before, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Moves the SystemLog rows from before the given time into SystemLogArchive,
+    chunk_size rows per transaction so that the live table is never locked for
+    long. Returns the number of rows moved.
+    """
+    fields = ("id", "timestamp", "event_type", "team_id", "object_id", "message")
+    num_archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                SystemLog.objects.filter(timestamp__lt=before)
+                .order_by("timestamp", "id")
+                .values(*fields)[:chunk_size]
+            )
+            if not rows:
+                break
+            # Another archival job may have copied the same rows.
+            SystemLogArchive.objects.bulk_create(
+                [SystemLogArchive(**row) for row in rows], ignore_conflicts=True
+            )
+            SystemLog.objects.filter(id__in=[row["id"] for row in rows]).delete()
+        num_archived += len(rows)
+    return num_archived
+
+
+def archive_old_system_log():
+    """
+    Archives the SystemLog rows older than SPOILR_SYSTEM_LOG_ARCHIVE_DAYS, if
+    that is set. Run periodically by the spoilr-archive-system-log task.
+    """
+    days = settings.SPOILR_SYSTEM_LOG_ARCHIVE_DAYS
+    if days is None:
+        return 0
+    num_archived = archive_system_log(now() - datetime.timedelta(days=days))
+    if num_archived:
+        logger.info("Archived %d system log rows", num_archived)
+    return num_archived
@@ -47,8 +47,10 @@ def get_team_by_id(team_id):
 
 
 def _on_team_changed(team, **kwargs):
-    delete_memoized_cache_entry(TEAM_CACHE_USERNAME_BUCKET, team.username)
-    delete_memoized_cache_entry(TEAM_CACHE_ID_BUCKET, team.id)
+    delete_memoized_cache_entry(
+        get_team_by_username, TEAM_CACHE_USERNAME_BUCKET, team.username
+    )
+    delete_memoized_cache_entry(get_team_by_id, TEAM_CACHE_ID_BUCKET, team.id)
 
 
 @memoized_cache(PUBLIC_USER_BUCKET)
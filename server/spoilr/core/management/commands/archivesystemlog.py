@@ -0,0 +1,27 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from spoilr.core.api.system_log import archive_system_log
+
+
+class Command(BaseCommand):
+    help = "Moves old system log rows to the system log archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=float,
+            default=settings.SPOILR_SYSTEM_LOG_ARCHIVE_DAYS,
+            help="Archive rows older than this many days",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] is None:
+            raise CommandError("Pass --days or set SPOILR_SYSTEM_LOG_ARCHIVE_DAYS")
+        num_archived = archive_system_log(
+            now() - datetime.timedelta(days=options["days"])
+        )
+        self.stdout.write(f"Archived {num_archived} system log rows")
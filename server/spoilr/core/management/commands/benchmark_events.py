@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from spoilr.core.api.events import HuntEvent
+from spoilr.core.api.hunt import _release_many_teams
+from spoilr.core.models import Puzzle, PuzzleAccess, Round, SystemLog, Team
+
+from ._common import confirm_command
+
+BENCHMARK_PREFIX = "benchmark-events"
+
+
+class Command(BaseCommand):
+    help = (
+        "Times releasing a puzzle to many teams with and without batched "
+        "SystemLog writes. Creates and then deletes temporary teams."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teams", type=int, default=1000)
+        parser.add_argument("--runs", type=int, default=3)
+
+    def handle(self, *args, **options):
+        if not confirm_command():
+            return
+
+        teams = Team.objects.bulk_create(
+            Team(username=f"{BENCHMARK_PREFIX}-{i}", name=f"{BENCHMARK_PREFIX}-{i}")
+            for i in range(options["teams"])
+        )
+        # Only release to the benchmark teams.
+        team_ids = {team.id for team in teams}
+        existing_team_ids = list(
+            Team.objects.exclude(id__in=team_ids).values_list("id", flat=True)
+        )
+        bench_round = Round.objects.create(
+            slug=BENCHMARK_PREFIX,
+            name=BENCHMARK_PREFIX,
+            order=(Round.objects.aggregate(Max("order"))["order__max"] or 0) + 1,
+        )
+        puzzle = Puzzle.objects.create(
+            external_id=(
+                Puzzle.objects.aggregate(Max("external_id"))["external_id__max"] or 0
+            )
+            + 1,
+            round=bench_round,
+            slug=BENCHMARK_PREFIX,
+            name=BENCHMARK_PREFIX,
+            answer=BENCHMARK_PREFIX,
+            order=0,
+        )
+        PuzzleAccess.objects.bulk_create(
+            PuzzleAccess(team_id=team_id, puzzle=puzzle)
+            for team_id in existing_team_ids
+        )
+
+        try:
+            for batched in (False, True):
+                # Async subscribers need a broker, so run everything inline to
+                # compare like with like.
+                with override_settings(
+                    SPOILR_BATCH_SYSTEM_LOG=batched, SPOILR_ASYNC_EVENT_TASK=None
+                ):
+                    self._benchmark(puzzle, team_ids, batched, options["runs"])
+        finally:
+            Team.objects.filter(id__in=team_ids).delete()
+            bench_round.delete()
+            SystemLog.objects.filter(object_id=BENCHMARK_PREFIX).delete()
+
+    def _benchmark(self, puzzle, team_ids, batched, runs):
+        timings = []
+        for _ in range(runs):
+            PuzzleAccess.objects.filter(puzzle=puzzle, team_id__in=team_ids).delete()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                _release_many_teams(
+                    puzzle, "puzzle", PuzzleAccess, HuntEvent.PUZZLE_RELEASED
+                )
+                timings.append(time.perf_counter() - start)
+
+        self.stdout.write(
+            f"batched={batched} teams={len(team_ids)} queries={len(queries)} "
+            f"best={min(timings) * 1000:.1f}ms "
+            f"mean={sum(timings) / len(timings) * 1000:.1f}ms"
+        )
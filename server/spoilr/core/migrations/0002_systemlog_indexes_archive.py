@@ -0,0 +1,157 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Full-text search over the system log, used by
+# spoilr.core.api.system_log.search_system_log. Neither is known to the model,
+# so Django never reads or writes them itself.
+POSTGRES_SEARCH_SQL = [
+    """
+    ALTER TABLE spoilr_core_systemlog ADD COLUMN search tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector(
+            'simple',
+            event_type || ' ' || coalesce(object_id, '') || ' ' || message
+        )
+    ) STORED
+    """,
+    "CREATE INDEX spoilr_core_systemlog_search ON spoilr_core_systemlog USING GIN (search)",
+]
+POSTGRES_DROP_SEARCH_SQL = [
+    "ALTER TABLE spoilr_core_systemlog DROP COLUMN search",
+]
+# An external content FTS5 table kept in sync by triggers. Without FTS5,
+# searches fall back to scanning the table. Remaking
+# spoilr_core_systemlog in a later sqlite migration drops the triggers, so that
+# migration needs to recreate them.
+SQLITE_SEARCH_SQL = [
+    """
+    CREATE VIRTUAL TABLE spoilr_core_systemlog_fts USING fts5(
+        event_type, object_id, message,
+        content='spoilr_core_systemlog', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER spoilr_core_systemlog_fts_insert
+    AFTER INSERT ON spoilr_core_systemlog BEGIN
+        INSERT INTO spoilr_core_systemlog_fts(rowid, event_type, object_id, message)
+        VALUES (new.id, new.event_type, new.object_id, new.message);
+    END
+    """,
+    """
+    CREATE TRIGGER spoilr_core_systemlog_fts_delete
+    AFTER DELETE ON spoilr_core_systemlog BEGIN
+        INSERT INTO spoilr_core_systemlog_fts(
+            spoilr_core_systemlog_fts, rowid, event_type, object_id, message
+        )
+        VALUES ('delete', old.id, old.event_type, old.object_id, old.message);
+    END
+    """,
+    """
+    CREATE TRIGGER spoilr_core_systemlog_fts_update
+    AFTER UPDATE ON spoilr_core_systemlog BEGIN
+        INSERT INTO spoilr_core_systemlog_fts(
+            spoilr_core_systemlog_fts, rowid, event_type, object_id, message
+        )
+        VALUES ('delete', old.id, old.event_type, old.object_id, old.message);
+        INSERT INTO spoilr_core_systemlog_fts(rowid, event_type, object_id, message)
+        VALUES (new.id, new.event_type, new.object_id, new.message);
+    END
+    """,
+    "INSERT INTO spoilr_core_systemlog_fts(spoilr_core_systemlog_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_SEARCH_SQL = [
+    "DROP TRIGGER IF EXISTS spoilr_core_systemlog_fts_insert",
+    "DROP TRIGGER IF EXISTS spoilr_core_systemlog_fts_delete",
+    "DROP TRIGGER IF EXISTS spoilr_core_systemlog_fts_update",
+    "DROP TABLE IF EXISTS spoilr_core_systemlog_fts",
+]
+
+
+def create_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for sql in POSTGRES_SEARCH_SQL:
+            schema_editor.execute(sql)
+    elif vendor == "sqlite" and has_fts5(schema_editor.connection):
+        # The static site database is opened by the SQLite in Pyodide, which may
+        # not have FTS5 even if the one building the database does.
+        if settings.IS_PYODIDE:
+            return
+        for sql in SQLITE_SEARCH_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for sql in POSTGRES_DROP_SEARCH_SQL:
+            schema_editor.execute(sql)
+    elif vendor == "sqlite":
+        for sql in SQLITE_DROP_SEARCH_SQL:
+            schema_editor.execute(sql)
+
+
+def has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spoilr_core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SystemLogArchive",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False)),
+                ("timestamp", models.DateTimeField(db_index=True)),
+                ("event_type", models.CharField(max_length=50)),
+                ("object_id", models.CharField(blank=True, max_length=200, null=True)),
+                ("message", models.TextField()),
+            ],
+            options={
+                "verbose_name_plural": "System log archive",
+            },
+        ),
+        migrations.AlterField(
+            model_name="systemlog",
+            name="timestamp",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name="systemlog",
+            index=models.Index(
+                fields=["event_type", "timestamp"], name="spoilr_core_systemlog_type_ts"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="systemlog",
+            index=models.Index(
+                fields=["team", "timestamp"], name="spoilr_core_systemlog_team_ts"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="systemlog",
+            index=models.Index(
+                fields=["object_id", "timestamp"], name="spoilr_core_systemlog_obj_ts"
+            ),
+        ),
+        migrations.AddField(
+            model_name="systemlogarchive",
+            name="team",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="spoilr_core.team",
+            ),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -598,7 +598,7 @@ class HuntSetting(models.Model):
 class SystemLog(models.Model):
     """Audit log for any changes to the hunt state."""
 
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     event_type = models.CharField(max_length=50)
     team = models.ForeignKey(Team, blank=True, null=True, on_delete=models.SET_NULL)
     object_id = models.CharField(max_length=200, blank=True, null=True)
@@ -610,6 +610,40 @@ class SystemLog(models.Model):
 
     class Meta:
         verbose_name_plural = "System log"
+        indexes = [
+            models.Index(
+                fields=["event_type", "timestamp"],
+                name="%(app_label)s_%(class)s_type_ts",
+            ),
+            models.Index(
+                fields=["team", "timestamp"], name="%(app_label)s_%(class)s_team_ts"
+            ),
+            models.Index(
+                fields=["object_id", "timestamp"],
+                name="%(app_label)s_%(class)s_obj_ts",
+            ),
+        ]
+
+
+class SystemLogArchive(models.Model):
+    """
+    SystemLog rows moved out of the live table by
+    spoilr.core.api.system_log.archive_system_log, keeping their ids.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    timestamp = models.DateTimeField(db_index=True)
+    event_type = models.CharField(max_length=50)
+    team = models.ForeignKey(Team, blank=True, null=True, on_delete=models.SET_NULL)
+    object_id = models.CharField(max_length=200, blank=True, null=True)
+    message = models.TextField()
+
+    def __str__(self):
+        prefix = f"[{self.team}] " if self.team else ""
+        return f"{prefix} {self.timestamp}: {self.message}"
+
+    class Meta:
+        verbose_name_plural = "System log archive"
 
 
 # TODO(sahil): Rewrite updates - could use a better model, and move it to its own spoilr app.
@@ -1,11 +1,23 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from .api.answer import invalidate_answer_index
 from .api.cache import nuke_cache
-from .models import HuntSetting
+from .models import HuntSetting, PseudoAnswer, Puzzle
 
 
 @receiver(post_save, sender=HuntSetting)
 def on_hunt_setting_changed(sender, instance, created, **kwargs):
     # Clear the cache when hunt settings have changed
     nuke_cache()
+
+
+# Signals are sent with the concrete model as the sender, so subclasses of
+# Puzzle connect this for themselves (see puzzles.models).
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+@receiver(post_save, sender=PseudoAnswer)
+@receiver(post_delete, sender=PseudoAnswer)
+def on_answers_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_answer_index)
@@ -1,12 +1,18 @@
+import datetime
+
 from django.http import JsonResponse
 from django.utils.timezone import now
 from django.views.decorators.clickjacking import xframe_options_sameorigin
 
 from spoilr.core.api.decorators import inject_team
-from spoilr.core.api.events import HuntEvent, dispatch
+from spoilr.core.api.events import HuntEvent, batched_system_log, dispatch
 
 from spoilr.core.models import HuntSetting
 
+# The tick subscribers look at what happened since the last tick that changed
+# anything, which is kept at most this far behind.
+LAST_TICK_MAX_AGE = datetime.timedelta(minutes=5)
+
 
 def do_tick():
     tick = now()
@@ -14,10 +20,22 @@ def do_tick():
     tick_setting, _ = HuntSetting.objects.get_or_create(name="spoilr.last_tick")
     last_tick = tick_setting.date_value if tick_setting.date_value else None
 
-    tick_setting.date_value = tick
-    tick_setting.save()
-
-    dispatch(HuntEvent.HUNT_TICK, message="Tick", tick=tick, last_tick=last_tick)
+    # Tick subscribers append a description of each change they make.
+    changes = []
+    with batched_system_log():
+        dispatch(
+            HuntEvent.HUNT_TICK,
+            message="Tick",
+            tick=tick,
+            last_tick=last_tick,
+            changes=changes,
+        )
+
+    # If nothing changed, the next tick can look at the same window again, so
+    # skip the write.
+    if changes or last_tick is None or tick - last_tick >= LAST_TICK_MAX_AGE:
+        tick_setting.date_value = tick
+        tick_setting.save(update_fields=["date_value", "update_time"])
 
     return JsonResponse({"success": True, "time": tick})
 
@@ -19,7 +19,7 @@ def on_email_received(incoming_message, **kwargs):
         incoming_message.tasks.add(Task(), bulk=False)
 
 
-def on_tick(**kwargs):
+def on_tick(changes, **kwargs):
     from spoilr.core.api.hunt import get_site_launch_time
     from spoilr.email.models import Email
     from spoilr.hq.models import Task
@@ -39,8 +39,12 @@ def on_tick(**kwargs):
             # Catch-up on missed emails, just in case.
             .filter(received_datetime__gte=hunt_launch_time, tasks__isnull=True)
         )
+        num_tasks = 0
         for message in messages_without_task:
             message.tasks.add(Task(), bulk=False)
+            num_tasks += 1
+        if num_tasks:
+            changes.append(f"Created tasks for {num_tasks} emails")
 
 
 register(HuntEvent.HUNT_TICK, on_tick)
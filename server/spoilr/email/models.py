@@ -1,4 +1,3 @@
-import distutils.util
 import email
 import email.headerregistry
 import email.policy
@@ -16,6 +15,7 @@ from django.utils import timezone
 from pyexpat import model
 from spoilr.core.models import Interaction, Team
 from spoilr.hq.models import Handler, Task
+from spoilr.hq.util.tasks import tasks_prefetch
 from spoilr.utils import generate_url
 
 
@@ -116,10 +116,31 @@ class CannedEmail(models.Model):
         return f"{self.slug}: {self.subject}"
 
 
-class EmailManager(models.Manager):
-    def get_queryset(self, *args, **kwargs):
-        # Prefetches the round and event status automatically.
-        return super().get_queryset(*args, **kwargs).prefetch_related("tasks")
+class EmailQuerySet(models.QuerySet):
+    # The MIME source can be megabytes per email and is only needed to
+    # re-parse or forward it.
+    RAW_FIELDS = ("raw_content", "header_content")
+    BODY_FIELDS = ("text_content", "html_content")
+
+    def lite(self, bodies=False):
+        """
+        Defers the raw MIME content, and the text and html bodies unless
+        `bodies` is set, for listings that do not show them.
+        """
+        fields = self.RAW_FIELDS if bodies else self.RAW_FIELDS + self.BODY_FIELDS
+        return self.defer(*fields)
+
+    def with_tasks(self):
+        """
+        Prefetches the tasks and their handlers, for `task` and `handler`.
+        Django builds a queryset for each email when prefetching, so this is
+        for pages of emails rather than whole tables.
+        """
+        return self.prefetch_related(tasks_prefetch())
+
+
+class EmailManager(models.Manager.from_queryset(EmailQuerySet)):
+    pass
 
 
 class Email(models.Model):
@@ -271,8 +292,9 @@ class Email(models.Model):
             if field in self.__dict__:
                 if isinstance(getattr(self, field), memoryview):
                     setattr(self, field, getattr(self, field).tobytes())
-        # NB: currently will cause a db query for instantiating this instance
-        self._original_handler = self.handler
+        # The handler is not looked up here, as that costs a query for every
+        # instance unless the tasks are prefetched.
+        self._original_handler = self.DEFERRED
 
     def save(self, *args, **kwargs):
         # This is not handled in all cases - IE get_or_create - more for development TODO address
@@ -667,11 +689,7 @@ class Email(models.Model):
     @classmethod
     def check_is_spam(cls, email_message):
         raw_value = email_message.get("X-Spam", "False")
-        try:
-            value = distutils.util.strtobool(raw_value)
-        except ValueError:
-            value = False
-        return value
+        return raw_value.strip().lower() in ("y", "yes", "t", "true", "on", "1")
 
     @classmethod
     def check_is_from_admin(cls, email_message):
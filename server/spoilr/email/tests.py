@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from spoilr.core.models import Team, TeamType, User, UserTeamRole
+from spoilr.email.models import Email
+from spoilr.hq.models import Handler, Task
+
+NUM_EMAILS = 80
+
+
+class ArchiveQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teams = [
+            Team.objects.create(username=f"team-{i}", name=f"Team {i}")
+            for i in range(3)
+        ]
+        # Half of the emails are sent by a handler, and every fifth email has
+        # a task.
+        handler = Handler.objects.create(name="handler", discord="handler")
+        now = timezone.now()
+        emails = Email.objects.bulk_create(
+            Email(
+                team=teams[i % len(teams)],
+                subject=f"Email {i}",
+                text_content=f"Email body {i}",
+                html_content=f"<p>Email body {i}</p>",
+                raw_content=b"X" * 1000,
+                from_address=f"team-{i}@example.com",
+                is_from_us=bool(i % 2),
+                created_via_webapp=bool(i % 2),
+                status=Email.SENT if i % 2 else Email.RECEIVED_NO_REPLY,
+                sent_datetime=now,
+                author=handler if i % 2 else None,
+            )
+            for i in range(NUM_EMAILS)
+        )
+        Task.objects.bulk_create(Task(content_object=email) for email in emails[::5])
+
+        admin_team = Team.objects.create(
+            username="admin", name="Admin", type=TeamType.INTERNAL
+        )
+        cls.admin = User.objects.create_superuser(
+            username=admin_team.username,
+            password="admin",
+            team=admin_team,
+            team_role=UserTeamRole.SHARED_ACCOUNT,
+        )
+
+    def test_archive_queries_do_not_grow_with_limit(self):
+        self.client.force_login(self.admin)
+        url = reverse("spoilr.email:archive")
+        # The first request also loads the session and caches.
+        self.client.get(url)
+
+        for limit in (5, NUM_EMAILS // 2):
+            with self.subTest(limit=limit), self.assertNumQueries(7):
+                response = self.client.get(url, {"hidden": 0, "limit": limit})
+            self.assertEqual(response.status_code, 200)
+            # The archive shows up to `limit` incoming and outgoing emails.
+            self.assertEqual(len(response.context["emails"]), 2 * limit)
@@ -13,9 +13,9 @@ MAX_EMAIL_LIMIT = 200
 @hq()
 def dashboard_view(request):
     emails = (
-        Email.objects.select_related("interaction", "team")
-        .prefetch_related("tasks")
-        .defer("raw_content", "header_content")
+        Email.objects.select_related("interaction", "team", "author")
+        .lite(bodies=True)
+        .with_tasks()
         .order_by("-received_datetime")
     )
     hidden = not (request.GET.get("hidden") and request.GET["hidden"] == "0")
@@ -42,7 +42,7 @@ def dashboard_view(request):
         email_data.append(
             {
                 "email": email,
-                "task": email.tasks.first(),
+                "task": email.task,
                 "form": form,
                 "type": "out" if email.is_from_us else "in",
             }
@@ -64,13 +64,16 @@ def dashboard_view(request):
 def archive_view(request):
     incoming_emails = (
         Email.objects.select_related("interaction", "team")
-        .defer("raw_content", "header_content")
+        .lite(bodies=True)
         .order_by("-received_datetime")
         .filter(is_from_us=False)
     )
+    # Only outgoing emails show their handler.
     outgoing_emails = (
-        Email.objects.filter(is_from_us=True)
-        .defer("raw_content", "header_content")
+        Email.objects.select_related("interaction", "team", "author")
+        .lite(bodies=True)
+        .with_tasks()
+        .filter(is_from_us=True)
         .order_by("-sent_datetime")
     )
 
@@ -127,7 +130,7 @@ def archive_view(request):
         incoming_emails = incoming_emails.exclude(status__in=Email.HIDDEN_STATUSES)
         outgoing_emails = outgoing_emails.exclude(status__in=Email.HIDDEN_STATUSES)
 
-    limit = min(request.GET.get("limit", 10), MAX_EMAIL_LIMIT)
+    limit = min(int(request.GET.get("limit", 10)), MAX_EMAIL_LIMIT)
     incoming_emails = incoming_emails[:limit]
     outgoing_emails = outgoing_emails[:limit]
 
@@ -1,13 +1,15 @@
 import email
+from collections import defaultdict
 
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
-from django.db.models import Q
+from django.db.models import Count, Prefetch, Q
 from django.template.loader import render_to_string
 from spoilr.core.models import Puzzle, Team
 from spoilr.email.models import Email
 from spoilr.hq.models import Task, TaskStatus
+from spoilr.hq.util.tasks import tasks_prefetch
 from spoilr.utils import generate_url
 
 
@@ -203,18 +205,26 @@ class Hint(models.Model):
         }
 
     def __str__(self):
+        return self.summarize(
+            self.team.name, self.puzzle.name, self.text_content, self.status
+        )
+
+    @classmethod
+    def summarize(cls, team_name, puzzle_name, text_content, status):
+        """Formats a hint like __str__, from values that were already loaded."""
+
         def abbr(s):
             if len(s) > 50:
                 return s[:50] + "..."
             return s
 
         o = '{}, {}: "{}"'.format(
-            self.team.name,
-            self.puzzle.name,
-            abbr(self.text_content),
+            team_name,
+            puzzle_name,
+            abbr(text_content),
         )
-        if self.status != self.NO_RESPONSE:
-            o = o + " {}".format(self.status)
+        if status != cls.NO_RESPONSE:
+            o = o + " {}".format(status)
         return o
 
     def recipients(self):
@@ -250,7 +260,9 @@ class Hint(models.Model):
 
     @property
     def task(self):
-        return self.tasks.first()
+        # Uses the prefetched tasks, if any.
+        tasks = list(self.tasks.all())
+        return tasks[0] if tasks else None
 
     @property
     def handler(self):
@@ -279,6 +291,66 @@ class Hint(models.Model):
             is_request=True, response_id=None, status=Hint.NO_RESPONSE
         )
 
+    @classmethod
+    def with_handlers(cls, queryset):
+        """
+        Prefetches what the task and handler properties need, for the hints and
+        for the requests that responses answer.
+        """
+        return queryset.prefetch_related(
+            tasks_prefetch(),
+            Prefetch(
+                "request_set",
+                queryset=Hint.objects.defer("email__raw_content").prefetch_related(
+                    tasks_prefetch()
+                ),
+            ),
+        )
+
+    @classmethod
+    def get_threads(cls, hints):
+        """
+        Loads the threads of the given hints with one query for the hints and
+        two for their tasks. Returns a mapping from original request id to a
+        dict of the thread's hints in order, and its last request and response.
+        """
+        original_request_ids = {hint.original_request_id for hint in hints}
+        thread_hints = cls.with_handlers(
+            cls.objects.defer("email__raw_content")
+            .filter(
+                Q(pk__in=original_request_ids)
+                | Q(root_ancestor_request_id__in=original_request_ids)
+            )
+            .order_by("timestamp")
+        )
+        threads = defaultdict(
+            lambda: {"hints": [], "last_request": None, "last_response": None}
+        )
+        for hint in thread_hints:
+            thread = threads[hint.original_request_id]
+            thread["hints"].append(hint)
+            thread["last_request" if hint.is_request else "last_response"] = hint
+        return threads
+
+    @classmethod
+    def count_requests(cls, hints):
+        """
+        Returns a mapping from (team id, puzzle id) to the number of hint
+        requests the team made on the puzzle, for the teams and puzzles of the
+        given hints.
+        """
+        counts = (
+            cls.objects.filter(
+                is_request=True,
+                team_id__in={hint.team_id for hint in hints},
+                puzzle_id__in={hint.puzzle_id for hint in hints},
+            )
+            .values_list("team_id", "puzzle_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        return {(team_id, puzzle_id): count for team_id, puzzle_id, count in counts}
+
     @classmethod
     def clean_up_tasks(cls, hints):
         for hint_request_to_update in hints:
@@ -0,0 +1,101 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from spoilr.core.models import Puzzle, Round, Team, TeamType, User, UserTeamRole
+from spoilr.hints.models import Hint
+from spoilr.hq.models import Handler
+
+NUM_THREADS = 40
+
+
+class DashboardQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        round = Round.objects.create(slug="round", name="Round", order=0)
+        puzzles = [
+            Puzzle.objects.create(
+                external_id=i,
+                round=round,
+                slug=f"puzzle-{i}",
+                name=f"Puzzle {i}",
+                answer=f"ANSWER {i}",
+                order=i,
+            )
+            for i in range(3)
+        ]
+        teams = [
+            Team.objects.create(username=f"team-{i}", name=f"Team {i}")
+            for i in range(3)
+        ]
+        handler = Handler.objects.create(name="handler", discord="handler")
+        for i in range(NUM_THREADS):
+            hint = Hint.objects.create(
+                team=teams[i % len(teams)],
+                puzzle=puzzles[i % len(puzzles)],
+                text_content=f"Hint request {i}",
+            )
+            # Half of the tasks are claimed, and every fourth thread has a
+            # response and a follow-up request.
+            if i % 2:
+                hint.tasks.update(handler=handler, claim_time=timezone.now())
+            if i % 4 == 0:
+                hint.response = Hint.objects.create(
+                    team=hint.team,
+                    puzzle=hint.puzzle,
+                    root_ancestor_request=hint,
+                    is_request=False,
+                    text_content=f"Hint response {i}",
+                    status=Hint.ANSWERED,
+                )
+                hint.status = Hint.ANSWERED
+                hint.save()
+                Hint.objects.create(
+                    team=hint.team,
+                    puzzle=hint.puzzle,
+                    root_ancestor_request=hint,
+                    text_content=f"Hint follow-up {i}",
+                )
+
+        admin_team = Team.objects.create(
+            username="admin", name="Admin", type=TeamType.INTERNAL
+        )
+        cls.admin = User.objects.create_superuser(
+            username=admin_team.username,
+            password="admin",
+            team=admin_team,
+            team_role=UserTeamRole.SHARED_ACCOUNT,
+        )
+
+    def test_dashboard_queries_do_not_grow_with_limit(self):
+        self.client.force_login(self.admin)
+        url = reverse("spoilr.hints:dashboard")
+        # The first request also loads the session and caches.
+        self.client.get(url)
+
+        for limit in (5, NUM_THREADS):
+            with self.subTest(limit=limit), self.assertNumQueries(12):
+                response = self.client.get(url, {"open": 0, "limit": limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context["hints"]), limit)
+
+    def test_open_dashboard_queries_do_not_grow_with_limit(self):
+        # Sign in as the handler that claimed half of the hints, so their
+        # response forms are rendered too.
+        handler = Handler.objects.get()
+        handler.sign_in_time = timezone.now()
+        handler.save()
+        self.client.force_login(self.admin)
+        session = self.client.session
+        session["handler_id"] = handler.id
+        session.save()
+        url = reverse("spoilr.hints:dashboard")
+        self.client.get(url)
+
+        num_open = Hint.all_requiring_response().count()
+        for limit in (5, num_open):
+            with self.subTest(limit=limit), self.assertNumQueries(12):
+                response = self.client.get(url, {"open": 1, "limit": limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context["hints"]), limit)
+            self.assertContains(response, 'name="confirm"')
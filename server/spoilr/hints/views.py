@@ -22,8 +22,9 @@ MAX_HINT_LIMIT = 200
 @hq()
 def dashboard_view(request):
     hints = (
-        Hint.objects.select_related("team", "puzzle")
-        .prefetch_related("request_set")
+        Hint.objects.select_related(
+            "team", "puzzle", "response", "root_ancestor_request"
+        )
         .defer("email__raw_content")
         .filter(is_request=True)
         .order_by("timestamp")
@@ -63,6 +64,12 @@ def dashboard_view(request):
     teams = Team.objects.values_list("username", flat=True).order_by("username")
     puzzles = Puzzle.objects.values_list("slug", flat=True).order_by("slug")
 
+    # The threads, tasks and counts for all hints are loaded together, so the
+    # number of queries does not grow with the number of hints.
+    hints = list(Hint.with_handlers(hints))
+    threads = Hint.get_threads(hints)
+    request_counts = Hint.count_requests(hints)
+
     hintdicts = []
 
     for hint in hints:
@@ -71,23 +78,15 @@ def dashboard_view(request):
         form.cleaned_data = {}
         form.initial["hint_request_id"] = hint.id
 
-        related_hints = Hint.objects.filter(team=hint.team, puzzle=hint.puzzle)
-        thread = related_hints.filter(hint.original_request_filter()).order_by(
-            "timestamp"
-        )
-
-        threadinfo = {"hints": [], "last_request": None, "last_response": None}
-        for h in thread:
-            threadinfo["hints"].append(h)
-            threadinfo["last_request" if h.is_request else "last_response"] = h
-
         hintdicts.append(
             {
                 "hint": hint,
-                "thread": threadinfo,
+                "thread": threads[hint.original_request_id],
                 "form": form,
                 "task": hint.task,
-                "total_team_puzzle_hints": len(related_hints.filter(is_request=True)),
+                "total_team_puzzle_hints": request_counts.get(
+                    (hint.team_id, hint.puzzle_id), 0
+                ),
             }
         )
 
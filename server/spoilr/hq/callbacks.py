@@ -1,33 +1,57 @@
+import time
+
+from django.db import transaction
 from spoilr.core.api.events import HuntEvent, register, dispatch
 
+UNSNOOZE_CHUNK_SIZE = 1000
+# Tasks still due once this many seconds are spent are left for the next tick.
+UNSNOOZE_TIME_BUDGET_S = 5
+
 
-def on_tick(tick, **kwargs):
+def on_tick(tick, changes, **kwargs):
     from spoilr.hq.models import Task, TaskStatus
 
-    # Unsnooze tasks. Do an awkward query and update flow because I want to notify
-    # about the unsnoozing.
-    to_unsnooze = list(
-        Task.objects.prefetch_related("content_object").filter(
-            status=TaskStatus.SNOOZED, snooze_until__lte=tick
-        )
+    # Uses the partial index on snoozed tasks.
+    due_task_ids = list(
+        Task.objects.filter(status=TaskStatus.SNOOZED, snooze_until__lte=tick)
+        .order_by("snooze_until")
+        .values_list("id", flat=True)
     )
-    for task in to_unsnooze:
-        task.status = TaskStatus.PENDING
-        task.snooze_time = None
-        task.snooze_until = None
-        task.handler = None
-        task.claim_time = None
+    start_time = time.monotonic()
+    unsnoozed_task_ids = []
+    for i in range(0, len(due_task_ids), UNSNOOZE_CHUNK_SIZE):
+        if time.monotonic() - start_time > UNSNOOZE_TIME_BUDGET_S:
+            break
+        chunk = due_task_ids[i : i + UNSNOOZE_CHUNK_SIZE]
+        with transaction.atomic():
+            # Skip tasks that were claimed, resolved or re-snoozed since they
+            # were selected, or that are locked by a handler right now.
+            task_ids = list(
+                Task.objects.select_for_update(skip_locked=True)
+                .filter(id__in=chunk, status=TaskStatus.SNOOZED, snooze_until__lte=tick)
+                .values_list("id", flat=True)
+            )
+            Task.objects.filter(id__in=task_ids).update(
+                status=TaskStatus.PENDING,
+                snooze_time=None,
+                snooze_until=None,
+                handler=None,
+                claim_time=None,
+            )
+        unsnoozed_task_ids.extend(task_ids)
 
+    if unsnoozed_task_ids:
+        changes.append(f"Unsnoozed {len(unsnoozed_task_ids)} tasks")
+        # One event for the whole tick rather than one per task. Subscribers
+        # get the ids, and a single task is also logged as the object.
         dispatch(
             HuntEvent.TASK_UNSNOOZED,
-            team=getattr(task.content_object, "team", None),
-            object_id=task.id,
-            message=f"Unsnoozed task {task.content_object}",
+            object_id=(
+                str(unsnoozed_task_ids[0]) if len(unsnoozed_task_ids) == 1 else None
+            ),
+            task_ids=unsnoozed_task_ids,
+            message=f"Unsnoozed {len(unsnoozed_task_ids)} tasks",
         )
 
-    Task.objects.bulk_update(
-        to_unsnooze, ["status", "snooze_time", "snooze_until", "handler", "claim_time"]
-    )
-
 
 register(HuntEvent.HUNT_TICK, on_tick)
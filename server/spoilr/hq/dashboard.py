@@ -1,36 +1,24 @@
 import logging
 
 from django.shortcuts import render
-from django.contrib.contenttypes.models import ContentType
 
 from spoilr.hq.util.decorators import hq
+from spoilr.hq.util.tasks import get_task_counts
 from spoilr.contact.models import ContactRequest
 from spoilr.email.models import Email
 from spoilr.hints.models import Hint
 from spoilr.interaction.models import InteractionAccessTask
-from spoilr.hq.models import Task, TaskStatus
+from spoilr.hq.models import TaskStatus
 
 logger = logging.getLogger(__name__)
 
 
 @hq()
 def dashboard(request):
-    hint_count = Task.objects.filter(
-        content_type=ContentType.objects.get_for_model(Hint),
-        status=TaskStatus.PENDING,
-    ).count
-    task_count = Task.objects.filter(
-        content_type=ContentType.objects.get_for_model(InteractionAccessTask),
-        status=TaskStatus.PENDING,
-    ).count
-    contact_count = Task.objects.filter(
-        content_type=ContentType.objects.get_for_model(ContactRequest),
-        status=TaskStatus.PENDING,
-    ).count
+    task_counts = get_task_counts()
+    # Unanswered emails also depend on the emails, so are counted separately.
     email_count = (
-        Email.objects.prefetch_related("tasks")
-        .defer("raw_content", "header_content")
-        .filter(
+        Email.objects.filter(
             tasks__isnull=False,
             tasks__status__in=(TaskStatus.PENDING, TaskStatus.SNOOZED),
         )
@@ -44,9 +32,9 @@ def dashboard(request):
         request,
         "hq/main.html",
         {
-            "hint_count": hint_count,
-            "task_count": task_count,
-            "contact_count": contact_count,
+            "hint_count": task_counts[Hint][TaskStatus.PENDING],
+            "task_count": task_counts[InteractionAccessTask][TaskStatus.PENDING],
+            "contact_count": task_counts[ContactRequest][TaskStatus.PENDING],
             "email_count": email_count,
         },
     )
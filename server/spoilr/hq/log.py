@@ -1,19 +1,26 @@
-import csv
 import datetime
+import heapq
+from urllib.parse import urlencode
+
 import pytz
 
-from django.db.models import Q
 from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404
 
+from spoilr.core.api.system_log import search_system_log
 from spoilr.core.models import *
 from spoilr.hints.models import Hint
 from spoilr.hq.util.decorators import hq
+from spoilr.hq.util.export import keyset_filter, keyset_iterator, streaming_csv_response
+
+# Entries are paged by their position in this order, which the indexes on
+# SystemLog cover with or without a team, puzzle or event type filter.
+SYSTEM_LOG_ORDERING = ("-timestamp", "-id")
 
 
 @hq()
 def system_log_view(request):
-    entries = SystemLog.objects.select_related("team").order_by("-id")
+    entries = SystemLog.objects.select_related("team")
 
     team = None
     if request.GET.get("team"):
@@ -28,16 +35,31 @@ def system_log_view(request):
     search = None
     if request.GET.get("search"):
         search = request.GET["search"]
-        entries = entries.filter(
-            Q(message__icontains=search)
-            | Q(object_id__icontains=search)
-            | Q(event_type__icontains=search)
-        )
+        entries = search_system_log(entries, search)
 
     limit = 200
     if request.GET.get("limit"):
-        limit = min([int(request.GET["limit"]), 5000])
-    entries = entries[: int(limit)]
+        limit = min([int(request.GET["limit"]), 1000])
+
+    # Older pages start after the last entry of the previous one, instead of
+    # skipping over every newer entry with an offset.
+    if request.GET.get("before"):
+        before = get_object_or_404(
+            SystemLog.objects.only("timestamp"), id=request.GET["before"]
+        )
+        entries = entries.filter(
+            keyset_filter(SYSTEM_LOG_ORDERING, (before.timestamp, before.id))
+        )
+    entries = list(entries.order_by(*SYSTEM_LOG_ORDERING)[: limit + 1])
+    older_url = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        older_url = "?" + urlencode({**request.GET.dict(), "before": entries[-1].id})
+    newest_url = None
+    if request.GET.get("before"):
+        params = request.GET.dict()
+        del params["before"]
+        newest_url = "?" + urlencode(params)
 
     teams = Team.objects.values_list("username", flat=True).order_by("username")
     puzzles = Puzzle.objects.values_list("slug", flat=True).order_by("slug")
@@ -52,6 +74,8 @@ def system_log_view(request):
                 "puzzle": puzzle.slug if puzzle else None,
                 "search": search or "",
                 "entries": entries,
+                "older_url": older_url,
+                "newest_url": newest_url,
                 "teams": teams,
                 "puzzles": puzzles,
             },
@@ -63,7 +87,6 @@ def system_log_view(request):
 def system_log_csv_export(request):
     # Filter out system log events that we should't publicize i.e. email responses.
     # And also limit to events up until hunt close
-    entries = SystemLog.objects.select_related("team").order_by("timestamp")
     bad_types = [
         "email-replied",
         "hint-resolved",
@@ -73,46 +96,41 @@ def system_log_csv_export(request):
         "interaction-released",
     ]
     # The team types are "internal", "public", None.
-    entries = (
-        entries.exclude(event_type__in=bad_types)
+    querysets = [
+        model.objects.exclude(event_type__in=bad_types)
         .exclude(team=None)
         .filter(team__type=None)
-    )
-    # FIXME(update): Update this logic for your hunt
+        for model in (SystemLogArchive, SystemLog)
+    ]
+    # FIXME(update): Update this logic for your hunt, for example by merging in
+    # free answers sorted by timestamp with heapq.merge.
     # free_answers = ??? .order_by("timestamp")
-    response = HttpResponse(content_type="text/csv")
     fname = "tph_guesslog_{}.csv".format(
         datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
     )
-    response["Content-Disposition"] = 'attachment; filename="{}"'.format(fname)
     fieldnames = ["timestamp", "team", "event_type", "object_id", "message"]
-    writer = csv.DictWriter(response, fieldnames=fieldnames)
-    writer.writeheader()
-    datarows = []
-    for entr in entries:
-        data = {k: getattr(entr, k) for k in fieldnames}
-        data["timestamp"] = data["timestamp"].astimezone(
-            pytz.timezone("America/New_York")
+    timezone = pytz.timezone("America/New_York")
+    # Archived rows are older than the live ones, except for the few written
+    # while they were being archived, so merge the two by timestamp.
+    rows = (
+        (timestamp.astimezone(timezone), *row)
+        for timestamp, *row in heapq.merge(
+            *(
+                keyset_iterator(
+                    entries,
+                    "timestamp",
+                    "team__name",
+                    "event_type",
+                    "object_id",
+                    "message",
+                    ordering=("timestamp", "pk"),
+                )
+                for entries in querysets
+            ),
+            key=lambda row: row[0],
         )
-        data["team"] = data["team"].name
-        datarows.append(data)
-    # FIXME(update): Update this logic for your hunt
-    # for free in free_answers:
-    #     datarows.append(
-    #         {
-    #             "timestamp": free.timestamp.astimezone(
-    #                 pytz.timezone("America/New_York")
-    #             ),
-    #             "team": free.team.name,
-    #             "event_type": "used-free-answer",
-    #             "object_id": free.puzzle.slug,
-    #             "message": f"Used free answer on {free.puzzle.name}",
-    #         }
-    #     )
-    datarows.sort(key=lambda row: row["timestamp"])
-    for row in datarows:
-        writer.writerow(row)
-    return response
+    )
+    return streaming_csv_response(fname, rows, header=fieldnames)
 
 
 @hq()
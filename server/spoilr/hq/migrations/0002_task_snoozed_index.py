@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("spoilr_hq", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                condition=models.Q(("status", "snoozed")),
+                fields=["snooze_until"],
+                name="spoilr_hq_task_snoozed",
+            ),
+        ),
+    ]
@@ -90,6 +90,14 @@ class Task(models.Model):
 
     class Meta:
         unique_together = ("content_type", "object_id")
+        indexes = [
+            # For finding the snoozed tasks to unsnooze on each tick.
+            models.Index(
+                fields=["snooze_until"],
+                condition=models.Q(status=TaskStatus.SNOOZED),
+                name="%(app_label)s_%(class)s_snoozed",
+            ),
+        ]
         constraints = [
             models.CheckConstraint(
                 name="%(app_label)s_%(class)s_status_valid",
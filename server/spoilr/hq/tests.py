@@ -0,0 +1,339 @@
+import csv
+import datetime
+import io
+import tracemalloc
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from puzzles import models as puzzles_models
+from spoilr.contact.models import ContactRequest
+from spoilr.core.api.events import HuntEvent
+from spoilr.core.models import (
+    HuntSetting,
+    PuzzleAccess,
+    PuzzleSubmission,
+    SystemLog,
+    Team,
+    TeamType,
+    User,
+    UserTeamRole,
+)
+from spoilr.core.views.hunt_views import do_tick
+from spoilr.email.models import Email
+from spoilr.hints.models import Hint
+from spoilr.hq import callbacks
+from spoilr.hq.models import Task, TaskStatus
+from spoilr.hq.util import export
+from spoilr.hq.util.export import keyset_iterator, streaming_csv_response
+
+NUM_ROWS = 20000
+MESSAGE = "x" * 500
+
+
+class StreamingCsvExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        SystemLog.objects.bulk_create(
+            SystemLog(event_type="export-test", object_id=str(i), message=MESSAGE)
+            for i in range(NUM_ROWS)
+        )
+
+    def test_streams_all_rows_in_order_with_flat_memory(self):
+        rows = keyset_iterator(
+            SystemLog.objects.all(),
+            "id",
+            "message",
+            ordering=("timestamp", "pk"),
+            chunk_size=500,
+        )
+        response = streaming_csv_response("export.csv", rows, header=["id", "message"])
+
+        ids = []
+        num_bytes = 0
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                num_bytes += len(chunk)
+                for row in csv.reader(io.StringIO(chunk.decode())):
+                    ids.append(row[0])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(ids[0], "id")
+        expected_ids = SystemLog.objects.order_by("timestamp", "pk").values_list(
+            "id", flat=True
+        )
+        self.assertEqual(ids[1:], [str(id) for id in expected_ids])
+        # The export is about 10MB, so holding all of it would exceed this.
+        self.assertGreater(num_bytes, 8 * 1024 * 1024)
+        self.assertLess(peak, 4 * 1024 * 1024)
+
+
+class HuntExportTest(TestCase):
+    """Downloads the guess log and hint log of a small hunt, in several chunks."""
+
+    DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.launch_time = now().replace(microsecond=0) - datetime.timedelta(days=1)
+        cls.end_time = cls.launch_time + datetime.timedelta(days=2)
+        for name, value in (
+            ("spoilr.hunt.launch_time", cls.launch_time),
+            ("spoilr.hunt.end_time", cls.end_time),
+        ):
+            HuntSetting.objects.update_or_create(
+                name=name, defaults={"date_value": value}
+            )
+
+        round = puzzles_models.Round.objects.create(slug="round", name="Round", order=0)
+        puzzles = [
+            puzzles_models.Puzzle.objects.create(
+                external_id=i,
+                round=round,
+                slug=f"puzzle-{i}",
+                name=f"Puzzle, {i}",
+                answer=f"ANSWER {i}",
+                order=i,
+                deep=0,
+            )
+            for i in range(4)
+        ]
+        teams = [
+            puzzles_models.Team.objects.create(
+                username=f"team-{i}", name=f'Team "{i}"', is_hidden=i == 0
+            )
+            for i in range(4)
+        ]
+        for team in teams:
+            for i, puzzle in enumerate(puzzles):
+                puzzles_models.PuzzleAccess.objects.create(
+                    team=team.spoilr_team, puzzle=puzzle.spoilr_puzzle
+                )
+                for guess in range(3):
+                    correct = guess == 2 and i % 2 == 0
+                    puzzles_models.PuzzleSubmission.objects.create(
+                        team=team.spoilr_team,
+                        puzzle=puzzle.spoilr_puzzle,
+                        raw_answer=f"guess {guess}",
+                        answer=puzzle.answer if correct else f"GUESS {guess}",
+                        correct=correct,
+                        used_free_answer=correct and team == teams[1],
+                    )
+                hint = Hint.objects.create(
+                    team=team.spoilr_team,
+                    puzzle=puzzle.spoilr_puzzle,
+                    text_content=f"Hint request {i}",
+                )
+                if i % 2:
+                    hint.response = Hint.objects.create(
+                        team=hint.team,
+                        puzzle=hint.puzzle,
+                        root_ancestor_request=hint,
+                        is_request=False,
+                        text_content="A long hint response, " * 5,
+                        status=Hint.ANSWERED,
+                    )
+                    hint.status = Hint.ANSWERED
+                    hint.save()
+
+        # Unlocks before the launch are reported at the launch. Rows share
+        # timestamps, and some guesses come after the end of the hunt.
+        for model in (PuzzleAccess, PuzzleSubmission, Hint):
+            rows = list(model.objects.order_by("pk"))
+            start = cls.launch_time - datetime.timedelta(minutes=3)
+            for i, row in enumerate(rows):
+                row.timestamp = start + datetime.timedelta(minutes=(i * 7) % 23)
+            rows[-1].timestamp = cls.end_time + datetime.timedelta(minutes=1)
+            model.objects.bulk_update(rows, ["timestamp"])
+
+        admin_team = puzzles_models.Team.objects.create(
+            username="admin", name="Admin", type=TeamType.INTERNAL
+        )
+        cls.admin = User.objects.create_superuser(
+            username=admin_team.username,
+            password="admin",
+            team=admin_team.spoilr_team,
+            team_role=UserTeamRole.SHARED_ACCOUNT,
+        )
+
+    def setUp(self):
+        # The hunt settings are cached.
+        for alias in caches:
+            caches[alias].clear()
+        self.client.force_login(self.admin)
+
+    def download(self, url):
+        with mock.patch.object(export, "EXPORT_CHUNK_SIZE", 5):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # The rows are only read as the response is streamed.
+            content = b"".join(response.streaming_content).decode()
+        return list(csv.reader(io.StringIO(content)))
+
+    def format_time(self, timestamp):
+        return timestamp.strftime(self.DATE_FORMAT)
+
+    def test_activity_csv(self):
+        events = []
+        for submission in PuzzleSubmission.objects.filter(
+            team__team__is_hidden=False, timestamp__lt=self.end_time
+        ).select_related("team", "puzzle"):
+            row = [
+                submission.team.name,
+                "guess",
+                submission.puzzle.name,
+                self.format_time(submission.timestamp),
+                submission.answer,
+                str(submission.correct),
+            ]
+            events.append(((submission.timestamp, 0, submission.pk), row))
+            if submission.correct:
+                solve = [*row[:3], row[3], "", ""]
+                solve[1] = "solve"
+                events.append(((submission.timestamp, 0, submission.pk), solve))
+        for access in PuzzleAccess.objects.filter(
+            team__team__is_hidden=False, timestamp__lt=self.end_time
+        ).select_related("team", "puzzle"):
+            row = [
+                access.team.name,
+                "unlock",
+                access.puzzle.name,
+                self.format_time(max(access.timestamp, self.launch_time)),
+                "",
+                "",
+            ]
+            events.append(((access.timestamp, 1, access.pk), row))
+        # Sorting is stable, so each solve stays after its guess.
+        expected = [row for _, row in sorted(events, key=lambda event: event[0])]
+
+        rows = self.download("/internal/export_csv")
+        self.assertEqual(
+            rows[0], ["team", "event", "puzzle", "time", "submission", "correct"]
+        )
+        self.assertEqual(rows[1:], expected)
+        self.assertEqual(sum(row[1] == "solve" for row in rows), 6)
+        self.assertNotIn('Team "0"', {row[0] for row in rows})
+
+    def test_hint_csv(self):
+        expected = [
+            [
+                self.format_time(hint.timestamp),
+                self.format_time(hint.response.timestamp) if hint.response else "",
+                hint.team.name,
+                hint.puzzle.name,
+                str(hint.response) if hint.response else "",
+            ]
+            for hint in Hint.objects.order_by("timestamp", "pk").select_related(
+                "team", "puzzle", "response__team", "response__puzzle"
+            )
+        ]
+
+        rows = self.download("/internal/hint_csv")
+        self.assertEqual(rows, expected)
+        self.assertEqual(len(rows), 24)
+        self.assertTrue(any(row[4].endswith('..." ANS') for row in rows))
+
+
+# Async subscribers need a broker, so run everything inline.
+@override_settings(SPOILR_ASYNC_EVENT_TASK=None)
+class TickTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(username="team", name="Team")
+        cls.contact_requests = ContactRequest.objects.bulk_create(
+            ContactRequest(team=cls.team, email="team@example.com", comment=str(i))
+            for i in range(5)
+        )
+
+    def snooze(self, contact_request, snooze_until):
+        task = contact_request.tasks.create(
+            status=TaskStatus.SNOOZED, snooze_time=now(), snooze_until=snooze_until
+        )
+        return task.id
+
+    def get_last_tick(self):
+        return HuntSetting.objects.get(name="spoilr.last_tick").date_value
+
+    def test_unsnoozes_due_tasks_with_one_event(self):
+        past = now() - datetime.timedelta(minutes=1)
+        due_ids = [self.snooze(request, past) for request in self.contact_requests[:4]]
+        later_id = self.snooze(
+            self.contact_requests[4], now() + datetime.timedelta(hours=1)
+        )
+
+        with mock.patch.object(
+            callbacks, "UNSNOOZE_CHUNK_SIZE", 3
+        ), self.captureOnCommitCallbacks(execute=True):
+            do_tick()
+
+        self.assertEqual(
+            set(
+                Task.objects.filter(status=TaskStatus.PENDING).values_list(
+                    "id", flat=True
+                )
+            ),
+            set(due_ids),
+        )
+        self.assertEqual(Task.objects.get(id=later_id).status, TaskStatus.SNOOZED)
+        (log,) = SystemLog.objects.filter(event_type=HuntEvent.TASK_UNSNOOZED)
+        self.assertEqual(log.message, "Unsnoozed 4 tasks")
+
+    def test_event_has_only_unsnoozed_ids(self):
+        past = now() - datetime.timedelta(minutes=1)
+        due_ids = [self.snooze(request, past) for request in self.contact_requests]
+        resolved_id = due_ids.pop()
+        atomic = transaction.atomic
+
+        def resolve_then_atomic(*args, **kwargs):
+            # The task is resolved after the tick selected the due tasks.
+            Task.objects.filter(id=resolved_id).update(
+                status=TaskStatus.DONE, snooze_time=None, snooze_until=None
+            )
+            return atomic(*args, **kwargs)
+
+        with mock.patch.object(callbacks, "dispatch") as dispatch, mock.patch.object(
+            callbacks.transaction, "atomic", side_effect=resolve_then_atomic
+        ):
+            callbacks.on_tick(tick=now(), changes=[])
+
+        dispatch.assert_called_once()
+        self.assertEqual(sorted(dispatch.call_args.kwargs["task_ids"]), due_ids)
+
+    def test_last_tick_is_kept_when_nothing_changes(self):
+        do_tick()
+        first_tick = self.get_last_tick()
+        do_tick()
+        self.assertEqual(self.get_last_tick(), first_tick)
+
+        self.snooze(self.contact_requests[0], now() - datetime.timedelta(minutes=1))
+        do_tick()
+        self.assertGreater(self.get_last_tick(), first_tick)
+
+    def test_last_tick_advances_for_changes_without_log(self):
+        HuntSetting.objects.update_or_create(
+            name="spoilr.hunt.launch_time",
+            defaults={"date_value": now() - datetime.timedelta(days=1)},
+        )
+        do_tick()
+        first_tick = self.get_last_tick()
+        # An email that missed its task, which the tick makes without logging.
+        (email,) = Email.objects.bulk_create(
+            [
+                Email(
+                    subject="Email",
+                    text_content="Email",
+                    is_from_us=False,
+                    created_via_webapp=False,
+                    received_datetime=now(),
+                )
+            ]
+        )
+        do_tick()
+        self.assertEqual(email.tasks.count(), 1)
+        self.assertGreater(self.get_last_tick(), first_tick)
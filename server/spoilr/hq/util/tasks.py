@@ -0,0 +1,52 @@
+"""
+Bulk lookups of the HQ tasks for hints, emails, interactions and contact
+requests.
+
+Each of those models has a `tasks` GenericRelation to Task. Looking up the
+task of every object in a queue one at a time makes a query per object, so
+the dashboards prefetch them together instead.
+"""
+import collections
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Prefetch, prefetch_related_objects
+
+from spoilr.hq.models import Task
+
+
+def tasks_prefetch(lookup="tasks"):
+    """Returns a Prefetch for the tasks at `lookup`, with their handlers."""
+    return Prefetch(lookup, queryset=Task.objects.select_related("handler"))
+
+
+def prefetch_tasks(objs):
+    """
+    Prefetches the tasks, with their handlers, of a list of objects with a
+    `tasks` GenericRelation, using one query for each model in the list. Their
+    `tasks.all()` then does not query. Returns the list.
+    """
+    objs_by_model = collections.defaultdict(list)
+    for obj in objs:
+        if obj is not None:
+            objs_by_model[type(obj)].append(obj)
+    for model_objs in objs_by_model.values():
+        prefetch_related_objects(model_objs, tasks_prefetch())
+    return objs
+
+
+def get_task_counts():
+    """
+    Counts tasks by model and status with a single grouped query. Returns a
+    mapping from model to a Counter of statuses.
+    """
+    counts = collections.defaultdict(collections.Counter)
+    rows = (
+        Task.objects.values_list("content_type_id", "status")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for content_type_id, status, count in rows:
+        # The content types are cached after the first lookup.
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        counts[model][status] = count
+    return counts
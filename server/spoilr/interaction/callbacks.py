@@ -22,10 +22,20 @@ def on_interaction_released(interaction_access, **kwargs):
         iat.tasks.add(Task(), bulk=False)
 
 
-def on_tick(last_tick, **kwargs):
+def on_tick(last_tick, changes, **kwargs):
+    from django.contrib.contenttypes.models import ContentType
     from spoilr.core.models import InteractionAccess
     from spoilr.hq.models import Task, TaskStatus
     from spoilr.email.models import Email
+    from spoilr.interaction.models import InteractionAccessTask
+
+    # The window since the last tick that changed anything can be a few minutes
+    # long, so only scan it when there is a snoozed interaction task to wake.
+    if not Task.objects.filter(
+        status=TaskStatus.SNOOZED,
+        content_type=ContentType.objects.get_for_model(InteractionAccessTask),
+    ).exists():
+        return
 
     # If an email was received for a snoozed interaction, and unsnooze it.
     messages = Email.objects.filter(team__isnull=False, interaction__isnull=False)
@@ -52,6 +62,7 @@ def on_tick(last_tick, **kwargs):
             task.claim_time = None
             task.save()
 
+            changes.append(f"Unsnoozed task {task.id}")
             dispatch(
                 HuntEvent.TASK_UNSNOOZED,
                 team=message.team,
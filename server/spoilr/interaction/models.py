@@ -18,4 +18,5 @@ class InteractionAccessTask(models.Model):
 
     @property
     def task(self):
-        return self.tasks.first()
+        tasks = list(self.tasks.all())
+        return tasks[0] if tasks else None
@@ -11,6 +11,7 @@ from spoilr.email.models import Email, CannedEmail
 from spoilr.hq.models import HqLog, Task, TaskStatus
 from spoilr.hq.util.decorators import hq
 from spoilr.hq.util.redirect import redirect_with_message
+from spoilr.hq.util.tasks import prefetch_tasks
 from spoilr.interaction.models import InteractionAccessTask
 
 HQ_EMAIL_PREFIX = "HQ Update: "
@@ -21,9 +22,10 @@ def dashboard_view(request):
     accesses = (
         InteractionAccess.objects.filter(interactionaccesstask__tasks__isnull=False)
         .exclude(interactionaccesstask__tasks__status=TaskStatus.IGNORED)
-        .prefetch_related("interactionaccesstask__tasks")
+        .select_related("interactionaccesstask")
         .order_by("create_time")
     )
+    prefetch_tasks([access.interactionaccesstask for access in accesses])
 
     available_by_interaction = collections.defaultdict(int)
     accomplished_by_interaction = collections.defaultdict(int)
@@ -69,24 +71,23 @@ def dashboard_view(request):
 @hq()
 def interaction_view(request, interaction_slug):
     interaction = get_object_or_404(Interaction, slug=interaction_slug)
-    accesses = (
-        InteractionAccess.objects.select_related("team")
-        .prefetch_related("interactionaccesstask__tasks")
-        .filter(
-            interaction=interaction,
-            interactionaccesstask__tasks__isnull=False,
-            interactionaccesstask__tasks__status__in=(
-                TaskStatus.PENDING,
-                TaskStatus.SNOOZED,
-            ),
-        )
+    accesses = InteractionAccess.objects.select_related(
+        "team", "interactionaccesstask"
+    ).filter(
+        interaction=interaction,
+        interactionaccesstask__tasks__isnull=False,
+        interactionaccesstask__tasks__status__in=(
+            TaskStatus.PENDING,
+            TaskStatus.SNOOZED,
+        ),
     )
 
+    prefetch_tasks([access.interactionaccesstask for access in accesses])
+
     teams_ready = []
     teams_claimed = []
     teams_snoozed = []
     for access in accesses:
-        # tasks is cached by the prefetch already
         tasks = list(access.interactionaccesstask.tasks.all())
         if not tasks:
             continue
@@ -120,16 +121,17 @@ def interaction_view(request, interaction_slug):
     teams_ready.sort(key=lambda x: x["create_time"])
     teams_claimed.sort(key=lambda x: x["create_time"])
     teams_accomplished = []
-    for access in (
-        InteractionAccess.objects.select_related("team")
-        .prefetch_related("interactionaccesstask__tasks")
+    accomplished_accesses = (
+        InteractionAccess.objects.select_related("team", "interactionaccesstask")
         .filter(interaction=interaction, accomplished=True)
         .order_by("-accomplished_time")
-    ):
+    )
+    prefetch_tasks([access.interactionaccesstask for access in accomplished_accesses])
+    for access in accomplished_accesses:
         teams_accomplished.append(
             {
                 "team": access.team,
-                "task": access.interactionaccesstask.tasks.first(),
+                "task": access.interactionaccesstask.task,
                 "create_time": access.create_time,
                 "accomplished_time": access.accomplished_time,
             }
@@ -175,7 +177,7 @@ def details_view(request, interaction_slug, team_username):
         task = (
             access
             and access.interactionaccesstask
-            and access.interactionaccesstask.tasks.first()
+            and access.interactionaccesstask.task
         )
     except InteractionAccessTask.DoesNotExist:
         pass
@@ -203,8 +205,9 @@ def details_view(request, interaction_slug, team_username):
                 return response
 
     emails = (
-        Email.objects.select_related("interaction", "team")
-        .defer("raw_content", "header_content")
+        Email.objects.select_related("interaction", "team", "author")
+        .lite(bodies=True)
+        .with_tasks()
         .order_by("-received_datetime")
         .filter(interaction=interaction, team=team)
     )
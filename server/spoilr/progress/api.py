@@ -0,0 +1,156 @@
+"""Maintains TeamProgress rows from hunt events, and rebuilds them from scratch."""
+import contextlib
+import contextvars
+import functools
+
+from django.db import transaction
+
+from spoilr.core.models import InteractionAccess, PuzzleAccess, Team
+
+from .models import TeamProgress
+
+# team id -> [update] for the enclosing batched_team_progress block.
+_pending_updates = contextvars.ContextVar("pending_team_progress", default=None)
+
+
+def compute_team_progress(teams):
+    """Returns unsaved TeamProgress rows for the teams, built from their accesses."""
+    progress_by_team = {team.id: TeamProgress(team=team) for team in teams}
+    for puzzle_access in (
+        PuzzleAccess.objects.filter(team__in=progress_by_team.keys())
+        .select_related("puzzle")
+        .order_by("id")
+    ):
+        progress_by_team[puzzle_access.team_id].add_puzzle(
+            puzzle_access.puzzle,
+            solved_time=(
+                (puzzle_access.solved_time or puzzle_access.timestamp)
+                if puzzle_access.solved
+                else None
+            ),
+        )
+    for team_id, interaction_id, accomplished in (
+        InteractionAccess.objects.filter(team__in=progress_by_team.keys())
+        .order_by("id")
+        .values_list("team_id", "interaction_id", "accomplished")
+    ):
+        progress_by_team[team_id].add_interaction(
+            interaction_id, accomplished=accomplished
+        )
+    return list(progress_by_team.values())
+
+
+def rebuild_team_progress(teams=None):
+    """Replaces the progress rows for the teams (default all) with fresh ones."""
+    if teams is None:
+        teams = Team.objects.all()
+    with transaction.atomic():
+        progress = compute_team_progress(teams)
+        TeamProgress.objects.filter(
+            team_id__in=[team_progress.team_id for team_progress in progress]
+        ).delete()
+        TeamProgress.objects.bulk_create(progress)
+    return progress
+
+
+def verify_team_progress():
+    """Returns the teams whose stored progress differs from their accesses."""
+    stored = {
+        team_progress.team_id: team_progress
+        for team_progress in TeamProgress.objects.all()
+    }
+    mismatched = []
+    for expected in compute_team_progress(Team.objects.all()):
+        actual = stored.get(expected.team_id)
+        if actual is None or _summarize(actual) != _summarize(expected):
+            mismatched.append(expected.team)
+    return mismatched
+
+
+def _summarize(team_progress):
+    return (
+        {
+            round_id: (frozenset(puzzles["released"]), frozenset(puzzles["solved"]))
+            for round_id, puzzles in team_progress.rounds.items()
+            if puzzles["released"] or puzzles["solved"]
+        },
+        frozenset(team_progress.released_interactions),
+        frozenset(team_progress.accomplished_interactions),
+        team_progress.puzzles_released,
+        team_progress.puzzles_solved,
+    )
+
+
+def update_team_progress(team, update):
+    """
+    Applies update(team_progress) to the team's row under a lock. If the team
+    has no row yet, it is built from scratch first. Updates are idempotent, so
+    applying one to a row that already includes the change is harmless.
+    Inside batched_team_progress, the update is deferred until the block exits.
+    """
+    if team is None:
+        return
+    pending = _pending_updates.get()
+    if pending is None:
+        _apply_updates(team.id, [update])
+    else:
+        pending.setdefault(team.id, []).append(update)
+
+
+def remove_access_from_team_progress(access):
+    """
+    Removes a deleted PuzzleAccess or InteractionAccess from its team's row once
+    the deletion commits. The team may have been deleted along with it.
+    """
+
+    def update(team_progress):
+        if isinstance(access, PuzzleAccess):
+            team_progress.remove_puzzle(access.puzzle_id)
+        else:
+            team_progress.remove_interaction(access.interaction_id)
+
+    transaction.on_commit(functools.partial(_apply_updates, access.team_id, [update]))
+
+
+@contextlib.contextmanager
+def batched_team_progress():
+    """
+    Collect the progress updates made in the block and apply them with a single
+    locked save per team when the outermost block exits, or once the enclosing
+    transaction commits.
+    """
+    if _pending_updates.get() is not None:
+        yield
+        return
+
+    pending = {}
+    token = _pending_updates.set(pending)
+    try:
+        yield
+    finally:
+        _pending_updates.reset(token)
+        for team_id, updates in pending.items():
+            transaction.on_commit(functools.partial(_apply_updates, team_id, updates))
+
+
+def _apply_updates(team_id, updates):
+    with transaction.atomic():
+        team_progress = (
+            TeamProgress.objects.select_for_update().filter(team_id=team_id).first()
+        )
+        if team_progress is None:
+            # Another transaction may be creating the row at the same time, so
+            # insert ours only if it is still missing and then lock whichever won.
+            TeamProgress.objects.bulk_create(
+                compute_team_progress(Team.objects.filter(id=team_id)),
+                ignore_conflicts=True,
+            )
+            team_progress = (
+                TeamProgress.objects.select_for_update().filter(team_id=team_id).first()
+            )
+            if team_progress is None:
+                # The team was deleted.
+                return
+        for update in updates:
+            update(team_progress)
+        team_progress.save()
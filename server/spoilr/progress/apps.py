@@ -1,5 +1,8 @@
 from django.apps import AppConfig
 
+# Register hunt callbacks.
+from . import callbacks
+
 
 class SpoilrProgressConfig(AppConfig):
     name = "spoilr.progress"
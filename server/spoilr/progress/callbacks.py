@@ -0,0 +1,51 @@
+from django.utils.timezone import now
+
+from spoilr.core.api.events import HuntEvent, register
+
+
+def on_puzzle_released(team, puzzle, **kwargs):
+    from .api import update_team_progress
+
+    update_team_progress(team, lambda team_progress: team_progress.add_puzzle(puzzle))
+
+
+def on_puzzle_solved(team, puzzle, puzzle_access=None, **kwargs):
+    from .api import update_team_progress
+
+    # Admin teams can solve puzzles they were never released, and have no
+    # access to take the solve time from.
+    solved_time = (puzzle_access and puzzle_access.solved_time) or now()
+
+    def update(team_progress):
+        if puzzle.id in team_progress.get_round(puzzle.round_id)["released"]:
+            team_progress.add_puzzle(puzzle, solved_time=solved_time)
+
+    update_team_progress(team, update)
+
+
+def on_interaction_changed(team, interaction_access, **kwargs):
+    from .api import update_team_progress
+
+    update_team_progress(
+        team,
+        lambda team_progress: team_progress.add_interaction(
+            interaction_access.interaction_id,
+            accomplished=interaction_access.accomplished,
+        ),
+    )
+
+
+def on_hunt_activity_reset(**kwargs):
+    from .api import rebuild_team_progress
+
+    rebuild_team_progress()
+
+
+register(HuntEvent.PUZZLE_RELEASED, on_puzzle_released)
+register(HuntEvent.METAPUZZLE_RELEASED, on_puzzle_released)
+register(HuntEvent.PUZZLE_SOLVED, on_puzzle_solved)
+register(HuntEvent.METAPUZZLE_SOLVED, on_puzzle_solved)
+register(HuntEvent.INTERACTION_RELEASED, on_interaction_changed)
+register(HuntEvent.INTERACTION_REOPENED, on_interaction_changed)
+register(HuntEvent.INTERACTION_ACCOMPLISHED, on_interaction_changed)
+register(HuntEvent.HUNT_ACTIVITY_RESET, on_hunt_activity_reset)
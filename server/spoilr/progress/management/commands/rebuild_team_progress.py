@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from spoilr.progress.api import rebuild_team_progress, verify_team_progress
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the team progress table from puzzle and interaction accesses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only check the table against the accesses, without rebuilding",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            progress = rebuild_team_progress()
+            self.stdout.write(f"Rebuilt progress for {len(progress)} teams")
+
+        mismatched = verify_team_progress()
+        if mismatched:
+            raise CommandError(
+                f"Progress is out of date for {len(mismatched)} teams: "
+                + ", ".join(team.username for team in mismatched)
+            )
+        self.stdout.write("Team progress is consistent")
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('spoilr_core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rounds', models.JSONField(default=dict)),
+                ('released_interactions', models.JSONField(default=list)),
+                ('accomplished_interactions', models.JSONField(default=list)),
+                ('puzzles_released', models.IntegerField(default=0)),
+                ('puzzles_solved', models.IntegerField(default=0)),
+                ('last_solve_time', models.DateTimeField(blank=True, null=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('team', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='spoilr_core.team')),
+            ],
+            options={
+                'verbose_name_plural': 'Team progress',
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import models
+
+from spoilr.core.models import Team
+
+
+class TeamProgress(models.Model):
+    """
+    Denormalized summary of a team's progress, kept up to date from hunt events
+    so that the progress dashboard does not need to scan every access.
+    """
+
+    team = models.OneToOneField(Team, on_delete=models.CASCADE, related_name="progress")
+
+    # Round id -> {"released": [puzzle ids], "solved": [puzzle ids]}. Keys are
+    # strings because they round trip through JSON.
+    rounds = models.JSONField(default=dict)
+    released_interactions = models.JSONField(default=list)
+    accomplished_interactions = models.JSONField(default=list)
+
+    puzzles_released = models.IntegerField(default=0)
+    puzzles_solved = models.IntegerField(default=0)
+    last_solve_time = models.DateTimeField(null=True, blank=True)
+
+    update_time = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.team}: {self.puzzles_solved}/{self.puzzles_released} solved"
+
+    def get_round(self, round_id):
+        return self.rounds.get(str(round_id), {"released": [], "solved": []})
+
+    def add_puzzle(self, puzzle, *, solved_time=None):
+        """Records a released puzzle, or a solve if solved_time is set."""
+        puzzles = self.rounds.setdefault(
+            str(puzzle.round_id), {"released": [], "solved": []}
+        )
+        if puzzle.id not in puzzles["released"]:
+            puzzles["released"].append(puzzle.id)
+            self.puzzles_released += 1
+        if solved_time is not None and puzzle.id not in puzzles["solved"]:
+            puzzles["solved"].append(puzzle.id)
+            self.puzzles_solved += 1
+            if self.last_solve_time is None or self.last_solve_time < solved_time:
+                self.last_solve_time = solved_time
+
+    def remove_puzzle(self, puzzle_id):
+        for puzzles in self.rounds.values():
+            if puzzle_id in puzzles["released"]:
+                puzzles["released"].remove(puzzle_id)
+                self.puzzles_released -= 1
+            if puzzle_id in puzzles["solved"]:
+                puzzles["solved"].remove(puzzle_id)
+                self.puzzles_solved -= 1
+
+    def add_interaction(self, interaction_id, *, accomplished):
+        if interaction_id not in self.released_interactions:
+            self.released_interactions.append(interaction_id)
+        if accomplished:
+            if interaction_id not in self.accomplished_interactions:
+                self.accomplished_interactions.append(interaction_id)
+        elif interaction_id in self.accomplished_interactions:
+            self.accomplished_interactions.remove(interaction_id)
+
+    def remove_interaction(self, interaction_id):
+        if interaction_id in self.released_interactions:
+            self.released_interactions.remove(interaction_id)
+        if interaction_id in self.accomplished_interactions:
+            self.accomplished_interactions.remove(interaction_id)
+
+    class Meta:
+        verbose_name_plural = "Team progress"
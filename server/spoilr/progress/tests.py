@@ -0,0 +1,113 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from spoilr.core.models import (
+    Interaction,
+    InteractionAccess,
+    Puzzle,
+    PuzzleAccess,
+    Round,
+    Team,
+)
+from spoilr.progress import api
+from spoilr.progress.models import TeamProgress
+
+
+class TeamProgressTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        round = Round.objects.create(slug="round", name="Round", order=0)
+        cls.puzzles = [
+            Puzzle.objects.create(
+                external_id=i,
+                round=round,
+                slug=f"puzzle-{i}",
+                name=f"Puzzle {i}",
+                answer=f"ANSWER {i}",
+                order=i,
+            )
+            for i in range(2)
+        ]
+        cls.interaction = Interaction.objects.create(
+            slug="interaction", name="Interaction", order=0
+        )
+        cls.team = Team.objects.create(username="team", name="Team")
+        cls.solved_access = PuzzleAccess.objects.create(
+            team=cls.team,
+            puzzle=cls.puzzles[0],
+            solved=True,
+            solved_time=timezone.now(),
+        )
+        PuzzleAccess.objects.create(team=cls.team, puzzle=cls.puzzles[1])
+        InteractionAccess.objects.create(
+            team=cls.team, interaction=cls.interaction, accomplished=True
+        )
+
+    def assertProgressConsistent(self):
+        self.assertEqual(api.verify_team_progress(), [])
+
+    def test_missing_row_is_built_from_accesses(self):
+        api.update_team_progress(
+            self.team,
+            lambda team_progress: team_progress.add_puzzle(self.puzzles[1]),
+        )
+        team_progress = TeamProgress.objects.get(team=self.team)
+        self.assertEqual(team_progress.puzzles_released, 2)
+        self.assertEqual(team_progress.puzzles_solved, 1)
+        self.assertEqual(team_progress.accomplished_interactions, [self.interaction.id])
+        self.assertProgressConsistent()
+
+    def test_missing_row_created_concurrently_is_updated(self):
+        compute_team_progress = api.compute_team_progress
+
+        def create_row_first(teams):
+            # Another transaction inserts the row after ours saw it missing.
+            TeamProgress.objects.create(team=self.team)
+            return compute_team_progress(teams)
+
+        with mock.patch.object(
+            api, "compute_team_progress", side_effect=create_row_first
+        ):
+            api.update_team_progress(
+                self.team,
+                lambda team_progress: team_progress.add_puzzle(self.puzzles[1]),
+            )
+        team_progress = TeamProgress.objects.get(team=self.team)
+        self.assertEqual(team_progress.puzzles_released, 1)
+        self.assertEqual(
+            team_progress.get_round(self.puzzles[1].round_id)["released"],
+            [self.puzzles[1].id],
+        )
+
+    def test_batched_updates_are_saved_once_per_team(self):
+        api.rebuild_team_progress([self.team])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with api.batched_team_progress():
+                for puzzle in self.puzzles:
+                    api.update_team_progress(
+                        self.team,
+                        lambda team_progress, puzzle=puzzle: team_progress.add_puzzle(
+                            puzzle, solved_time=timezone.now()
+                        ),
+                    )
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(TeamProgress.objects.get(team=self.team).puzzles_solved, 2)
+
+    def test_access_deletion_is_removed(self):
+        api.rebuild_team_progress([self.team])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.solved_access.delete()
+            InteractionAccess.objects.filter(team=self.team).delete()
+        team_progress = TeamProgress.objects.get(team=self.team)
+        self.assertEqual(team_progress.puzzles_released, 1)
+        self.assertEqual(team_progress.puzzles_solved, 0)
+        self.assertEqual(team_progress.released_interactions, [])
+        self.assertProgressConsistent()
+
+    def test_team_deletion(self):
+        api.rebuild_team_progress([self.team])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.delete()
+        self.assertFalse(TeamProgress.objects.exists())
@@ -1,4 +1,5 @@
 import collections
+import datetime
 from functools import cmp_to_key
 
 from spoilr.utils import json
@@ -16,15 +17,17 @@ from spoilr.core.models import (
     InteractionAccess,
     Team,
     SystemLog,
-    TeamType,
 )
 from spoilr.contact.models import ContactRequest
+from spoilr.progress.models import TeamProgress
 from spoilr.hq.util.decorators import hq
 
 
 @hq()
 def teams_view(request):
-    all_teams = list(Team.objects.exclude(type=TeamType.INTERNAL))
+    all_teams = list(
+        Team.objects.exclude(type=TeamType.INTERNAL).select_related("progress")
+    )
     latest_log_ids_by_team = (
         SystemLog.objects.filter(team__isnull=False)
         .values("team_id")
@@ -44,28 +47,6 @@ def teams_view(request):
     for puzzle in all_puzzles:
         all_puzzles_by_round[puzzle.round_id].append(puzzle)
 
-    puzzles_solved_by_team = collections.defaultdict(set)
-    puzzles_accessible_by_team = collections.defaultdict(set)
-    for puzzle_access in PuzzleAccess.objects.exclude(team__type=TeamType.INTERNAL):
-        team_id = puzzle_access.team_id
-        puzzle_id = puzzle_access.puzzle_id
-
-        puzzles_accessible_by_team[team_id].add(puzzle_id)
-        if puzzle_access.solved:
-            puzzles_solved_by_team[team_id].add(puzzle_id)
-
-    interactions_accessible_by_team = collections.defaultdict(set)
-    interactions_solved_by_team = collections.defaultdict(set)
-    for interaction_access in InteractionAccess.objects.exclude(
-        team__type=TeamType.INTERNAL
-    ):
-        team_id = interaction_access.team_id
-        interaction_id = interaction_access.interaction_id
-
-        interactions_accessible_by_team[team_id].add(interaction_id)
-        if interaction_access.accomplished:
-            interactions_solved_by_team[team_id].add(interaction_id)
-
     contact_info = (
         ContactRequest.objects.exclude(
             resolved_time__isnull=False, team__type=TeamType.INTERNAL
@@ -79,79 +60,58 @@ def teams_view(request):
 
     teams = []
     for team in all_teams:
-        p_released = len(puzzles_accessible_by_team[team.id])
-        p_solved = len(puzzles_solved_by_team[team.id])
+        # Teams with nothing released yet may not have a progress row.
+        progress = getattr(team, "progress", None) or TeamProgress(team=team)
         rounds = []
         for round in all_rounds:
-            puzzles = []
-            for puzzle in all_puzzles_by_round[round.id]:
-                puzzles.append(
-                    get_encoded_puzzle(
-                        puzzle,
-                        accessible=(puzzle.id in puzzles_accessible_by_team[team.id]),
-                        solved=(puzzle.id in puzzles_solved_by_team[team.id]),
-                    )
-                )
-            num_released = len(
-                list(
-                    puzzle
-                    for puzzle in all_puzzles_by_round[round.id]
-                    if puzzle.id in puzzles_accessible_by_team[team.id]
-                )
-            )
-            num_solved = len(
-                list(
-                    puzzle
-                    for puzzle in all_puzzles_by_round[round.id]
-                    if puzzle.id in puzzles_solved_by_team[team.id]
-                )
+            round_progress = progress.get_round(round.id)
+            if not round_progress["released"]:
+                continue
+            released = set(round_progress["released"])
+            solved = set(round_progress["solved"])
+            round_puzzles = all_puzzles_by_round[round.id]
+            metas = [puzzle for puzzle in round_puzzles if puzzle.is_meta]
+            rounds.append(
+                {
+                    "round": round,
+                    "puzzles": [
+                        get_encoded_puzzle(
+                            puzzle,
+                            accessible=(puzzle.id in released),
+                            solved=(puzzle.id in solved),
+                        )
+                        for puzzle in round_puzzles
+                    ],
+                    "released": True,
+                    "solved": bool(metas)
+                    and all(puzzle.id in solved for puzzle in metas),
+                    "num_released": len(released),
+                    "num_solved": len(solved),
+                }
             )
-            if num_released > 0:
-                rounds.append(
-                    {
-                        "round": round,
-                        "puzzles": puzzles,
-                        "released": any(
-                            (puzzle.id in puzzles_accessible_by_team[team.id])
-                            for puzzle in all_puzzles_by_round[round.id]
-                        ),
-                        "solved": (
-                            sum(
-                                puzzle.is_meta
-                                for puzzle in all_puzzles_by_round[round.id]
-                            )
-                            and all(
-                                puzzle.id in puzzles_solved_by_team[team.id]
-                                for puzzle in all_puzzles_by_round[round.id]
-                                if puzzle.is_meta
-                            )
-                        ),
-                        "num_released": num_released,
-                        "num_solved": num_solved,
-                    }
-                )
-
-        i_released = len(interactions_accessible_by_team[team.id])
-        i_solved = len(interactions_solved_by_team[team.id])
-        interactions = []
-        for interaction in all_interactions:
-            interactions.append(
-                get_encoded_interaction(
-                    interaction,
-                    accessible=(
-                        interaction.id in interactions_accessible_by_team[team.id]
-                    ),
-                    solved=(interaction.id in interactions_solved_by_team[team.id]),
-                )
+
+        released_interactions = set(progress.released_interactions)
+        accomplished_interactions = set(progress.accomplished_interactions)
+        i_released = len(released_interactions)
+        i_solved = len(accomplished_interactions)
+        interactions = [
+            get_encoded_interaction(
+                interaction,
+                accessible=(interaction.id in released_interactions),
+                solved=(interaction.id in accomplished_interactions),
             )
+            for interaction in all_interactions
+        ]
 
+        p_released = progress.puzzles_released
+        p_solved = progress.puzzles_solved
         teams.append(
             {
                 "team": team,
                 "rounds": rounds,
                 "interactions": interactions,
                 "log1": latest_logs_by_team.get(team.id),
-                "r_released": sum(round["released"] for round in rounds),
+                "r_released": len(rounds),
                 "r_solved": sum(round["solved"] for round in rounds),
                 "p_released": p_released,
                 "p_solved": p_solved,
@@ -160,10 +120,19 @@ def teams_view(request):
                 "i_released": i_released,
                 "i_solved": i_solved,
                 "i_open": max(0, i_released - i_solved),
+                "last_solve_time": progress.last_solve_time,
             }
         )
 
-    teams.sort(key=lambda x: (-x["r_solved"], -x["p_solved"]))
+    # Break ties by whoever got there first.
+    teams.sort(
+        key=lambda x: (
+            -x["r_solved"],
+            -x["p_solved"],
+            x["last_solve_time"]
+            or datetime.datetime.max.replace(tzinfo=datetime.timezone.utc),
+        )
+    )
     context = {
         "teams": teams,
         "r_total": len(all_rounds),
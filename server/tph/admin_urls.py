@@ -0,0 +1,10 @@
+"""
+Admin urls for when settings.DEFER_RARE_APPS is set, which registers the
+ModelAdmins when these are first needed instead of at startup.
+"""
+
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
@@ -1,10 +1,31 @@
 """
 File holding constants. Do not import non stdlib packages here.
 """
-import platform
 
+import os
+import platform
 
-IS_PYODIDE = platform.system() == "Emscripten"
+# PYODIDE_STANDIN is set when running the static site under CPython to measure
+# it, see tph.pyodide_bundle.
+IS_PYODIDE = (
+    platform.system() == "Emscripten" or os.environ.get("PYODIDE_STANDIN") == "1"
+)
 # prefix for indexeddb files
 # FIXME
 INDEXEDDB_PREFIX = "20xx-"
+# database file in server.zip, and the file holding its sha256
+PYODIDE_DATABASE_NAME = "db.sqlite3"
+PYODIDE_DATABASE_HASH_NAME = "db.sqlite3.sha256"
+
+
+def strtobool(value):
+    """
+    Like distutils.util.strtobool, which is deprecated and needs setuptools in
+    Pyodide.
+    """
+    value = value.lower()
+    if value in ("y", "yes", "t", "true", "on", "1"):
+        return 1
+    if value in ("n", "no", "f", "false", "off", "0"):
+        return 0
+    raise ValueError(f"invalid truth value {value!r}")
@@ -0,0 +1,412 @@
+"""
+Builds the archives that the posthunt static site loads into Pyodide, and
+measures how long the site takes to start.
+
+The worker used to install every requirement with micropip on first load,
+pyodide_entrypoint then zipped all of site-packages into IndexedDB, and the
+server code was imported from source. Everything that can be done ahead of time
+is now done here:
+
+- The database is migrated, loaded with the posthunt fixtures and VACUUMed, and
+  shipped in server.zip with its sha256 so that tph.utils.reset_db can tell
+  whether the copy in IndexedDB is current.
+- The imports made by starting the site (django.setup() and the requests in
+  ROUTES) are traced, and site-packages.zip holds only the third party modules
+  among them.
+- Both archives can hold .pyc files next to the sources, which zipimport
+  prefers. Bytecode is specific to a Python version, so it is compiled by
+  compile_python, which should match the Python in Pyodide. Pyodide falls back
+  to the sources for .pyc files it cannot use.
+
+The trace and the measurement run the site with CPython standing in for
+Pyodide: STANDIN_ENV makes IS_PYODIDE true, and the js and pyodide modules are
+replaced by no-ops.
+"""
+
+import functools
+import hashlib
+import importlib.metadata
+import io
+import json
+import os
+import site
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import zipfile
+from pathlib import Path
+
+from tph.constants import PYODIDE_DATABASE_HASH_NAME, PYODIDE_DATABASE_NAME
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+STANDIN_ENV = "PYODIDE_STANDIN"
+
+DATABASE_FIXTURES = (
+    "tph/fixtures/posthunt/team.yaml",
+    "tph/fixtures/posthunt/dump.yaml",
+    "tph/fixtures/posthunt/access.yaml",
+)
+
+# Paths in the server directory that the static site does not need.
+SERVER_ZIP_EXCLUDED_PREFIXES = (
+    "puzzles/migrations/",
+    "puzzles/static/",
+    "puzzles/static_root/",
+    "static/",
+    "tph/fixtures/",
+    "tph/secrets.py",
+)
+SERVER_ZIP_EXCLUDED_SUFFIXES = (".npz", ".pyc")
+# Pyodide provides these itself, see pyodide_entrypoint.
+RUNTIME_PACKAGES = ("PIL", "sqlite3", "_sqlite3")
+# Package data that the static site does not use. USE_I18N is off.
+SITE_PACKAGES_EXCLUDED_DIRS = ("__pycache__", "locale", "tests")
+# Django lists management commands by reading this directory.
+SITE_PACKAGES_TOUCH_FILES = ("django/core/management/commands/__init__.py",)
+# Requests made when tracing and measuring startup, with {host} replaced by
+# MAIN_HUNT_HOST.
+ROUTES = (
+    "/20xx/{host}/api/hunt_info",
+    "/20xx/{host}/api/puzzles",
+    "/20xx/{host}/api/story",
+)
+
+_COMPILE_SCRIPT = """
+import json, py_compile, sys
+for source, cfile, dfile in json.load(sys.stdin):
+    try:
+        py_compile.compile(
+            source,
+            cfile=cfile,
+            dfile=dfile,
+            doraise=True,
+            invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+        )
+    except py_compile.PyCompileError as e:
+        print(e.msg, file=sys.stderr)
+"""
+
+_STANDIN_SCRIPT = """
+import time
+start_time = time.perf_counter()
+import sys
+sys.path[:0] = {paths!r}
+sys.path.extend({fallback_paths!r})
+from tph.pyodide_bundle import run_standin
+run_standin(start_time, {server_zip!r}, {database_dir!r}, {routes!r})
+"""
+
+
+def get_file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_database(path):
+    """Creates the posthunt database at path."""
+    subprocess.run(
+        [
+            sys.executable,
+            "create_pyodide_database.py",
+            str(path),
+            *DATABASE_FIXTURES,
+        ],
+        cwd=SERVER_DIR,
+        check=True,
+    )
+    connection = sqlite3.connect(path)
+    try:
+        # Store the statistics for the query planner, and drop the free pages
+        # and write-ahead log so that the file is small to download and store.
+        connection.execute("ANALYZE")
+        connection.execute("PRAGMA journal_mode=DELETE")
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+
+def compile_pycs(compile_python, files, output_dir):
+    """
+    Compiles the .py files among (path, archive name) pairs with
+    compile_python. Returns a mapping from archive name to .pyc path for those
+    that compiled.
+    """
+    jobs = [
+        (str(path), os.path.join(output_dir, f"{i}.pyc"), archive_name)
+        for i, (path, archive_name) in enumerate(files)
+        if archive_name.endswith(".py")
+    ]
+    subprocess.run(
+        [compile_python, "-c", _COMPILE_SCRIPT],
+        input=json.dumps(jobs),
+        text=True,
+        check=True,
+    )
+    return {
+        archive_name: cfile for _, cfile, archive_name in jobs if os.path.exists(cfile)
+    }
+
+
+def write_zip(files, contents=None, compile_python=None):
+    """
+    Returns a zip of files, (path, archive name) pairs, and contents, a mapping
+    from archive name to bytes. Adds .pyc files if compile_python is set.
+    """
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, mode="w", compression=zipfile.ZIP_DEFLATED) as zipf:
+        for path, archive_name in files:
+            zipf.write(path, archive_name)
+        if compile_python is not None:
+            with tempfile.TemporaryDirectory() as tmp:
+                for archive_name, cfile in compile_pycs(
+                    compile_python, files, tmp
+                ).items():
+                    zipf.write(cfile, archive_name[: -len(".py")] + ".pyc")
+        for archive_name, data in (contents or {}).items():
+            zipf.writestr(archive_name, data)
+    return fileobj.getvalue()
+
+
+def get_server_files():
+    files = []
+    for parent, dirs, filenames in os.walk(SERVER_DIR):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        for filename in filenames:
+            path = Path(parent) / filename
+            relpath = path.relative_to(SERVER_DIR).as_posix()
+            if relpath.startswith(SERVER_ZIP_EXCLUDED_PREFIXES) or relpath.endswith(
+                SERVER_ZIP_EXCLUDED_SUFFIXES
+            ):
+                continue
+            files.append((path, relpath))
+    return files
+
+
+def _get_package_data(directory, archive_dir):
+    """Returns the non-Python files of a package, outside its subpackages."""
+    files = []
+    for path in directory.iterdir():
+        if path.is_dir():
+            if (
+                path.name not in SITE_PACKAGES_EXCLUDED_DIRS
+                and not (path / "__init__.py").exists()
+            ):
+                files.extend(_get_package_data(path, f"{archive_dir}/{path.name}"))
+        elif path.suffix not in (".py", ".pyc", ".pyi", ".so", ".pyd"):
+            files.append((path, f"{archive_dir}/{path.name}"))
+    return files
+
+
+def get_site_packages_files(module_names, site_packages_dir=None):
+    """
+    Returns (path, archive name) pairs for site-packages.zip: the pure Python
+    modules named by module_names in site_packages_dir, the data files of their
+    packages and the metadata of their distributions. site_packages_dir
+    defaults to the site-packages of this environment.
+    """
+    if site_packages_dir is None:
+        roots = [Path(path) for path in site.getsitepackages()]
+    else:
+        roots = [Path(site_packages_dir)]
+    files = {}
+    packages = {}
+    top_levels = set()
+    for name in sorted(module_names):
+        parts = name.split(".")
+        if parts[0] in RUNTIME_PACKAGES:
+            continue
+        for root in roots:
+            base = root.joinpath(*parts)
+            path = next(
+                (
+                    path
+                    for path in (base / "__init__.py", base.parent / f"{parts[-1]}.py")
+                    if path.is_file()
+                ),
+                None,
+            )
+            if path is not None:
+                files[path] = path.relative_to(root).as_posix()
+                if path.name == "__init__.py":
+                    packages[path.parent] = path.parent.relative_to(root).as_posix()
+                top_levels.add(parts[0])
+                break
+
+    for directory, archive_dir in packages.items():
+        files.update(_get_package_data(directory, archive_dir))
+
+    # Some packages look up their own version.
+    for distribution in importlib.metadata.distributions(path=[str(r) for r in roots]):
+        distribution_files = distribution.files or ()
+        if not any(
+            file.parts and file.parts[0].removesuffix(".py") in top_levels
+            for file in distribution_files
+        ):
+            continue
+        for file in distribution_files:
+            if file.parts and file.parts[0].endswith(".dist-info"):
+                path = Path(file.locate())
+                if path.is_file():
+                    files[path] = file.as_posix()
+    return list(files.items())
+
+
+def run_standin_process(paths, server_zip, routes, isolated=False):
+    """
+    Starts the site in a new CPython process standing in for Pyodide, with
+    paths searched first for imports, and returns the report of run_standin
+    with the wall time taken. If isolated, site-packages is only searched last,
+    for the modules that Pyodide provides itself.
+    """
+    fallback_paths = site.getsitepackages() if isolated else []
+    with tempfile.TemporaryDirectory() as database_dir:
+        script = _STANDIN_SCRIPT.format(
+            paths=[str(path) for path in paths],
+            fallback_paths=fallback_paths,
+            server_zip=str(server_zip),
+            database_dir=database_dir,
+            routes=list(routes),
+        )
+        env = {**os.environ, STANDIN_ENV: "1"}
+        for name in ("DJANGO_SETTINGS_MODULE", "DATABASE_NAME", "PYTHONPATH"):
+            env.pop(name, None)
+        command = [sys.executable, *(["-S"] if isolated else []), "-c", script]
+        start_time = time.perf_counter()
+        result = subprocess.run(
+            command, env=env, cwd=database_dir, capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - start_time
+    if result.returncode:
+        raise RuntimeError(f"The stand-in failed:\n{result.stderr}")
+    report = json.loads(result.stdout.splitlines()[-1])
+    report["timings"]["total"] = elapsed
+    return report
+
+
+def _install_runtime_standins():
+    js = types.ModuleType("js")
+    js.pyodide = types.SimpleNamespace(
+        FS=types.SimpleNamespace(syncfs=lambda populate, callback: None)
+    )
+    js.globalThis = types.SimpleNamespace(
+        broadcastChannel=types.SimpleNamespace(postMessage=lambda data: None)
+    )
+    js.Object = types.SimpleNamespace(fromEntries=dict)
+    pyodide = types.ModuleType("pyodide")
+    pyodide.ffi = types.SimpleNamespace(to_js=lambda obj, **kwargs: obj)
+    sys.modules.update(js=js, pyodide=pyodide)
+
+
+def run_standin(start_time, server_zip, database_dir, routes):
+    """
+    Runs in the process started by run_standin_process, as the worker and
+    pyodide_entrypoint would on a first visit. Prints a JSON report of the
+    seconds taken by each step, the response statuses and the modules imported.
+    """
+    timings = {}
+
+    def mark(name):
+        nonlocal start_time
+        now = time.perf_counter()
+        timings[name] = now - start_time
+        start_time = now
+
+    _install_runtime_standins()
+    with zipfile.ZipFile(server_zip) as zipf:
+        zipf.extract(PYODIDE_DATABASE_NAME, database_dir)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "tph.settings.pyodide"
+    os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "1"
+    os.environ["DATABASE_NAME"] = os.path.join(database_dir, PYODIDE_DATABASE_NAME)
+    mark("database")
+
+    import django
+    from django.conf import settings
+
+    django.setup()
+    mark("setup")
+
+    from tph.utils import get_mock_response
+
+    statuses = {}
+    for route in routes:
+        path = route.format(host=settings.MAIN_HUNT_HOST)
+        statuses[path] = get_mock_response(path)["status"]
+        mark(path)
+    modules = {
+        name: getattr(module, "__file__", None)
+        for name, module in list(sys.modules.items())
+    }
+    print(json.dumps({"timings": timings, "statuses": statuses, "modules": modules}))
+
+
+class PyodideBundle:
+    """
+    Builds server.zip and site-packages.zip. extra_files is a mapping from
+    archive name to bytes to add to server.zip. compile_python and
+    site_packages_dir are as in the module docstring and
+    get_site_packages_files.
+    """
+
+    def __init__(
+        self,
+        extra_files=None,
+        compile_python=None,
+        site_packages_dir=None,
+        routes=ROUTES,
+    ):
+        self.extra_files = extra_files or {}
+        self.compile_python = compile_python
+        self.site_packages_dir = site_packages_dir
+        self.routes = routes
+        self.tmp = tempfile.TemporaryDirectory()
+
+    @functools.cached_property
+    def database_path(self):
+        path = os.path.join(self.tmp.name, PYODIDE_DATABASE_NAME)
+        create_database(path)
+        return path
+
+    def get_server_zip(self, compile_python=None):
+        return write_zip(
+            get_server_files() + [(Path(self.database_path), PYODIDE_DATABASE_NAME)],
+            {
+                **self.extra_files,
+                PYODIDE_DATABASE_HASH_NAME: get_file_hash(self.database_path),
+            },
+            compile_python,
+        )
+
+    @functools.cached_property
+    def server_zip(self):
+        return self.get_server_zip(self.compile_python)
+
+    @functools.cached_property
+    def traced_modules(self):
+        """Returns the names of the modules imported by a startup."""
+        path = os.path.join(self.tmp.name, "trace-server.zip")
+        with open(path, "wb") as f:
+            f.write(self.get_server_zip())
+        return sorted(run_standin_process([path], path, self.routes)["modules"])
+
+    def get_site_packages_zip(self, compile_python=None):
+        files = get_site_packages_files(self.traced_modules, self.site_packages_dir)
+        archive_names = {archive_name for _, archive_name in files}
+        return write_zip(
+            files,
+            {
+                name: b""
+                for name in SITE_PACKAGES_TOUCH_FILES
+                if name not in archive_names
+            },
+            compile_python,
+        )
+
+    @functools.cached_property
+    def site_packages_zip(self):
+        return self.get_site_packages_zip(self.compile_python)
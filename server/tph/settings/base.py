@@ -1,9 +1,8 @@
-import distutils.util
 import enum
 import os
 from pathlib import Path
 
-from tph.constants import IS_PYODIDE
+from tph.constants import IS_PYODIDE, strtobool
 
 HUNT_NAME = "FIXME"
 
@@ -22,9 +21,7 @@ COOKIE_PREFIX = "20xx-"  # FIXME
 
 # setting for posthunt infra for statification. prefer using
 # puzzles.views.auth.restrict_access for most posthunt conditioning
-IS_POSTHUNT = bool(
-    distutils.util.strtobool(os.environ.get("ENABLE_POSTHUNT_SITE", str(False)))
-)
+IS_POSTHUNT = bool(strtobool(os.environ.get("ENABLE_POSTHUNT_SITE", str(False))))
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
@@ -64,6 +61,8 @@ else:
 
 NUM_REDIS_HOSTS = int(os.environ.get("REDIS_REPLICAS", "1"))
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+# Replace the Redis clients from puzzles.utils with fakeredis, for benchmarks
+FAKE_REDIS = False
 REDIS_HOSTS = [REDIS_HOST]
 # multiple redis hosts did not seem to work for some reason
 """
@@ -75,7 +74,7 @@ REDIS_PORT = 6379
 
 # setting for if ML models and other large dependencies are not needed
 SKIP_LARGE_DEPENDENCIES = bool(
-    distutils.util.strtobool(os.environ.get("SKIP_LARGE_DEPENDENCIES", "False"))
+    strtobool(os.environ.get("SKIP_LARGE_DEPENDENCIES", "False"))
 )
 
 
@@ -104,6 +103,16 @@ SPOILR_ENABLE_DJANGO_ADMIN_DOCS = False
 SPOILR_HQ_DEFAULT_FROM_EMAIL = "hq@FIXME.com"
 SPOILR_RECEIVE_INCOMING_EMAILS = False
 
+# Buffer SystemLog rows from a request or bulk release and insert them together
+# once the transaction commits.
+SPOILR_BATCH_SYSTEM_LOG = True
+# Celery task used to run event subscribers registered with run_async=True. If
+# unset, those subscribers run inline like any other.
+SPOILR_ASYNC_EVENT_TASK = None if IS_PYODIDE else "spoilr-event"
+# Move SystemLog rows older than this many days to SystemLogArchive, so that
+# the HQ log only searches recent rows. If unset, rows are never archived.
+SPOILR_SYSTEM_LOG_ARCHIVE_DAYS = None
+
 LOGIN_URL = "/login"
 
 # Answer that can be used by admin teams to automatically use the correct answer
@@ -112,13 +121,21 @@ SPOILR_ADMIN_MAGIC_ANSWER = "ANSWER"
 
 # Application definition
 
+# Whether to skip importing the admin and staff (spoilr) views until a request
+# needs them, so that the static site starts faster. See tph.urls.
+DEFER_RARE_APPS = IS_PYODIDE
+
 INSTALLED_APPS = list(
     filter(
         None,
         [
             not IS_PYODIDE and "whitenoise.runserver_nostatic",
             not IS_PYODIDE and "channels",
-            "django.contrib.admin",
+            (
+                "django.contrib.admin.apps.SimpleAdminConfig"
+                if DEFER_RARE_APPS
+                else "django.contrib.admin"
+            ),
             "django.contrib.auth",
             "django.contrib.contenttypes",
             "django.contrib.humanize",
@@ -156,6 +173,8 @@ MIDDLEWARE = list(
             "django.middleware.security.SecurityMiddleware",
             not IS_PYODIDE and "whitenoise.middleware.WhiteNoiseMiddleware",
             "django.contrib.sessions.middleware.SessionMiddleware",
+            # Answers recently allowed Caddy checks before the user is loaded.
+            "puzzles.gate.access_gate_middleware",
             "django.middleware.common.CommonMiddleware",
             #    "django.middleware.csrf.CsrfViewMiddleware",
             "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -163,6 +182,7 @@ MIDDLEWARE = list(
             "django.contrib.messages.middleware.MessageMiddleware",
             not IS_PYODIDE and "impersonate.middleware.ImpersonateMiddleware",
             "puzzles.messaging.log_request_middleware",
+            "spoilr.core.api.events.batched_system_log_middleware",
             "puzzles.context.context_middleware",
             IS_POSTHUNT and not IS_PYODIDE and "tph.utils.dump_api_json_middleware",
             not IS_PYODIDE and "django_prometheus.middleware.PrometheusAfterMiddleware",
@@ -265,11 +285,22 @@ WHITENOISE_KEEP_ONLY_HASHED_FILES = True
 ASSET_MAPPING = os.path.join(SRV_DIR, "media_mapping.yaml")
 ASSET_URL = CDN_ORIGIN + "/media/"
 
+# Used to build the archives for the static site, see tph.pyodide_bundle. The
+# Python to compile .pyc files with, which should match the version in Pyodide,
+# and the site-packages holding the packages installed in Pyodide. By default
+# no .pyc files are compiled, and this environment's site-packages is used.
+PYODIDE_PYTHON = os.environ.get("PYODIDE_PYTHON")
+PYODIDE_SITE_PACKAGES = os.environ.get("PYODIDE_SITE_PACKAGES")
+
 # Media files uploaded by user.
 MEDIA_ROOT = os.path.join(SRV_DIR, "uploads/")
 MEDIA_URL = CDN_ORIGIN + "/uploads/"
 
 DATA_ROOT = os.path.join(SRV_DIR, "data/")
+# Story dialogue trees compiled by the compile_dialogues command at build time.
+DIALOGUE_ARTIFACT_PATH = os.path.join(
+    BASE_DIR, "puzzles", "data", "story", "dialogues.compiled"
+)
 os.environ["SENTENCE_TRANSFORMERS_HOME"] = DATA_ROOT  # This is puzzle specific
 
 # Email SMTP information
@@ -288,6 +319,8 @@ EMAIL_PORT = 587
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_SUBJECT_PREFIX = "[Mystery Hunt] "
 EMAIL_BATCH_DELAY = int(os.environ.get("EMAIL_BATCH_DELAY", "900"))  # ms
+# Max concurrent SMTP connections per worker process for bulk sends.
+EMAIL_SMTP_POOL_SIZE = int(os.environ.get("EMAIL_SMTP_POOL_SIZE", "4"))
 # add other addresses that we should consider to be from us
 EXTERNAL_EMAIL_ADDRESSES = set(
     [
@@ -432,12 +465,17 @@ CHANNEL_LAYERS = {
         },
     }
 }
+# Events sent with broadcast_event are coalesced per group over this window.
+# Set to 0 to send every event immediately.
+WEBSOCKET_BROADCAST_WINDOW_S = 0.1
 
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
 # Discord alerts
 SEND_DISCORD_ALERTS = False
+# Override to deliver alerts to a local HTTP server when testing.
+DISCORD_WEBHOOK_URL = "https://discord.com/api/webhooks/"
 
 # Required to use pgbouncer. Disables some of Django's functionality, so make
 # sure it's on for dev too to avoid commiting changes that wouldn't work on staging.
@@ -463,7 +501,17 @@ CELERY_BEAT_SCHEDULE = {
     "spoilr-tick": {
         "task": "spoilr-tick",
         "schedule": 30.0,
-    }
+    },
+    # Catches dirty interactive states whose throttled flush was dropped.
+    "flush-dirty-states": {
+        "task": "puzzles.models.interactive_cache.flush_dirty_states_task",
+        "schedule": 60.0,
+    },
+    # Does nothing unless SPOILR_SYSTEM_LOG_ARCHIVE_DAYS is set.
+    "spoilr-archive-system-log": {
+        "task": "spoilr-archive-system-log",
+        "schedule": 60 * 60.0,
+    },
 }
 
 # monitoring configs
@@ -0,0 +1,54 @@
+import os
+
+# Settings for manage.py benchmark_hot_paths, which run without the docker
+# services. The benchmark runs against a test database, in memory for sqlite.
+# Set BENCHMARK_POSTGRES to use the Postgres server from settings.base instead.
+
+# set environment variables before loading from settings.base
+os.environ.setdefault("HUNT_HOST", "localhost")
+os.environ.setdefault("REGISTRATION_HOST", "registration.localhost")
+
+from .base import *
+
+DEBUG = False
+
+SEND_DISCORD_ALERTS = False
+
+IS_TEST = True
+
+EMAIL_USER_DOMAIN = "example.com"
+EMAIL_HOST_USER = f"{EMAIL_USER_LOCALNAME}@{EMAIL_USER_DOMAIN}"
+
+ALLOWED_HOSTS = ["*"]
+
+if not os.environ.get("BENCHMARK_POSTGRES"):
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(SRV_DIR, "benchmark.sqlite3"),
+        }
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "default-cache",
+    },
+    SPOILR_CACHE_NAME: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "spoilr-cache",
+    },
+}
+
+CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+# see puzzles.utils.get_redis_handle
+FAKE_REDIS = True
+
+CELERY_BROKER_URL = "memory://"
+CELERY_TASK_ALWAYS_EAGER = True
+
+STATICFILES_STORAGE = "django.contrib.staticfiles.storage.StaticFilesStorage"
+
+# creating the benchmark users should not dominate the setup
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
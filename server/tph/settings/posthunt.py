@@ -1,4 +1,3 @@
-import distutils.util
 import os
 
 from .staging import *
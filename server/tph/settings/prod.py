@@ -1,6 +1,7 @@
-import distutils.util
 import os
 
+from tph.constants import strtobool
+
 from .base import *
 
 DEBUG = False
@@ -10,9 +11,7 @@ SEND_DISCORD_ALERTS = True
 EMAIL_USER_DOMAIN = os.environ.get("EMAIL_USER_DOMAIN", "FIXME.com")
 
 IS_TEST = bool(
-    distutils.util.strtobool(
-        os.environ.get("IS_TEST", str(EMAIL_USER_DOMAIN not in HOSTS))
-    )
+    strtobool(os.environ.get("IS_TEST", str(EMAIL_USER_DOMAIN not in HOSTS)))
 )
 EMAIL_HOST_USER = f"{EMAIL_USER_LOCALNAME}@{EMAIL_USER_DOMAIN}"
 
@@ -6,6 +6,8 @@ os.environ["ENABLE_POSTHUNT_SITE"] = "1"
 os.environ["CDN_REGISTRATION_HOST"] = "/20xx"
 os.environ["CDN_HUNT_HOST"] = "/20xx"
 os.environ["MAIN_HUNT_HOST"] = "mypuzzlehunt.com"
+# read by settings.base as MAIN_HUNT_HOST
+os.environ["HUNT_HOST"] = os.environ["MAIN_HUNT_HOST"]
 os.environ["REGISTRATION_HOST"] = "register.mypuzzlehunt.com"
 
 from tph.constants import INDEXEDDB_PREFIX
@@ -13,6 +13,7 @@ Including another URLconf
     1. Import the include() function: from django.conf.urls import url, include
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
+
 from typing import Callable, List, Mapping, Tuple
 
 from django.conf import settings
@@ -84,6 +85,7 @@ urlpatterns = list(
             ),
             path("api/guess_log", views.public_activity_csv),
             path("api/server.zip", views.server_zip),
+            path("api/site-packages.zip", views.site_packages_zip),
             path("api/reset_local_database", views.reset_pyodide_db),
             path("authorize", auth.authorize_view, name="authorize"),
             # example puzzle page with copy-to-clipboard
@@ -143,6 +145,15 @@ if settings.DEBUG:
 else:
     handler404 = "puzzles.views.views.handler404"
 
+if settings.DEFER_RARE_APPS:
+    # Unlike include(), a module name is only imported when a request under the
+    # path is resolved, or a url is reversed.
+    ADMIN_URLS = ("tph.admin_urls", "admin", admin.site.name)
+    SPOILR_URLS = ("spoilr.urls", None, None)
+else:
+    ADMIN_URLS = admin.site.urls
+    SPOILR_URLS = include("spoilr.urls")
+
 if settings.IS_POSTHUNT:
     urlpatterns = [
         path(f"20xx/{settings.MAIN_HUNT_HOST}/", include(urlpatterns)),
@@ -151,15 +162,15 @@ if settings.IS_POSTHUNT:
 
     urlpatterns.extend(
         [
-            path("20xx/admin/", admin.site.urls),
-            path("20xx/spoilr/", include("spoilr.urls")),
+            path("20xx/admin/", ADMIN_URLS),
+            path("20xx/spoilr/", SPOILR_URLS),
         ]
     )
 
 else:
     urlpatterns.extend(
         [
-            path("admin/", admin.site.urls),
-            path("spoilr/", include("spoilr.urls")),
+            path("admin/", ADMIN_URLS),
+            path("spoilr/", SPOILR_URLS),
         ]
     )
@@ -10,7 +10,11 @@ from django.utils.http import is_same_domain
 
 from spoilr.utils import json
 
-from tph.constants import INDEXEDDB_PREFIX
+from tph.constants import (
+    INDEXEDDB_PREFIX,
+    PYODIDE_DATABASE_HASH_NAME,
+    PYODIDE_DATABASE_NAME,
+)
 
 POSTHUNT_USERNAME = "public"
 
@@ -144,16 +148,15 @@ else:
         """
         js.pyodide.FS.syncfs(populate, js_noop)
 
-    def reset_db(old_crc=None):
-        "Reset the sqlite3 database if old_crc does not match."
-        dbcrc_path = f"/{INDEXEDDB_PREFIX}indexeddb/dbcrc.txt"
+    def reset_db(old_hash=None):
+        "Reset the sqlite3 database if old_hash does not match."
+        dbhash_path = f"/{INDEXEDDB_PREFIX}indexeddb/dbhash.txt"
         with zipfile.ZipFile(f"/{INDEXEDDB_PREFIX}server.zip") as zipf:
-            dbinfo = zipf.getinfo("db.sqlite3")
-            crc = f"{dbinfo.CRC:08x}"
-            if crc != old_crc:
-                zipf.extract(dbinfo, f"/{INDEXEDDB_PREFIX}indexeddb")
-                with open(dbcrc_path, "w") as f:
-                    f.write(crc)
+            db_hash = zipf.read(PYODIDE_DATABASE_HASH_NAME).decode()
+            if db_hash != old_hash:
+                zipf.extract(PYODIDE_DATABASE_NAME, f"/{INDEXEDDB_PREFIX}indexeddb")
+                with open(dbhash_path, "w") as f:
+                    f.write(db_hash)
         sync_indexeddb()
 
     def get_mock_response(